@@ -3,27 +3,37 @@ import pandas as pd
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.database import get_invoices, get_invoice_items, get_db_connection
+from utils.database import get_invoices_page, get_invoice_items, search_invoices
+from utils.queries import DAILY_SALES_SQL, HOURLY_SALES_SQL, PAYMENT_SALES_SQL, PERIOD_SALES_SQL, TOP_PRODUCTS_SQL
+from utils.snapshot import snapshot_connection, refresh_snapshot, snapshot_refreshed_at
+from utils.timeutils import SHOP_TZ, business_today, day_range, ts_range, format_ts, now_ts
+
+# Invoices fetched per page in the invoice list
+INVOICE_PAGE_SIZE = 50
+# Maximum number of ranked matches shown for an invoice search
+INVOICE_SEARCH_LIMIT = 200
 
 def render_reports_page():
     """Render the reports and analytics page"""
     st.header("📊 Sales Reports & Analytics")
     
+    render_snapshot_status()
+    
     # Date range selector
     col1, col2 = st.columns(2)
     
     with col1:
         start_date = st.date_input(
             "Start Date",
-            value=datetime.now().date() - timedelta(days=7),
-            max_value=datetime.now().date()
+            value=business_today() - timedelta(days=7),
+            max_value=business_today()
         )
     
     with col2:
         end_date = st.date_input(
             "End Date",
-            value=datetime.now().date(),
-            max_value=datetime.now().date()
+            value=business_today(),
+            max_value=business_today()
         )
     
     if start_date > end_date:
@@ -45,38 +55,39 @@ def render_reports_page():
     with tab4:
         render_analytics(start_date, end_date)
 
+def render_snapshot_status():
+    """Show how fresh the reporting snapshot is, with an on-demand refresh"""
+    col1, col2 = st.columns([4, 1])
+    
+    with col2:
+        if st.button("🔄 Refresh Data", use_container_width=True):
+            refresh_snapshot()
+    
+    with col1:
+        refreshed_at = snapshot_refreshed_at()
+        if refreshed_at:
+            age_minutes = (now_ts() - refreshed_at) / 60
+            st.caption(f"📸 Report data as of {format_ts(refreshed_at)} ({age_minutes:.0f} min ago)")
+        else:
+            st.caption("📸 Report data will be loaded on first view")
+
 def render_sales_overview(start_date, end_date):
     """Render sales overview metrics"""
     st.subheader("Sales Overview")
     
     # Get sales data for the period
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Daily sales query
-    cursor.execute("""
-        SELECT DATE(created_at) as sale_date, 
-               COUNT(*) as invoice_count,
-               SUM(total_amount) as daily_total
-        FROM invoices
-        WHERE DATE(created_at) BETWEEN ? AND ?
-        GROUP BY DATE(created_at)
-        ORDER BY sale_date
-    """, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
-    
-    daily_sales = cursor.fetchall()
-    
-    # Overall metrics
-    cursor.execute("""
-        SELECT COUNT(*) as total_invoices,
-               SUM(total_amount) as total_revenue,
-               AVG(total_amount) as avg_invoice_value
-        FROM invoices
-        WHERE DATE(created_at) BETWEEN ? AND ?
-    """, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
-    
-    overall_stats = cursor.fetchone()
-    conn.close()
+    with snapshot_connection() as conn:
+        cursor = conn.cursor()
+    
+        # Daily sales query
+        cursor.execute(DAILY_SALES_SQL, day_range(start_date, end_date))
+    
+        daily_sales = cursor.fetchall()
+    
+        # Overall metrics
+        cursor.execute(PERIOD_SALES_SQL, day_range(start_date, end_date))
+    
+        overall_stats = cursor.fetchone()
     
     # Display metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -153,72 +164,93 @@ def render_invoice_list(start_date, end_date):
     """Render list of invoices"""
     st.subheader("Invoice List")
     
-    # Get invoices for the period
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Search functionality (full-text indexes of the live database and the archived years)
+    search_term = st.text_input("🔍 Search invoices", placeholder="Search by invoice number, customer name, phone...")
+    start_ts, end_ts = ts_range(start_date, end_date)
     
-    cursor.execute("""
-        SELECT id, invoice_number, customer_name, customer_phone,
-               total_amount, payment_method, created_at
-        FROM invoices
-        WHERE DATE(created_at) BETWEEN ? AND ?
-        ORDER BY created_at DESC
-    """, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
-    
-    invoices = cursor.fetchall()
-    conn.close()
+    next_page_token = None
+    if search_term:
+        invoices = search_invoices(search_term, start_ts, end_ts, limit=INVOICE_SEARCH_LIMIT)
+    else:
+        # Restart paging whenever the date range changes
+        if st.session_state.get('invoice_page_range') != (start_ts, end_ts):
+            st.session_state.invoice_page_range = (start_ts, end_ts)
+            st.session_state.invoice_page_tokens = [None]
+        
+        # Fetch only the current page (keyset pagination)
+        page_tokens = st.session_state.invoice_page_tokens
+        invoices, next_page_token = get_invoices_page(INVOICE_PAGE_SIZE, page_tokens[-1], start_ts, end_ts)
     
     if not invoices:
         st.info("No invoices found for the selected period.")
         return
     
     # Convert to DataFrame
-    df_invoices = pd.DataFrame(invoices, columns=[
-        'ID', 'Invoice Number', 'Customer Name', 'Phone',
-        'Total Amount', 'Payment Method', 'Created At'
-    ])
+    df_invoices = pd.DataFrame(
+        [(row['id'], row['invoice_number'], row['customer_name'], row['customer_phone'],
+          row['total_amount'], row['payment_method'], row['created_ts'], row['business_day']) for row in invoices],
+        columns=[
+            'ID', 'Invoice Number', 'Customer Name', 'Phone',
+            'Total Amount', 'Payment Method', 'Created At', 'Business Day'
+        ]
+    )
     
-    # Format data for display
-    df_invoices['Total Amount'] = df_invoices['Total Amount'].apply(lambda x: f"${x:.2f}")
+    # Format data for display (vectorized; money and dates are formatted by column config)
     df_invoices['Payment Method'] = df_invoices['Payment Method'].str.title()
     df_invoices['Customer Name'] = df_invoices['Customer Name'].fillna('Walk-in Customer')
     df_invoices['Phone'] = df_invoices['Phone'].fillna('N/A')
-    
-    # Search functionality
-    search_term = st.text_input("🔍 Search invoices", placeholder="Search by invoice number, customer name...")
-    
-    if search_term:
-        mask = (
-            df_invoices['Invoice Number'].str.contains(search_term, case=False, na=False) |
-            df_invoices['Customer Name'].str.contains(search_term, case=False, na=False)
-        )
-        df_invoices = df_invoices[mask]
+    df_invoices['Created At'] = (
+        pd.to_datetime(df_invoices['Created At'], unit='s', utc=True)
+        .dt.tz_convert(SHOP_TZ)
+        .dt.tz_localize(None)
+    )
     
     # Display invoices
     st.dataframe(
-        df_invoices.drop('ID', axis=1),
+        df_invoices.drop(['ID', 'Business Day'], axis=1),
         use_container_width=True,
-        hide_index=True
+        hide_index=True,
+        column_config={
+            'Total Amount': st.column_config.NumberColumn(format="$%.2f"),
+            'Created At': st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm:ss")
+        }
     )
     
+    # Pager
+    if not search_term:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        
+        with col1:
+            if st.button("⬅️ Previous", use_container_width=True, disabled=len(page_tokens) == 1):
+                page_tokens.pop()
+                st.rerun()
+        
+        with col2:
+            st.caption(f"Page {len(page_tokens)} · {INVOICE_PAGE_SIZE} invoices per page")
+        
+        with col3:
+            if st.button("Next ➡️", use_container_width=True, disabled=next_page_token is None):
+                page_tokens.append(next_page_token)
+                st.rerun()
+    
     # Invoice details expander
     if len(df_invoices) > 0:
         st.subheader("Invoice Details")
         
         invoice_options = {
-            f"{row['Invoice Number']} - {row['Customer Name']} (${row['Total Amount']})": row['ID']
+            f"{row['Invoice Number']} - {row['Customer Name']} (${row['Total Amount']:.2f})": (row['ID'], row['Business Day'])
             for _, row in df_invoices.iterrows()
         }
         
         selected_invoice = st.selectbox("Select Invoice to View Details", list(invoice_options.keys()))
         
         if selected_invoice:
-            invoice_id = invoice_options[selected_invoice]
-            show_invoice_details(invoice_id)
+            invoice_id, business_day = invoice_options[selected_invoice]
+            show_invoice_details(invoice_id, business_day)
 
-def show_invoice_details(invoice_id):
+def show_invoice_details(invoice_id, business_day=None):
     """Show detailed view of a specific invoice"""
-    items = get_invoice_items(invoice_id)
+    items = get_invoice_items(invoice_id, business_day)
     
     if items:
         st.write("**Invoice Items:**")
@@ -234,25 +266,13 @@ def render_top_products(start_date, end_date):
     """Render top selling products"""
     st.subheader("Top Selling Products")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Top products by quantity
-    cursor.execute("""
-        SELECT ii.product_name,
-               SUM(ii.weight_kg) as total_weight,
-               COUNT(ii.id) as times_sold,
-               SUM(ii.total_price) as total_revenue
-        FROM invoice_items ii
-        JOIN invoices i ON ii.invoice_id = i.id
-        WHERE DATE(i.created_at) BETWEEN ? AND ?
-        GROUP BY ii.product_name
-        ORDER BY total_weight DESC
-        LIMIT 10
-    """, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
-    
-    top_products = cursor.fetchall()
-    conn.close()
+    with snapshot_connection() as conn:
+        cursor = conn.cursor()
+    
+        # Top products by quantity
+        cursor.execute(TOP_PRODUCTS_SQL, day_range(start_date, end_date))
+    
+        top_products = cursor.fetchall()
     
     if not top_products:
         st.info("No product sales data found for the selected period.")
@@ -306,32 +326,18 @@ def render_analytics(start_date, end_date):
     """Render advanced analytics"""
     st.subheader("Advanced Analytics")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Payment method distribution
-    cursor.execute("""
-        SELECT payment_method, COUNT(*) as count, SUM(total_amount) as total
-        FROM invoices
-        WHERE DATE(created_at) BETWEEN ? AND ?
-        GROUP BY payment_method
-    """, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
-    
-    payment_methods = cursor.fetchall()
-    
-    # Hourly sales pattern
-    cursor.execute("""
-        SELECT strftime('%H', created_at) as hour, 
-               COUNT(*) as invoice_count,
-               SUM(total_amount) as hourly_revenue
-        FROM invoices
-        WHERE DATE(created_at) BETWEEN ? AND ?
-        GROUP BY strftime('%H', created_at)
-        ORDER BY hour
-    """, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
-    
-    hourly_sales = cursor.fetchall()
-    conn.close()
+    with snapshot_connection() as conn:
+        cursor = conn.cursor()
+    
+        # Payment method distribution
+        cursor.execute(PAYMENT_SALES_SQL, day_range(start_date, end_date))
+    
+        payment_methods = cursor.fetchall()
+    
+        # Hourly sales pattern
+        cursor.execute(HOURLY_SALES_SQL, day_range(start_date, end_date))
+    
+        hourly_sales = cursor.fetchall()
     
     col1, col2 = st.columns(2)
     
@@ -1,10 +1,22 @@
 import streamlit as st
-import pandas as pd
-import os
+import uuid
 from datetime import datetime
-from utils.database import get_products, create_invoice, get_db_connection
+from utils.database import create_invoice, hold_stock, release_hold, release_cart_holds, get_held_stock
+from utils.barcodes import parse_entry, price_label_weight
+from utils.catalog import get_catalog
+from utils.images import product_thumbnail
+from utils.scale import SCALE_POLL_INTERVAL, SCALE_PORT, get_scale
 from utils.invoice_gen import generate_invoice_pdf, generate_receipt_text
 
+# The sale screen is split into keyed fragments (customer, entry, picker, cart,
+# totals). An interaction reruns only the fragments it affects - adding an item
+# reruns the cart and totals - instead of the whole app with its sidebar and
+# styles. Cross-fragment updates go through widget callbacks, which can name the
+# fragments to rerun; state shared between fragments lives in st.session_state.
+# With a scale connected the weight field is a fragment of its own that polls
+# the scale reader and fills in each new settled weight.
+CART_FRAGMENTS = ["sale_cart", "sale_totals"]
+
 def render_sale_page():
     """Render the main sales/invoice page"""
     st.header("🧮 New Sale")
@@ -12,213 +24,350 @@ def render_sale_page():
     # Initialize session state for current sale
     if 'current_invoice_items' not in st.session_state:
         st.session_state.current_invoice_items = []
+    # Identifies this sale's stock holds
+    if 'cart_id' not in st.session_state:
+        st.session_state.cart_id = uuid.uuid4().hex
+    # Initialize session state for product selection
+    if 'selected_product_id' not in st.session_state:
+        st.session_state.selected_product_id = None
+    if 'show_product_picker' not in st.session_state:
+        st.session_state.show_product_picker = False
+    
+    render_customer_info()
+    
+    st.divider()
+    
+    # Add items section
+    st.subheader("Add Items to Sale")
+    
+    # Served from the in-process catalog cache
+    if not get_catalog().products:
+        st.error("No products available. Please add products in Stock Management.")
+        return
+    
+    render_scan_entry()
+    render_item_entry()
+    
+    # Show product picker popup
+    render_product_picker_popup()
     
-    # Customer information section
+    st.divider()
+    
+    render_cart()
+    render_totals()
+
+@st.fragment(key="sale_customer")
+def render_customer_info():
+    """Customer fields; typing in them reruns nothing else"""
     st.subheader("Customer Information (Optional)")
     col1, col2 = st.columns(2)
     
     with col1:
-        customer_name = st.text_input("Customer Name", placeholder="Enter customer name")
+        st.text_input("Customer Name", placeholder="Enter customer name", key="customer_name")
     
     with col2:
-        customer_phone = st.text_input("Phone Number", placeholder="Enter phone number")
+        st.text_input("Phone Number", placeholder="Enter phone number", key="customer_phone")
+
+def _open_picker():
+    st.session_state.show_product_picker = True
+    st.rerun("sale_picker")
+
+def _add_to_cart(product, weight: float, total_price: float = None):
+    """Hold the stock and append a cart line; raises ValueError when it is not available"""
+    if not weight or weight <= 0:
+        raise ValueError("Weight must be greater than 0 kg")
+    # Hold the stock now so another till cannot sell it before checkout
+    hold_id = hold_stock(st.session_state.cart_id, product['id'], weight)
     
-    st.divider()
+    st.session_state.current_invoice_items.append({
+        'product_id': product['id'],
+        'product_name': product['name'],
+        'weight_kg': weight,
+        'price_per_kg': product['price_per_kg'],
+        'total_price': weight * product['price_per_kg'] if total_price is None else total_price,
+        'hold_id': hold_id
+    })
+    st.session_state.sale_cart_message = f"Added {weight:.3f} kg of {product['name']} to sale"
+
+def _add_item():
+    """Add the selected product with the entered weight"""
+    selected_product = get_catalog().get(st.session_state.selected_product_id)
+    if not selected_product:
+        return
+    try:
+        _add_to_cart(selected_product, st.session_state.weight_input)
+    except ValueError as e:
+        # Rerun the entry (the default) to show the error with fresh availability
+        st.session_state.sale_entry_error = f"❌ {e}"
+        return
+    st.rerun(CART_FRAGMENTS)
+
+def _scan_item():
+    """Add a scanned label or keyed PLU*weight in one action"""
+    text = st.session_state.scan_input
+    st.session_state.scan_input = ""
+    if not text.strip():
+        return
+    try:
+        entry = parse_entry(text)
+        product = get_catalog().find_plu(entry.plu)
+        if product is None:
+            raise ValueError(f"No product has PLU {entry.plu}")
+        if entry.weight_kg is None and entry.price is None:
+            # A bare PLU selects the product for the weight entry
+            st.session_state.selected_product_id = product['id']
+            st.rerun(["sale_scan", "sale_entry"])
+        if entry.price is not None:
+            # Price-embedded label: the printed price is what the customer pays
+            _add_to_cart(product, price_label_weight(entry.price, product['price_per_kg'], product['name']), entry.price)
+        else:
+            _add_to_cart(product, entry.weight_kg)
+    except ValueError as e:
+        st.session_state.sale_scan_error = f"❌ {e}"
+        return
+    st.rerun(["sale_scan", *CART_FRAGMENTS])
+
+@st.fragment(key="sale_scan")
+def render_scan_entry():
+    """Scanner / keyboard field: a scale label or PLU*weight adds the line on Enter"""
+    st.text_input(
+        "Scan or PLU",
+        placeholder="Scan a scale label, or type PLU*weight (e.g. 1234*0.75) and press Enter",
+        key="scan_input",
+        on_change=_scan_item
+    )
     
-    # Add items section
-    st.subheader("Add Items to Sale")
+    error = st.session_state.pop('sale_scan_error', None)
+    if error:
+        st.error(error)
+
+@st.fragment(key="sale_entry")
+def render_item_entry():
+    """Selected product, weight and the add button"""
+    catalog = get_catalog()
     
-    # Get products for display
-    products = get_products()
-    if not products:
-        st.error("No products available. Please add products in Stock Management.")
-        return
+    # Look up the selected product once
+    selected_product = catalog.get(st.session_state.selected_product_id) if st.session_state.selected_product_id else None
     
-    # Initialize session state for product selection
-    if 'selected_product_id' not in st.session_state:
-        st.session_state.selected_product_id = None
-    if 'show_product_picker' not in st.session_state:
-        st.session_state.show_product_picker = False
+    # Available to sell is stock minus what open carts (this one included) are holding
+    available_kg = 0.0
+    if selected_product:
+        held_stock = get_held_stock()
+        available_kg = max(selected_product['stock_kg'] - held_stock.get(selected_product['id'], 0), 0.0)
     
     # Compact product selection interface
     col1, col2, col3 = st.columns([3, 2, 1])
     
     with col1:
         # Show current selection or button to open picker
-        if st.session_state.selected_product_id:
-            selected_product = next((p for p in products if p['id'] == st.session_state.selected_product_id), None)
-            if selected_product:
-                st.info(f"Selected: {selected_product['name']} - ${selected_product['price_per_kg']:.2f}/kg")
+        if selected_product:
+            st.info(f"Selected: {selected_product['name']} - ${selected_product['price_per_kg']:.2f}/kg")
         
-        if st.button("🖼️ Choose Product with Images", use_container_width=True):
-            st.session_state.show_product_picker = True
-            st.rerun()
+        st.button("🖼️ Choose Product with Images", use_container_width=True, on_click=_open_picker)
     
     with col2:
-        # Weight input
-        if st.session_state.selected_product_id:
-            selected_product = next((p for p in products if p['id'] == st.session_state.selected_product_id), None)
-            if selected_product:
-                weight = st.number_input(
-                    "Weight (kg)",
-                    min_value=0.001,
-                    max_value=float(selected_product['stock_kg']),
-                    value=1.0,
-                    step=0.1,
-                    format="%.3f",
-                    key="weight_input"
-                )
-            else:
-                weight = 1.0
-        else:
-            st.info("Select a product first")
-            weight = 1.0
+        render_weight_input(selected_product, available_kg)
     
     with col3:
         # Add item button
-        if st.session_state.selected_product_id:
-            selected_product = next((p for p in products if p['id'] == st.session_state.selected_product_id), None)
-            if selected_product and st.button("➕ Add Item", use_container_width=True, type="primary"):
-                # Check stock availability
-                if selected_product['stock_kg'] < weight:
-                    st.error(f"Insufficient stock! Available: {selected_product['stock_kg']:.2f} kg")
-                else:
-                    total_price = weight * selected_product['price_per_kg']
-                    item = {
-                        'product_id': selected_product['id'],
-                        'product_name': selected_product['name'],
-                        'weight_kg': weight,
-                        'price_per_kg': selected_product['price_per_kg'],
-                        'total_price': total_price
-                    }
-                    
-                    st.session_state.current_invoice_items.append(item)
-                    st.success(f"Added {weight:.2f} kg of {selected_product['name']} to sale")
-                    st.rerun()
-        else:
-            st.button("➕ Add Item", use_container_width=True, disabled=True)
+        st.button("➕ Add Item", use_container_width=True, type="primary", disabled=not selected_product,
+                  on_click=_add_item)
     
-    # Show product picker popup
-    if st.session_state.show_product_picker:
-        render_product_picker_popup(products)
-    
-    st.divider()
+    error = st.session_state.pop('sale_entry_error', None)
+    if error:
+        st.error(error)
+
+def _apply_scale_weight(scale, selected_product, available_kg: float):
+    """Copy a newly settled scale weight into the weight field, once per weighing and product"""
+    state = scale.state()
+    weighing = (state.weighing, selected_product['id'])
+    if not state.fresh or st.session_state.get('scale_applied') == weighing:
+        return
+    st.session_state.scale_applied = weighing
+    # Only a weight still on the platform that can be sold; the status line explains the rest
+    weight = state.settled_weight()
+    if weight is not None and weight <= available_kg:
+        st.session_state.weight_input = weight
+
+def _render_scale_status(scale, available_kg: float = None):
+    state = scale.state()
+    if not state.fresh:
+        st.caption(f"⚖️ Scale not responding{f' - {state.error}' if state.error else ''}")
+    elif state.reading.overload:
+        st.caption("⚖️ Overload")
+    elif available_kg is not None and state.reading.weight_kg > available_kg:
+        st.warning(f"⚖️ Scale shows {state.reading.weight_kg:.3f} kg but only {available_kg:.3f} kg is available")
+    else:
+        net = " NET" if state.reading.net else ""
+        st.caption(f"⚖️ {state.reading.weight_kg:.3f} kg{net} {'✓ stable' if state.reading.stable else '… in motion'}")
+
+@st.fragment(key="sale_weight", run_every=SCALE_POLL_INTERVAL if SCALE_PORT else None)
+def render_weight_input(selected_product, available_kg: float):
+    """Weight field, filled from the scale when one is connected (polled while the screen is open)"""
+    scale = get_scale()
+    if selected_product:
+        if scale:
+            _apply_scale_weight(scale, selected_product, available_kg)
+        st.number_input(
+            "Weight (kg)",
+            min_value=0.001,
+            max_value=max(available_kg, 0.001),
+            value=min(1.0, max(available_kg, 0.001)),
+            step=0.1,
+            format="%.3f",
+            key="weight_input"
+        )
+    else:
+        st.info("Select a product first")
+    if scale:
+        _render_scale_status(scale, available_kg if selected_product else None)
+
+def _remove_item(index: int):
+    item = st.session_state.current_invoice_items.pop(index)
+    if item.get('hold_id'):
+        release_hold(item['hold_id'])
+    st.rerun(CART_FRAGMENTS)
+
+@st.fragment(key="sale_cart")
+def render_cart():
+    """Current sale lines with their remove buttons"""
+    message = st.session_state.pop('sale_cart_message', None)
+    if message:
+        st.success(message)
     
     # Current invoice items
     if st.session_state.current_invoice_items:
         st.subheader("Current Sale Items")
         
-        # Create DataFrame for display
-        items_data = []
-        total_amount = 0
-        
-        for i, item in enumerate(st.session_state.current_invoice_items):
-            items_data.append({
-                'Product': item['product_name'],
-                'Weight (kg)': f"{item['weight_kg']:.3f}",
-                'Price/kg': f"${item['price_per_kg']:.2f}",
-                'Total': f"${item['total_price']:.2f}",
-                'Action': i  # For remove button
-            })
-            total_amount += item['total_price']
-        
-        df = pd.DataFrame(items_data)
-        
         # Display items with remove buttons
-        for i, row in df.iterrows():
+        for i, item in enumerate(st.session_state.current_invoice_items):
             col1, col2, col3, col4, col5 = st.columns([3, 1, 1, 1, 1])
             
             with col1:
-                st.write(row['Product'])
+                st.write(item['product_name'])
             with col2:
-                st.write(row['Weight (kg)'])
+                st.write(f"{item['weight_kg']:.3f}")
             with col3:
-                st.write(row['Price/kg'])
+                st.write(f"${item['price_per_kg']:.2f}")
             with col4:
-                st.write(row['Total'])
+                st.write(f"${item['total_price']:.2f}")
             with col5:
-                if st.button("🗑️", key=f"remove_{i}", help="Remove item"):
-                    st.session_state.current_invoice_items.pop(i)
-                    st.rerun()
+                st.button("🗑️", key=f"remove_{i}", help="Remove item", on_click=_remove_item, args=(i,))
         
         st.divider()
-        
-        # Total and payment section
-        col1, col2, col3 = st.columns([2, 1, 1])
-        
-        with col1:
-            payment_method = st.selectbox(
-                "Payment Method",
-                ["cash", "card", "mobile_payment", "check"],
-                format_func=lambda x: x.replace("_", " ").title()
+    
+    elif 'last_sale' not in st.session_state:
+        st.info("No items in current sale. Add items above to get started.")
+
+def _clear_items():
+    release_cart_holds(st.session_state.cart_id)
+    st.session_state.current_invoice_items = []
+    st.rerun(CART_FRAGMENTS)
+
+def _complete_sale():
+    """Check out the cart; the totals panel shows the result"""
+    items = st.session_state.current_invoice_items
+    payment_method = st.session_state.payment_method
+    success, result, invoice_id = create_invoice(
+        st.session_state.get('customer_name') or None,
+        st.session_state.get('customer_phone') or None,
+        items,
+        payment_method,
+        username=st.session_state.get('username'),
+        cart_id=st.session_state.cart_id
+    )
+    
+    st.session_state.last_sale = {
+        'success': success,
+        'result': result,
+        'items': items,
+        'payment_method': payment_method
+    }
+    if success is not False:
+        # Clear current sale; its holds were converted by the checkout (or will be, if it is pending)
+        st.session_state.current_invoice_items = []
+        st.session_state.cart_id = uuid.uuid4().hex
+    st.rerun(CART_FRAGMENTS)
+
+@st.fragment(key="sale_totals")
+def render_totals():
+    """Total, payment method and the checkout actions"""
+    last_sale = st.session_state.pop('last_sale', None)
+    if last_sale:
+        render_sale_result(last_sale)
+    
+    if not st.session_state.current_invoice_items:
+        return
+    
+    total_amount = sum(item['total_price'] for item in st.session_state.current_invoice_items)
+    
+    # Total and payment section
+    col1, col2, col3 = st.columns([2, 1, 1])
+    
+    with col1:
+        payment_method = st.selectbox(
+            "Payment Method",
+            ["cash", "card", "mobile_payment", "check"],
+            format_func=lambda x: x.replace("_", " ").title(),
+            key="payment_method"
+        )
+    
+    with col2:
+        st.metric("Total Amount", f"${total_amount:.2f}")
+    
+    with col3:
+        st.write("")  # Spacing
+        st.button("💰 Complete Sale", use_container_width=True, type="primary", on_click=_complete_sale)
+    
+    # Action buttons
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.button("🗑️ Clear All Items", use_container_width=True, on_click=_clear_items)
+    
+    with col2:
+        if st.button("📄 Preview Receipt", use_container_width=True):
+            preview_receipt(
+                st.session_state.get('customer_name'), st.session_state.get('customer_phone'), payment_method
             )
+
+def render_sale_result(last_sale):
+    """Show the outcome of a checkout, with the invoice PDF on success"""
+    if last_sale['success'] is None:
+        st.warning(f"⏳ {last_sale['result']}")
+        return
+    if not last_sale['success']:
+        st.error(f"❌ Sale failed: {last_sale['result']}")
+        return
+    
+    invoice_number = last_sale['result']
+    st.success(f"✅ Sale completed! Invoice: {invoice_number}")
+    
+    # Generate PDF invoice
+    try:
+        invoice_data = {
+            'invoice_number': invoice_number,
+            'customer_name': st.session_state.get('customer_name'),
+            'customer_phone': st.session_state.get('customer_phone'),
+            'payment_method': last_sale['payment_method']
+        }
         
-        with col2:
-            st.metric("Total Amount", f"${total_amount:.2f}")
-        
-        with col3:
-            st.write("")  # Spacing
-            complete_sale = st.button("💰 Complete Sale", use_container_width=True, type="primary")
-        
-        # Action buttons
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("🗑️ Clear All Items", use_container_width=True):
-                st.session_state.current_invoice_items = []
-                st.rerun()
-        
-        with col2:
-            if st.button("📄 Preview Receipt", use_container_width=True):
-                preview_receipt(customer_name, customer_phone, payment_method)
+        pdf_path = generate_invoice_pdf(invoice_data, last_sale['items'])
         
-        # Complete sale
-        if complete_sale:
-            success, result, invoice_id = create_invoice(
-                customer_name or None,
-                customer_phone or None,
-                st.session_state.current_invoice_items,
-                payment_method
+        # Provide download link; downloading does not rerun anything
+        with open(pdf_path, "rb") as pdf_file:
+            st.download_button(
+                label="📥 Download Invoice PDF",
+                data=pdf_file.read(),
+                file_name=f"invoice_{invoice_number}.pdf",
+                mime="application/pdf",
+                on_click="ignore"
             )
-            
-            if success:
-                invoice_number = result
-                st.success(f"✅ Sale completed! Invoice: {invoice_number}")
-                
-                # Generate PDF invoice
-                try:
-                    invoice_data = {
-                        'invoice_number': invoice_number,
-                        'customer_name': customer_name,
-                        'customer_phone': customer_phone,
-                        'payment_method': payment_method
-                    }
-                    
-                    pdf_path = generate_invoice_pdf(invoice_data, st.session_state.current_invoice_items)
-                    
-                    # Provide download link
-                    with open(pdf_path, "rb") as pdf_file:
-                        st.download_button(
-                            label="📥 Download Invoice PDF",
-                            data=pdf_file.read(),
-                            file_name=f"invoice_{invoice_number}.pdf",
-                            mime="application/pdf"
-                        )
-                
-                except Exception as e:
-                    st.warning(f"Invoice PDF generation failed: {e}")
-                
-                # Clear current sale
-                st.session_state.current_invoice_items = []
-                
-                # Auto-refresh after 3 seconds
-                st.balloons()
-                
-            else:
-                st.error(f"❌ Sale failed: {result}")
     
-    else:
-        st.info("No items in current sale. Add items above to get started.")
+    except Exception as e:
+        st.warning(f"Invoice PDF generation failed: {e}")
+    
+    st.balloons()
 
 def preview_receipt(customer_name, customer_phone, payment_method):
     """Show receipt preview in modal"""
@@ -237,8 +386,24 @@ def preview_receipt(customer_name, customer_phone, payment_method):
     with st.expander("📄 Receipt Preview", expanded=True):
         st.code(receipt_text, language=None)
 
-def render_product_picker_popup(products):
+def _close_picker():
+    st.session_state.show_product_picker = False
+    st.rerun("sale_picker")
+
+def _select_product(product_id: int):
+    st.session_state.selected_product_id = product_id
+    st.session_state.show_product_picker = False
+    st.rerun(["sale_entry", "sale_picker"])
+
+@st.fragment(key="sale_picker")
+def render_product_picker_popup():
     """Render product picker popup with images"""
+    if not st.session_state.show_product_picker:
+        return
+    
+    catalog = get_catalog()
+    held_stock = get_held_stock()
+    
     st.markdown("---")
     
     # Header with close button
@@ -246,20 +411,10 @@ def render_product_picker_popup(products):
     with col1:
         st.subheader("🖼️ Choose Product")
     with col2:
-        if st.button("❌ Close", key="close_picker"):
-            st.session_state.show_product_picker = False
-            st.rerun()
-    
-    # Group products by category
-    categories = {}
-    for product in products:
-        category = product['category'] or 'Other'
-        if category not in categories:
-            categories[category] = []
-        categories[category].append(product)
+        st.button("❌ Close", key="close_picker", on_click=_close_picker)
     
     # Display products by category in a more compact grid
-    for category, category_products in categories.items():
+    for category, category_products in catalog.by_category.items():
         st.markdown(f"**{category}**")
         
         # Create columns for grid layout (3 products per row for better visibility)
@@ -271,10 +426,10 @@ def render_product_picker_popup(products):
                 if i + j < len(category_products):
                     product = category_products[i + j]
                     with col:
-                        # Product image
-                        image_path = product['image_path'] if product['image_path'] else ''
-                        if image_path and os.path.exists(image_path):
-                            st.image(image_path, use_column_width=True)
+                        # Product thumbnail, from the shared in-memory image cache
+                        thumbnail = product_thumbnail(product)
+                        if thumbnail:
+                            st.image(thumbnail, width="stretch")
                         else:
                             # Placeholder if no image
                             st.markdown(
@@ -297,19 +452,18 @@ def render_product_picker_popup(products):
                         # Product details
                         st.markdown(f"**{product['name']}**")
                         st.markdown(f"💰 ${product['price_per_kg']:.2f}/kg")
-                        st.markdown(f"📦 {product['stock_kg']:.1f} kg available")
+                        available_kg = max(product['stock_kg'] - held_stock.get(product['id'], 0), 0.0)
+                        st.markdown(f"📦 {available_kg:.1f} kg available")
                         
                         # Select button
-                        if st.button(
+                        st.button(
                             "✅ Select This Product", 
                             key=f"pick_{product['id']}",
                             use_container_width=True,
-                            type="primary"
-                        ):
-                            st.session_state.selected_product_id = product['id']
-                            st.session_state.show_product_picker = False
-                            st.success(f"Selected: {product['name']}")
-                            st.rerun()
+                            type="primary",
+                            on_click=_select_product,
+                            args=(product['id'],)
+                        )
                 else:
                     # Empty column for alignment
                     col.empty()
@@ -1,7 +1,18 @@
 import streamlit as st
 import os
+import pandas as pd
 from datetime import datetime
-from utils.database import get_db_connection, reset_database
+from utils.database import (
+    reset_database, archive_old_sales, get_archived_years, db_dialect, describe_backend,
+    sync_with_hub, get_terminal_sync_status
+)
+from utils.archive import ARCHIVE_KEEP_MONTHS
+from utils.images import image_cache
+from utils.export import EXPORT_FORMATS, export_data, get_export_watermarks
+from utils.bulk_import import IMPORT_KINDS, IMPORT_COLUMNS, run_import, get_import_jobs, get_import_errors
+from utils.profiler import profiler
+from utils.snapshot import snapshot_connection, snapshot_refreshed_at
+from utils.timeutils import format_ts
 
 def render_settings_page():
     """Render the settings and configuration page"""
@@ -117,24 +128,23 @@ def render_system_info():
     
     # Database statistics
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with snapshot_connection() as conn:
+            cursor = conn.cursor()
         
-        # Get table counts
-        cursor.execute("SELECT COUNT(*) FROM products")
-        product_count = cursor.fetchone()[0]
+            # Get table counts
+            cursor.execute("SELECT COUNT(*) FROM products")
+            product_count = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(*) FROM invoices")
-        invoice_count = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM invoices")
+            invoice_count = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(*) FROM invoice_items")
-        invoice_items_count = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM invoice_items")
+            invoice_items_count = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM users")
+            user_count = cursor.fetchone()[0]
         
-        cursor.close()
-        conn.close()
+            cursor.close()
         
         # Display metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -151,19 +161,26 @@ def render_system_info():
         with col4:
             st.metric("Users", user_count)
         
+        st.caption(f"📸 Counts as of {format_ts(snapshot_refreshed_at())}")
+        
     except Exception as e:
         st.error(f"Error loading system info: {e}")
     
+    render_query_profile()
+    
     # System details
     st.subheader("System Details")
     
+    cache = image_cache.stats()
     system_info = {
         "Application Version": "1.0.0",
-        "Database Type": "SQLite (Local)",
-        "Database Provider": "Local File",
-        "Mode": "Offline-First",
+        "Database Type": describe_backend(),
+        "Database Provider": "Local File" if db_dialect.name == "sqlite" else "PostgreSQL Server",
+        "Mode": "Offline-First" if db_dialect.name == "sqlite" else "Multi-Till",
         "Last Started": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "Session Duration": "Active",
+        "Image Cache": f"{cache['entries']} images, {cache['bytes'] / 1048576:.1f} of {cache['max_bytes'] / 1048576:.0f} MB "
+                       f"({cache['hits']} hits, {cache['misses']} misses)",
         "Data Directory": os.getcwd()
     }
     
@@ -174,6 +191,250 @@ def render_system_info():
         with col2:
             st.write(value)
 
+def render_export_data():
+    """Render the data export form"""
+    with st.expander("📤 Export Data", expanded=False):
+        export_format = st.selectbox(
+            "Format",
+            options=list(EXPORT_FORMATS),
+            format_func=lambda fmt: {"csv": "CSV", "jsonl": "JSON Lines", "parquet": "Parquet"}[fmt]
+        )
+        incremental = st.checkbox("Only rows not yet exported", value=False)
+        target = None
+        if incremental:
+            target = st.text_input("Export target", value="accounting").strip() or None
+            watermarks = get_export_watermarks(target) if target else {}
+            if watermarks:
+                last_ts = max(exported_ts for _, exported_ts in watermarks.values())
+                st.caption(f"Last export to '{target}': {format_ts(last_ts)}")
+            else:
+                st.caption("No previous export for this target; everything will be exported.")
+        
+        if st.button("📤 Export Data", use_container_width=True):
+            try:
+                with st.spinner("Exporting..."):
+                    path, counts = export_data(export_format, target)
+                st.session_state.export_path = path
+                st.success("✅ Exported " + ", ".join(f"{rows} {table}" for table, rows in counts.items()))
+            except Exception as e:
+                st.error(f"❌ Export failed: {e}")
+        
+        export_path = st.session_state.get('export_path')
+        if export_path and os.path.exists(export_path):
+            with open(export_path, "rb") as export_file:
+                st.download_button(
+                    "⬇️ Download Export",
+                    data=export_file,
+                    file_name=os.path.basename(export_path),
+                    mime="application/zip",
+                    use_container_width=True
+                )
+
+def render_import_data():
+    """Render the bulk import form and the recent import jobs"""
+    with st.expander("📥 Import Data", expanded=False):
+        kind = st.selectbox("What to import", options=list(IMPORT_KINDS.keys()), format_func=IMPORT_KINDS.get)
+        required, optional = IMPORT_COLUMNS[kind]
+        st.caption(f"Columns: **{', '.join(required)}**" + (f", {', '.join(optional)}" if optional else ""))
+        if kind == "sales":
+            st.caption("One row per invoice line; lines of the same invoice_ref must be consecutive. Stock is not changed.")
+        
+        source = st.file_uploader("Data file", type=['csv', 'jsonl', 'ndjson'], key=f"import_file_{kind}")
+        images = None
+        if kind == "products":
+            image_files = st.file_uploader(
+                "Product images (optional)",
+                type=['png', 'jpg', 'jpeg'],
+                accept_multiple_files=True,
+                help="Referenced by file name in the 'image' column"
+            )
+            images = {image.name: image for image in image_files or []}
+        
+        if st.button("📥 Import Data", use_container_width=True, disabled=source is None):
+            try:
+                with st.spinner("Importing..."):
+                    job = run_import(kind, source, source.name, images, st.session_state.get('username'))
+                st.session_state.import_job_id = job['id']
+                st.success(f"✅ Imported {job['rows_imported']} rows, {job['rows_failed']} rejected")
+            except Exception as e:
+                st.error(f"❌ Import stopped: {e}")
+                st.info("💡 Fix the problem and import the same file again to resume where it stopped.")
+        
+        # Recent jobs and the error report of the selected one
+        jobs = get_import_jobs()
+        if jobs:
+            st.write("**Recent imports:**")
+            jobs_df = pd.DataFrame(
+                [(job['id'], IMPORT_KINDS.get(job['kind'], job['kind']), job['source_name'], job['status'],
+                  job['rows_imported'], job['rows_failed'], format_ts(job['updated_ts'])) for job in jobs],
+                columns=['Job', 'Type', 'File', 'Status', 'Imported', 'Rejected', 'Updated']
+            )
+            st.dataframe(jobs_df, use_container_width=True, hide_index=True)
+            
+            failed_jobs = [job['id'] for job in jobs if job['rows_failed']]
+            if failed_jobs:
+                default_job = st.session_state.get('import_job_id')
+                job_id = st.selectbox(
+                    "Error report for job",
+                    options=failed_jobs,
+                    index=failed_jobs.index(default_job) if default_job in failed_jobs else 0
+                )
+                errors_df = pd.DataFrame(
+                    [(row['row_number'], row['message']) for row in get_import_errors(job_id)],
+                    columns=['Row', 'Error']
+                )
+                st.dataframe(errors_df.head(200), use_container_width=True, hide_index=True)
+                st.download_button(
+                    "⬇️ Download Error Report",
+                    data=errors_df.to_csv(index=False),
+                    file_name=f"import_{job_id}_errors.csv",
+                    mime="text/csv",
+                    use_container_width=True
+                )
+
+def _toggle_profiling():
+    # The profiler is shared by every session, so only an actual click changes it
+    profiler.enabled = st.session_state.profile_queries
+
+def render_query_profile():
+    """Render the per-statement database profile and the slow query log"""
+    st.subheader("🐢 Database Query Profile")
+    
+    col1, col2, col3 = st.columns([1, 1, 1])
+    
+    with col1:
+        # Show the process-wide setting, which another session may have changed
+        st.session_state.profile_queries = profiler.enabled
+        st.toggle("Profile queries", key="profile_queries", on_change=_toggle_profiling)
+    
+    with col2:
+        order_by = st.selectbox(
+            "Sort by",
+            options=["total", "p95", "calls", "lock_wait"],
+            format_func={"total": "Total time", "p95": "p95 latency", "calls": "Calls", "lock_wait": "Lock wait"}.get
+        )
+    
+    with col3:
+        st.write("")  # Spacing
+        if st.button("♻️ Reset Statistics", use_container_width=True):
+            profiler.reset()
+    
+    statements = profiler.top_statements(limit=20, order_by=order_by)
+    if statements:
+        profile_df = pd.DataFrame(statements)[
+            ['sql', 'calls', 'total_ms', 'avg_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'rows', 'lock_wait_ms', 'errors']
+        ]
+        st.dataframe(
+            profile_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'sql': st.column_config.TextColumn("Statement", width="large"),
+                'calls': "Calls",
+                'total_ms': st.column_config.NumberColumn("Total (ms)", format="%.1f"),
+                'avg_ms': st.column_config.NumberColumn("Avg (ms)", format="%.2f"),
+                'p50_ms': st.column_config.NumberColumn("p50 (ms)", format="%.2f"),
+                'p95_ms': st.column_config.NumberColumn("p95 (ms)", format="%.2f"),
+                'p99_ms': st.column_config.NumberColumn("p99 (ms)", format="%.2f"),
+                'max_ms': st.column_config.NumberColumn("Max (ms)", format="%.2f"),
+                'rows': "Rows",
+                'lock_wait_ms': st.column_config.NumberColumn("Lock wait (ms)", format="%.1f"),
+                'errors': "Errors"
+            }
+        )
+        st.caption(f"Since {format_ts(profiler.started_at)} · this app process only")
+    elif not profiler.enabled:
+        st.info("Query profiling is off. Switch on **Profile queries** to profile this app process until "
+                "it restarts, or start the app with `DB_PROFILE=1` to profile from startup.")
+    else:
+        st.info("No queries recorded yet.")
+    
+    slow_queries = profiler.slow_queries()
+    with st.expander(f"Slow queries (over {profiler.slow_seconds * 1000:.0f} ms): {len(slow_queries)}"):
+        if slow_queries:
+            slow_df = pd.DataFrame(slow_queries)
+            slow_df['ts'] = slow_df['ts'].map(format_ts)
+            st.dataframe(
+                slow_df[['ts', 'ms', 'sql', 'thread', 'failed']],
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    'ts': "When",
+                    'ms': st.column_config.NumberColumn("Duration (ms)", format="%.1f"),
+                    'sql': st.column_config.TextColumn("Statement", width="large"),
+                    'thread': "Thread",
+                    'failed': "Failed"
+                }
+            )
+        else:
+            st.write("No slow queries recorded.")
+
+def render_sales_archive():
+    """Render the sales archive status and the archive action"""
+    st.subheader("📦 Sales Archive")
+    
+    archived_years = get_archived_years()
+    st.caption(
+        f"Archived years: {', '.join(str(year) for year in archived_years)}" if archived_years
+        else "No sales have been archived yet."
+    )
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        keep_months = st.number_input(
+            "Months to keep in the live database",
+            min_value=1,
+            max_value=24,
+            value=ARCHIVE_KEEP_MONTHS
+        )
+    
+    with col2:
+        st.write("")  # Spacing
+        st.write("")  # Spacing
+        if st.button("📦 Archive Old Sales", use_container_width=True):
+            try:
+                archived = archive_old_sales(int(keep_months))
+                if archived:
+                    total = sum(archived.values())
+                    st.success(f"✅ Archived {total} invoices from {len(archived)} month(s)")
+                else:
+                    st.info("Nothing to archive.")
+            except Exception as e:
+                st.error(f"❌ Failed to archive sales: {e}")
+
+def render_terminal_sync():
+    """Render the hub sync status and the sync action"""
+    st.subheader("🔄 Terminal Sync")
+    
+    status = get_terminal_sync_status()
+    if not status['hub_path']:
+        st.caption("Set SYNC_HUB_PATH to a shared database file to sync this till with the others.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Terminal", status['terminal_id'] or "Not set")
+    
+    with col2:
+        st.metric("Changes to Send", status['pending'])
+    
+    with col3:
+        st.metric("Last Sync", format_ts(status['synced_ts']) if status['synced_ts'] else "Never")
+    
+    st.caption(f"Hub: {status['hub_path']}")
+    
+    if st.button("🔄 Sync Now", use_container_width=True, disabled=not status['terminal_id']):
+        try:
+            with st.spinner("Syncing with the hub..."):
+                sent, received, renumbered = sync_with_hub()
+            st.success(f"✅ Sent {sent} and received {received} change(s)")
+            for old_number, new_number in renumbered:
+                st.warning(f"⚠️ Invoice {old_number} was already used by another till; stored as {new_number}")
+        except Exception as e:
+            st.error(f"❌ Sync failed: {e}")
+
 def render_advanced_settings():
     """Render advanced settings"""
     st.subheader("🔧 Advanced Settings")
@@ -181,17 +442,23 @@ def render_advanced_settings():
     # Database management
     st.subheader("🗄️ Database Management")
     
-    st.info("💡 Database is stored locally as SQLite. Export/import functionality available below.")
+    if db_dialect.name == "sqlite":
+        st.info("💡 Database is stored locally as SQLite. Export/import functionality available below.")
+    else:
+        st.info(f"💡 Database is served by {describe_backend()}. Bulk import and sales archiving need the SQLite backend.")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        if st.button("📤 Export Data", use_container_width=True):
-            st.info("📋 Export functionality coming soon")
+        render_export_data()
     
     with col2:
-        if st.button("📥 Import Data", use_container_width=True):
-            st.info("📋 Import functionality coming soon")
+        if db_dialect.name == "sqlite":
+            render_import_data()
+    
+    if db_dialect.name == "sqlite":
+        render_sales_archive()
+        render_terminal_sync()
     
     # Performance settings
     st.subheader("⚡ Performance Settings")
@@ -221,6 +488,7 @@ def render_advanced_settings():
         - Delete all products and their data
         - Delete all invoices and sales records
         - Delete all invoice items
+        - Delete archived sales
         - **Keep user accounts** (admin, manager, cashier)
         - **Keep database structure** intact
         
@@ -255,6 +523,6 @@ def render_advanced_settings():
             "current_user": st.session_state.get('username', 'Not logged in'),
             "user_role": st.session_state.get('user_role', 'Unknown'),
             "authenticated": st.session_state.get('authenticated', False),
-            "database_mode": "Offline-First SQLite",
-            "database_provider": "Local File"
+            "database_mode": "Offline-First SQLite" if db_dialect.name == "sqlite" else "Multi-Till PostgreSQL",
+            "database_provider": describe_backend()
         }) 
\ No newline at end of file
@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
-import os
-from PIL import Image
-from utils.database import get_products, add_product, update_stock, get_low_stock_products
+from PIL import Image, ImageOps
+from utils.database import add_product, update_product, update_stock, get_low_stock_products
+from utils.catalog import get_catalog
+from utils.images import PRODUCT_IMAGE_SIZE, product_thumbnail, store_product_image
 
 def render_stock_page():
     """Render the stock management page"""
@@ -25,7 +26,8 @@ def render_current_stock():
     st.subheader("📦 Current Stock Levels")
     
     # Get all products
-    products = get_products()
+    catalog = get_catalog()
+    products = catalog.products
     
     if not products:
         st.info("No products found. Add some products to get started.")
@@ -41,7 +43,6 @@ def render_current_stock():
         stock_kg = product['stock_kg']
         category = product['category']
         description = product['description']
-        image_path = product['image_path'] if product['image_path'] else ''
         
         # Set a default minimum threshold for display
         min_threshold = 5.0  # Default threshold
@@ -54,8 +55,8 @@ def render_current_stock():
         else:
             status = "🟢 Good"
         
-        # Check if image exists
-        has_image = "📷 Yes" if image_path and os.path.exists(image_path) else "❌ No"
+        # Recorded with the product; no file check needed
+        has_image = "📷 Yes" if product['image_path'] else "❌ No"
         
         stock_data.append({
             'ID': product_id,
@@ -65,6 +66,7 @@ def render_current_stock():
             'Min Threshold (kg)': f"{min_threshold:.2f}",
             'Price/kg': f"${price_per_kg:.2f}",
             'Status': status,
+            'PLU': product['plu'] or "",
             'Has Image': has_image
         })
     
@@ -114,16 +116,16 @@ def render_current_stock():
         if selected_product_detail:
             # Find the selected product
             selected_id = int(selected_product_detail.split("ID: ")[1].rstrip(")"))
-            selected_prod = next((p for p in products if p['id'] == selected_id), None)
+            selected_prod = catalog.get(selected_id)
             
             if selected_prod:
                 col1, col2 = st.columns([1, 2])
                 
                 with col1:
                     # Display product image
-                    image_path = selected_prod['image_path'] if selected_prod['image_path'] else ''
-                    if image_path and os.path.exists(image_path):
-                        st.image(image_path, caption="Product Image", width=200)
+                    thumbnail = product_thumbnail(selected_prod)
+                    if thumbnail:
+                        st.image(thumbnail, caption="Product Image", width=200)
                     else:
                         st.markdown(
                             """
@@ -152,6 +154,25 @@ def render_current_stock():
                         st.markdown(f"**Description:** {selected_prod['description']}")
                     else:
                         st.markdown("**Description:** No description available")
+                    
+                    # PLU or barcode for the sale screen's scan field
+                    plu = st.text_input(
+                        "PLU / Barcode",
+                        value=selected_prod['plu'] or "",
+                        key=f"plu_{selected_prod['id']}",
+                        help="Item code printed on scale labels, or the full barcode of packaged goods"
+                    )
+                    if st.button("💾 Save PLU", key=f"save_plu_{selected_prod['id']}"):
+                        owner = catalog.find_plu(plu) if plu.strip() else None
+                        if owner and owner['id'] != selected_prod['id']:
+                            st.error(f"❌ PLU {plu} is already used by {owner['name']}")
+                        else:
+                            try:
+                                update_product(selected_prod['id'], plu=plu)
+                                st.success("✅ PLU saved")
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"❌ Failed to save PLU: {str(e)}")
     
     st.divider()
     
@@ -182,9 +203,25 @@ def render_current_stock():
         st.write("")  # Spacing
         update_button = st.button("🔄 Update Stock", use_container_width=True)
     
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        # Every stock change is kept in the stock ledger under one of these types
+        movement_labels = {"Count adjustment": "adjustment", "Goods received": "receipt", "Waste / spoilage": "waste"}
+        movement_label = st.selectbox("Reason Type", options=list(movement_labels.keys()))
+    
+    with col2:
+        reason = st.text_input("Note (optional)", placeholder="e.g., weekly count, delivery #123")
+    
     if update_button and selected_product:
         product_id = product_options[selected_product]
-        success = update_stock(product_id, new_quantity)
+        success = update_stock(
+            product_id,
+            new_quantity,
+            movement_type=movement_labels[movement_label],
+            reason=reason or None,
+            username=st.session_state.get('username')
+        )
         
         if success:
             st.success(f"✅ Stock updated successfully!")
@@ -212,6 +249,7 @@ def render_add_product():
                 step=0.01,
                 format="%.2f"
             )
+            plu = st.text_input("PLU / Barcode (Optional)", placeholder="e.g., 1234 as printed by the scale")
         
         with col2:
             unit = st.selectbox("Unit", ["kg", "lb", "piece"], index=0)
@@ -243,8 +281,8 @@ def render_add_product():
         # Show image preview if uploaded
         if uploaded_file is not None:
             image = Image.open(uploaded_file)
-            # Resize image to standard size for consistency
-            image = image.resize((300, 200), Image.Resampling.LANCZOS)
+            # Cropped to the standard size, as the stored thumbnail will be
+            image = ImageOps.fit(ImageOps.exif_transpose(image), PRODUCT_IMAGE_SIZE, Image.Resampling.LANCZOS)
             st.image(image, caption="Product Image Preview", width=200)
         
         submitted = st.form_submit_button("➕ Add Product", use_container_width=True)
@@ -252,27 +290,15 @@ def render_add_product():
         if submitted:
             if not product_name or not category or price_per_kg <= 0:
                 st.error("Please fill in all required fields with valid values.")
+            elif plu.strip() and get_catalog().find_plu(plu):
+                st.error(f"❌ PLU {plu} is already used by {get_catalog().find_plu(plu)['name']}")
             else:
                 try:
                     # Handle image upload
-                    image_path = ""
+                    image = None
                     if uploaded_file is not None:
-                        # Create products_images directory if it doesn't exist
-                        os.makedirs('products_images', exist_ok=True)
-                        
-                        # Generate filename based on product name
-                        safe_name = product_name.lower().replace(' ', '_').replace('/', '_')
-                        image_filename = f"{safe_name}.jpg"
-                        image_path = f"products_images/{image_filename}"
-                        
-                        # Save the uploaded image
-                        image = Image.open(uploaded_file)
-                        # Resize to standard size and save as JPEG
-                        image = image.resize((300, 200), Image.Resampling.LANCZOS)
-                        # Convert to RGB if it's RGBA (PNG with transparency)
-                        if image.mode == 'RGBA':
-                            image = image.convert('RGB')
-                        image.save(image_path, 'JPEG', quality=95)
+                        # Thumbnails named by content hash; a known picture is not stored twice
+                        image = store_product_image(uploaded_file)
                     
                     # Add product to database
                     product_id = add_product(
@@ -281,10 +307,14 @@ def render_add_product():
                         initial_stock,
                         category,
                         description,
-                        image_path
+                        image.path if image else "",
+                        image_hash=image.image_hash if image else None,
+                        image_width=image.width if image else None,
+                        image_height=image.height if image else None,
+                        plu=plu
                     )
                     st.success(f"✅ Product '{product_name}' added successfully!")
-                    if image_path:
+                    if image:
                         st.success(f"📷 Product image saved successfully!")
                     st.rerun()
                 except Exception as e:
@@ -357,11 +387,10 @@ def render_low_stock_alerts():
             st.write("")  # Spacing
             if st.button("📦 Restock Now", use_container_width=True):
                 # Find product ID
-                products = get_products()
                 product_id = None
                 current_stock = 0
                 
-                for product in products:
+                for product in get_catalog().products:
                     if product['name'] == selected_product_name:
                         product_id = product['id']
                         current_stock = product['stock_kg']
@@ -369,7 +398,13 @@ def render_low_stock_alerts():
                 
                 if product_id:
                     new_quantity = current_stock + restock_qty
-                    success = update_stock(product_id, new_quantity)
+                    success = update_stock(
+                        product_id,
+                        new_quantity,
+                        movement_type='receipt',
+                        reason="Low stock restock",
+                        username=st.session_state.get('username')
+                    )
                     
                     if success:
                         st.success(f"✅ Restocked {selected_product_name} with {restock_qty:.2f} kg")
@@ -1,7 +1,8 @@
 import streamlit as st
 import os
 from datetime import datetime
-from utils.database import get_db_connection
+from utils.database import db_connection
+from utils.timeutils import business_today
 from utils.auth import authenticate_user, get_user_role
 from app_pages import sale, stock, reports, settings
 
@@ -257,26 +258,24 @@ def main_interface():
         # Quick stats
         st.markdown("### Today's Summary")
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            with db_connection() as conn:
+                cursor = conn.cursor()
             
-            # Get today's sales count and total
-            today = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute("""
-                SELECT COUNT(*), COALESCE(SUM(total_amount), 0) 
-                FROM invoices 
-                WHERE DATE(created_at) = ?
-            """, (today,))
+                # Get today's sales count and total
+                today = business_today().strftime('%Y-%m-%d')
+                cursor.execute("""
+                    SELECT COALESCE(SUM(invoice_count), 0), COALESCE(SUM(revenue), 0) 
+                    FROM sales_hourly 
+                    WHERE business_day = ?
+                """, (today,))
             
-            result = cursor.fetchone()
+                result = cursor.fetchone()
+                cursor.close()
             count = result[0]
             total = result[1]
             
             st.metric("Sales Today", f"{count}")
             st.metric("Revenue Today", f"${total:.2f}")
-            
-            cursor.close()
-            conn.close()
         except Exception as e:
             st.error(f"Error loading stats: {e}")
         
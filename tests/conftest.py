@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# utils.database opens LOCAL_DB_PATH on import; keep tests off the shop's database
+os.environ["LOCAL_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="meatops-tests-"), "test.db")
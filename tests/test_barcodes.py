@@ -0,0 +1,25 @@
+import pytest
+from utils.barcodes import ean13_check_digit, parse_entry, price_label_weight
+
+def _label(prefix: int, plu: int, value: int) -> str:
+    body = f"{prefix}{plu:05d}{value:05d}"
+    return body + str(ean13_check_digit(body))
+
+def test_parse_labels_and_keyed_entries():
+    assert parse_entry(_label(21, 1234, 1250)) == ("1234", 1.25, None)
+    assert parse_entry(_label(26, 1234, 1999)) == ("1234", None, 19.99)
+    assert parse_entry("01234*0,75") == ("1234", 0.75, None)
+    assert parse_entry("1234") == ("1234", None, None)
+
+@pytest.mark.parametrize("text", ["1234*0", "1234*0.000", _label(21, 1234, 0), _label(26, 1234, 0)])
+def test_zero_weight_entries_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse_entry(text)
+
+def test_price_label_weight():
+    assert price_label_weight(19.99, 10.0) == 1.999
+    # 1 cent of a 25/kg product is 0.4 g
+    with pytest.raises(ValueError, match="less than 1 g"):
+        price_label_weight(0.01, 25.0, "Brisket")
+    with pytest.raises(ValueError, match="no price per kg"):
+        price_label_weight(5.0, 0, "Bones")
@@ -0,0 +1,72 @@
+from concurrent.futures import Future
+import pytest
+from utils import database
+from utils.database import CheckoutWriter, add_product, create_invoice, db_connection
+
+class IdleWriter(CheckoutWriter):
+    """A writer whose thread has not picked up the queue yet"""
+
+    def start(self):
+        pass
+
+class BusyWriter(CheckoutWriter):
+    """A writer stuck in the middle of writing every submitted cart"""
+
+    def submit(self, cart):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        return future
+
+@pytest.fixture
+def items():
+    product_id = add_product("Brisket", 25, 100, "Beef")
+    return [{'product_id': product_id, 'product_name': "Brisket", 'weight_kg': 1.0,
+             'price_per_kg': 25, 'total_price': 25.0}]
+
+def _invoice_count():
+    with db_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+def test_checkout_commits(items):
+    before = _invoice_count()
+    success, invoice_number, invoice_id = create_invoice(None, None, items, "cash")
+    assert success and invoice_number and invoice_id
+    assert _invoice_count() == before + 1
+
+def test_timed_out_queued_cart_is_never_written(items, monkeypatch):
+    writer = IdleWriter()
+    monkeypatch.setattr(database, "_checkout_writer", writer)
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT", 0.05)
+    before = _invoice_count()
+    success, error, _ = create_invoice(None, None, items, "cash")
+    assert success is False and "not recorded" in error
+    # The writer catches up later and skips the cancelled cart
+    CheckoutWriter.start(writer)
+    writer.stop()
+    assert _invoice_count() == before
+
+def test_cart_being_written_is_reported_pending(items, monkeypatch):
+    monkeypatch.setattr(database, "_checkout_writer", BusyWriter())
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT", 0.05)
+    success, message, _ = create_invoice(None, None, items, "cash")
+    assert success is None and "still being saved" in message
+
+def test_writer_that_cannot_connect_fails_queued_carts(items, monkeypatch):
+    def refuse():
+        raise OSError("disk unavailable")
+    monkeypatch.setattr(database._pool, "_connect", refuse)
+    writer = CheckoutWriter()
+    result = writer.submit({'items': items, 'payment_method': "cash"}).result(timeout=5)
+    assert result == (False, "Could not open the database for checkout: disk unavailable", None)
+
+def test_failure_after_commit_keeps_the_sale(items, monkeypatch):
+    def broken(carts, results):
+        raise RuntimeError("overview unavailable")
+    monkeypatch.setattr(database, "_record_sales", broken)
+    writer = CheckoutWriter()
+    monkeypatch.setattr(database, "_checkout_writer", writer)
+    before = _invoice_count()
+    success, invoice_number, _ = create_invoice(None, None, items, "cash")
+    writer.stop()
+    assert success and invoice_number
+    assert _invoice_count() == before + 1
@@ -0,0 +1,9 @@
+from utils.pg_schema import pg_data_tables
+from utils.rollups import ROLLUP_TABLES
+
+def test_reset_clears_every_table_but_users():
+    tables = pg_data_tables()
+    assert "users" not in tables
+    assert len(tables) == len(set(tables))
+    for table in ("products", "invoices", "invoice_items", "stock_movements", "stock_holds", *ROLLUP_TABLES):
+        assert table in tables
@@ -0,0 +1,30 @@
+import sqlite3
+import pytest
+from utils.profiler import ProfiledConnection, profiler
+
+@pytest.fixture
+def conn():
+    enabled = profiler.enabled
+    profiler.enabled = True
+    profiler.reset()
+    conn = sqlite3.connect(":memory:", factory=ProfiledConnection)
+    yield conn
+    conn.close()
+    profiler.enabled = enabled
+    profiler.reset()
+
+def _stats(sql: str) -> dict:
+    return next(row for row in profiler.top_statements(limit=100) if row["sql"] == sql)
+
+def test_connection_shortcuts_are_profiled(conn):
+    conn.execute("CREATE TABLE cuts (name TEXT, price REAL)")
+    conn.executemany("INSERT INTO cuts VALUES (?, ?)", [("Brisket", 25), ("Ribeye", 40)])
+    assert conn.execute("SELECT name FROM cuts WHERE price > 10").fetchall() == [("Brisket",), ("Ribeye",)]
+    assert _stats("INSERT INTO cuts VALUES (?, ?)")["rows"] == 2
+    select = _stats("SELECT name FROM cuts WHERE price > ?")
+    assert select["calls"] == 1 and select["rows"] == 2
+
+def test_disabled_profiler_records_nothing(conn):
+    profiler.enabled = False
+    conn.execute("SELECT 1").fetchall()
+    assert profiler.top_statements() == []
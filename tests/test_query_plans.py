@@ -0,0 +1,19 @@
+import sqlite3
+from utils.migrations import apply_migrations, check_query_plans, find_full_scans
+
+def test_hot_queries_search_an_index():
+    conn = sqlite3.connect(":memory:")
+    apply_migrations(conn)
+    check_query_plans(conn, verbose=False)
+
+def test_index_scans_count_as_full_scans():
+    plans = {
+        "held": ["SCAN stock_holds USING INDEX idx_stock_holds_product"],
+        "covering": ["SCAN invoices USING COVERING INDEX idx_invoices_created_ts"],
+        "table": ["SCAN products"],
+        "search": ["SEARCH stock_holds USING COVERING INDEX idx_stock_holds_expires (expires_ts>?)"],
+        "fts": ["SCAN f VIRTUAL TABLE INDEX 0:M3", "SEARCH i USING INTEGER PRIMARY KEY (rowid=?)"],
+        "fts_ranked": ["SCAN f VIRTUAL TABLE INDEX 32:M3"],
+        "fts_all_rows": ["SCAN f VIRTUAL TABLE INDEX 0:"],
+    }
+    assert set(find_full_scans(plans)) == {"held", "covering", "table", "fts_all_rows"}
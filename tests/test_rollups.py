@@ -0,0 +1,45 @@
+import pytest
+from utils.archive import INVOICES_VIEW, INVOICE_ITEMS_VIEW, archive_month, attached_partitions
+from utils.rollups import check_rollups, rebuild_rollups
+from utils.sync import open_database
+
+ARCHIVE_TABLES = (INVOICES_VIEW, INVOICE_ITEMS_VIEW)
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = open_database(str(tmp_path / "shop.db"))
+    product_id = conn.execute(
+        "INSERT INTO products (name, price_per_kg, stock_kg, category) VALUES ('Brisket', 25, 100, 'Beef') RETURNING id"
+    ).fetchone()[0]
+    for number, (day, ts) in enumerate([("2024-05-10", 1715335200), ("2024-05-11", 1715421600),
+                                        ("2024-07-02", 1719914400)], start=1):
+        invoice_id = conn.execute("""
+            INSERT INTO invoices (invoice_number, total_amount, payment_method, created_ts, business_day, business_hour)
+            VALUES (?, 25, 'cash', ?, ?, 10)
+            RETURNING id
+        """, (f"INV-{number}", ts, day)).fetchone()[0]
+        conn.execute("""
+            INSERT INTO invoice_items (invoice_id, product_id, product_name, weight_kg, price_per_kg, total_price)
+            VALUES (?, ?, 'Brisket', 1, 25, 25)
+        """, (invoice_id, product_id))
+    yield conn
+    conn.close()
+
+def _rollups(conn):
+    return {table: [tuple(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2")]
+            for table in ("sales_hourly", "sales_by_payment", "sales_by_product")}
+
+def test_rebuild_keeps_archived_days(conn, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    before = _rollups(conn)
+    assert archive_month(conn, "2024-05", archive_dir) == 2
+    assert conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 1
+
+    with attached_partitions(conn, archive_dir=archive_dir) as conn:
+        assert check_rollups(conn, sales_tables=ARCHIVE_TABLES) == []
+        conn.execute("BEGIN")
+        rebuild_rollups(conn, sales_tables=ARCHIVE_TABLES)
+        conn.execute("COMMIT")
+        assert check_rollups(conn, sales_tables=ARCHIVE_TABLES) == []
+    assert _rollups(conn) == before
+    assert len(before["sales_hourly"]) == 3
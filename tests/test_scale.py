@@ -0,0 +1,73 @@
+import os
+import time
+import pytest
+from utils.scale import ScaleReader, parse_scale_line
+
+pty = pytest.importorskip("pty")
+
+# A pseudo-terminal stands in for the scale: the reader opens the slave side,
+# the test writes the scale's frames to the master side.
+
+@pytest.fixture
+def scale():
+    master, slave = pty.openpty()
+    reader = ScaleReader(os.ttyname(slave))
+    reader.start()
+    # Opening the port flushes pending input, so only write once it is open
+    deadline = time.monotonic() + 5
+    while not reader.state().connected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield master, reader
+    reader.stop()
+    os.close(master)
+    os.close(slave)
+
+def _send(master, reader, *frames):
+    """Write frames and wait until the reader has seen the last one"""
+    os.write(master, b"".join(frame.encode() + b"\r\n" for frame in frames))
+    expected = parse_scale_line(frames[-1], ts=0)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        reading = reader.state().reading
+        if reading is not None and reading._replace(ts=0) == expected:
+            return reader.state()
+        time.sleep(0.01)
+    raise AssertionError(f"reader did not see {frames[-1]!r}")
+
+def test_parse_frames():
+    assert parse_scale_line("ST,GS,+0001.250kg", ts=0) == (1.25, True, False, False, 0)
+    assert parse_scale_line("US,NT,-  12.5 g", ts=0) == (-0.013, False, True, False, 0)
+    assert parse_scale_line("OL,GS,", ts=0).overload
+    assert parse_scale_line("garbage") is None
+
+def test_stable_weight_fills_once_per_weighing(scale):
+    master, reader = scale
+    state = _send(master, reader, "US,GS,+0000.800kg", "US,GS,+0001.100kg")
+    assert state.connected and state.settled_weight() is None
+
+    state = _send(master, reader, "ST,GS,+0001.234kg")
+    assert state.settled_weight() == 1.234
+    weighing = state.weighing
+
+    # Repeated stable frames are the same weighing
+    state = _send(master, reader, "ST,GS,+0001.234kg", "ST,GS,+0001.234kg")
+    assert state.weighing == weighing
+
+def test_tare_frames_are_net_weights(scale):
+    master, reader = scale
+    state = _send(master, reader, "US,NT,+0000.300kg", "ST,NT,+0000.450kg")
+    assert state.reading.net
+    assert state.settled_weight() == 0.45
+
+def test_stable_zero_does_not_fill(scale):
+    master, reader = scale
+    _send(master, reader, "ST,GS,+0001.000kg")
+    state = _send(master, reader, "US,GS,+0000.200kg", "ST,GS,+0000.000kg")
+    assert state.reading.stable
+    assert state.settled_weight() is None
+
+def test_motion_after_weighing_does_not_fill(scale):
+    master, reader = scale
+    _send(master, reader, "ST,GS,+0001.000kg")
+    state = _send(master, reader, "US,GS,+0001.300kg")
+    assert state.settled_weight() is None
@@ -0,0 +1,22 @@
+import pytest
+from utils.stock_holds import available_stock, place_hold
+from utils.sync import open_database
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = open_database(str(tmp_path / "holds.db"))
+    conn.execute("INSERT INTO products (name, price_per_kg, stock_kg, category) VALUES ('Brisket', 25, 2, 'Beef')")
+    yield conn
+    conn.close()
+
+def test_holds_reduce_available_stock(conn):
+    cursor = conn.cursor()
+    assert place_hold(cursor, "cart-a", 1, 1.5, 1000) is not None
+    assert available_stock(cursor, 1, 1000) == 0.5
+    assert place_hold(cursor, "cart-b", 1, 1.0, 1000) is None
+
+@pytest.mark.parametrize("weight", [0, -0.5, None])
+def test_non_positive_hold_is_a_value_error(conn, weight):
+    with pytest.raises(ValueError, match="greater than 0"):
+        place_hold(conn.cursor(), "cart-a", 1, weight, 1000)
+    assert conn.execute("SELECT COUNT(*) FROM stock_holds").fetchone()[0] == 0
@@ -0,0 +1,81 @@
+import pytest
+from utils.sync import open_database, renumbered_invoice_number, sync_databases
+
+# Two tills and a hub, each its own SQLite file, synced the way the Settings page does it.
+
+@pytest.fixture
+def tills(tmp_path):
+    conns = {name: open_database(str(tmp_path / f"{name}.db")) for name in ("t1", "t2", "hub")}
+    yield conns
+    for conn in conns.values():
+        conn.close()
+
+def _sell(conn, invoice_number, product_name, weight_kg, price_per_kg=10.0):
+    """Record a sale directly, with the number a till allocated"""
+    conn.execute("BEGIN")
+    row = conn.execute("SELECT id FROM products WHERE name = ?", (product_name,)).fetchone()
+    product_id = row[0] if row else conn.execute(
+        "INSERT INTO products (name, price_per_kg, stock_kg, category) VALUES (?, ?, 100, 'Beef') RETURNING id",
+        (product_name, price_per_kg)
+    ).fetchone()[0]
+    total = weight_kg * price_per_kg
+    invoice_id = conn.execute("""
+        INSERT INTO invoices (invoice_number, total_amount, payment_method, created_ts, business_day, business_hour)
+        VALUES (?, ?, 'cash', 1735725600, '2025-01-01', 10)
+        RETURNING id
+    """, (invoice_number, total)).fetchone()[0]
+    conn.execute("""
+        INSERT INTO invoice_items (invoice_id, product_id, product_name, weight_kg, price_per_kg, total_price)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (invoice_id, product_id, product_name, weight_kg, price_per_kg, total))
+    conn.execute("COMMIT")
+
+def _invoices(conn):
+    return {row[0]: row[1] for row in conn.execute("SELECT uid, invoice_number FROM invoices")}
+
+def test_sync_requires_terminal_id(tills):
+    with pytest.raises(ValueError):
+        sync_databases(tills["t1"], tills["hub"], "")
+
+def test_sales_reach_every_till(tills):
+    _sell(tills["t1"], "INV-T1-20250101-0001", "Beef", 1.0)
+    _sell(tills["t2"], "INV-T2-20250101-0001", "Lamb", 2.0)
+
+    assert sync_databases(tills["t1"], tills["hub"], "T1")[2] == []
+    assert sync_databases(tills["t2"], tills["hub"], "T2")[2] == []
+    sync_databases(tills["t1"], tills["hub"], "T1")
+
+    assert _invoices(tills["t1"]) == _invoices(tills["t2"]) == _invoices(tills["hub"])
+    assert len(_invoices(tills["hub"])) == 2
+    names = {row[0] for row in tills["t1"].execute("SELECT name FROM products")}
+    assert names == {"Beef", "Lamb"}
+
+def test_duplicate_invoice_numbers_are_renumbered(tills):
+    # Both tills sold before TERMINAL_ID was set, so both have INV-20250101-0001
+    _sell(tills["t1"], "INV-20250101-0001", "Beef", 1.0)
+    _sell(tills["t2"], "INV-20250101-0001", "Beef", 3.0)
+
+    sync_databases(tills["t1"], tills["hub"], "T1")
+    sent, _, renumbered = sync_databases(tills["t2"], tills["hub"], "T2")
+    assert sent > 0
+    t1_uid, = _invoices(tills["t1"])
+    t2_uid, = (uid for uid in _invoices(tills["t2"]) if uid != t1_uid)
+    # T2's sale is renumbered on the hub, T1's sale on T2; each till keeps the numbers it printed
+    assert renumbered == [
+        ("INV-20250101-0001", renumbered_invoice_number("INV-20250101-0001", t2_uid)),
+        ("INV-20250101-0001", renumbered_invoice_number("INV-20250101-0001", t1_uid)),
+    ]
+
+    # The clash does not block later syncs, and nothing is applied twice
+    _sell(tills["t2"], "INV-T2-20250101-0002", "Beef", 0.5)
+    assert sync_databases(tills["t2"], tills["hub"], "T2")[2] == []
+    assert sync_databases(tills["t2"], tills["hub"], "T2")[:2] == (0, 0)
+    sync_databases(tills["t1"], tills["hub"], "T1")
+
+    hub = _invoices(tills["hub"])
+    assert len(hub) == 3
+    assert hub[t1_uid] == "INV-20250101-0001"
+    assert hub[t2_uid] == renumbered_invoice_number("INV-20250101-0001", t2_uid)
+    assert _invoices(tills["t1"]) == hub
+    assert _invoices(tills["t2"])[t2_uid] == "INV-20250101-0001"
+    assert len(_invoices(tills["t2"])) == 3
@@ -0,0 +1,22 @@
+from datetime import date
+import pytest
+from utils import timeutils
+
+def test_shop_timezone_follows_dst(monkeypatch):
+    monkeypatch.setenv("SHOP_TIMEZONE", "Europe/Paris")
+    monkeypatch.setattr(timeutils, "SHOP_TZ", timeutils._load_shop_timezone())
+    # 23:30 UTC is already the next day in summer (UTC+2) but still the same day in winter (UTC+1)
+    assert timeutils.business_time(1719963000) == ("2024-07-03", 1)
+    assert timeutils.business_time(1704324600) == ("2024-01-04", 0)
+    assert timeutils.day_start_ts(date(2024, 7, 3)) == 1719957600
+    assert timeutils.day_start_ts(date(2024, 1, 3)) == 1704236400
+
+def test_system_zone_from_tz(monkeypatch):
+    monkeypatch.delenv("SHOP_TIMEZONE", raising=False)
+    monkeypatch.setenv("TZ", ":/usr/share/zoneinfo/America/New_York")
+    assert timeutils._load_shop_timezone().key == "America/New_York"
+
+def test_unknown_timezone_fails(monkeypatch):
+    monkeypatch.setenv("SHOP_TIMEZONE", "Nowhere/Shop")
+    with pytest.raises(RuntimeError, match="SHOP_TIMEZONE"):
+        timeutils._load_shop_timezone()
@@ -0,0 +1,242 @@
+import glob
+import os
+import re
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import date
+
+# Closed months of sales move out of the live database into one SQLite file per
+# year, so the live file (and its page cache, backups and VACUUM) only holds
+# recent sales. Rollups are not archived: reports over old days keep reading
+# them from the live database. Invoice-level reads attach just the yearly
+# files that overlap the requested range and query them through temp views;
+# invoice search queries each file's own full-text index.
+
+ARCHIVE_DIR = os.getenv(
+    "ARCHIVE_DIR", f"{os.path.splitext(os.getenv('LOCAL_DB_PATH', 'meat_shop.db'))[0]}_archive"
+)
+# Months kept in the live database, counting the current one
+ARCHIVE_KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", "3"))
+# SQLite allows 10 attached databases by default; leave room for the report snapshot
+ARCHIVE_MAX_ATTACHED = 8
+
+INVOICE_COLUMNS = (
+    "id, invoice_number, customer_name, customer_phone, total_amount, payment_method, "
+    "created_at, created_ts, business_day, business_hour"
+)
+INVOICE_ITEM_COLUMNS = "id, invoice_id, product_id, product_name, weight_kg, price_per_kg, total_price"
+
+# Union views over the live tables and the attached partitions
+INVOICES_VIEW = "sales_invoices"
+INVOICE_ITEMS_VIEW = "sales_invoice_items"
+
+ARCHIVE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.invoices (
+        id INTEGER PRIMARY KEY,
+        invoice_number TEXT UNIQUE NOT NULL,
+        customer_name TEXT,
+        customer_phone TEXT,
+        total_amount REAL NOT NULL,
+        payment_method TEXT NOT NULL,
+        created_at TIMESTAMP,
+        created_ts INTEGER,
+        business_day TEXT,
+        business_hour INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.invoice_items (
+        id INTEGER PRIMARY KEY,
+        invoice_id INTEGER NOT NULL,
+        product_id INTEGER,
+        product_name TEXT NOT NULL,
+        weight_kg REAL NOT NULL,
+        price_per_kg REAL NOT NULL,
+        total_price REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_invoices_created_ts ON invoices (created_ts)",
+    """
+    CREATE INDEX IF NOT EXISTS {schema}.idx_invoice_items_invoice
+    ON invoice_items (invoice_id, product_name, weight_kg, price_per_kg, total_price)
+    """,
+    # Same search index as the live invoices_fts, so archived invoices stay searchable
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.invoices_fts USING fts5(
+        invoice_number, customer_name, customer_phone,
+        content='invoices', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )
+    """,
+)
+
+def partition_path(year: int, archive_dir: str = ARCHIVE_DIR) -> str:
+    """Path of the archive file holding a year's sales"""
+    return os.path.join(archive_dir, f"sales_{year}.db")
+
+def list_partitions(archive_dir: str = ARCHIVE_DIR):
+    """Years that have an archive file, oldest first"""
+    years = []
+    for path in glob.glob(os.path.join(archive_dir, "sales_*.db")):
+        match = re.fullmatch(r"sales_(\d{4})\.db", os.path.basename(path))
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+def overlapping_partitions(start_day: str = None, end_day: str = None, archive_dir: str = ARCHIVE_DIR):
+    """Archived years overlapping business days [start_day, end_day)"""
+    first_year = int(start_day[:4]) if start_day else 0
+    last_year = int(end_day[:4]) if end_day else 9999
+    return [year for year in list_partitions(archive_dir) if first_year <= year <= last_year]
+
+def archive_cutoff(today: date, keep_months: int = ARCHIVE_KEEP_MONTHS) -> str:
+    """First business day that stays live: the start of the oldest kept month"""
+    month_index = today.year * 12 + today.month - 1 - max(keep_months - 1, 0)
+    return date(month_index // 12, month_index % 12 + 1, 1).isoformat()
+
+def _attach(conn, path: str, schema: str):
+    conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+
+def archive_month(conn, month: str, archive_dir: str = ARCHIVE_DIR) -> int:
+    """Move one closed month ('YYYY-MM') of invoices and items into its yearly archive
+
+    conn must be a dedicated connection to the live database with no open
+    transaction. The copy is committed before the live rows are deleted, and
+    is idempotent, so an interrupted run is safe to repeat. Returns the
+    number of invoices moved.
+    """
+    year, month_number = int(month[:4]), int(month[5:7])
+    start_day = f"{month}-01"
+    end_day = date(year + month_number // 12, month_number % 12 + 1, 1).isoformat()
+    os.makedirs(archive_dir, exist_ok=True)
+
+    _attach(conn, partition_path(year, archive_dir), "archive")
+    try:
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement.format(schema="archive"))
+
+        # 1. Copy into the archive
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                INSERT OR IGNORE INTO archive.invoices ({INVOICE_COLUMNS})
+                SELECT {INVOICE_COLUMNS} FROM main.invoices
+                WHERE business_day >= ? AND business_day < ?
+            """, (start_day, end_day))
+            conn.execute(f"""
+                INSERT OR IGNORE INTO archive.invoice_items ({INVOICE_ITEM_COLUMNS})
+                SELECT {INVOICE_ITEM_COLUMNS} FROM main.invoice_items
+                WHERE invoice_id IN (
+                    SELECT id FROM main.invoices WHERE business_day >= ? AND business_day < ?
+                )
+            """, (start_day, end_day))
+            # Also indexes archives written before they had a search index
+            conn.execute("INSERT INTO archive.invoices_fts (invoices_fts) VALUES ('rebuild')")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        # 2. Delete from the live database only what the archive now holds
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            missing = conn.execute("""
+                SELECT COUNT(*) FROM main.invoices i
+                WHERE i.business_day >= ? AND i.business_day < ?
+                  AND i.id NOT IN (SELECT id FROM archive.invoices)
+            """, (start_day, end_day)).fetchone()[0]
+            if missing:
+                raise RuntimeError(f"{missing} invoice(s) for {month} are missing from the archive")
+            conn.execute("""
+                DELETE FROM main.invoice_items WHERE invoice_id IN (
+                    SELECT id FROM main.invoices WHERE business_day >= ? AND business_day < ?
+                )
+            """, (start_day, end_day))
+            moved = conn.execute(
+                "DELETE FROM main.invoices WHERE business_day >= ? AND business_day < ?", (start_day, end_day)
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return moved
+    finally:
+        conn.execute("DETACH DATABASE archive")
+
+def archive_closed_months(conn, today: date, keep_months: int = ARCHIVE_KEEP_MONTHS,
+                          archive_dir: str = ARCHIVE_DIR):
+    """Archive every month older than the kept window; returns {month: invoices moved}"""
+    cutoff = archive_cutoff(today, keep_months)
+    months = [row[0] for row in conn.execute("""
+        SELECT DISTINCT substr(business_day, 1, 7) FROM invoices
+        WHERE business_day < ?
+        ORDER BY 1
+    """, (cutoff,))]
+    return {month: archive_month(conn, month, archive_dir) for month in months}
+
+@contextmanager
+def attached_partitions(conn, start_day: str = None, end_day: str = None, archive_dir: str = ARCHIVE_DIR):
+    """Attach the archives overlapping [start_day, end_day) and expose union views
+
+    Inside the block, sales_invoices and sales_invoice_items read the live
+    tables plus only the overlapping archives. Fetch all rows before leaving
+    the block; the views are dropped and the archives detached on exit.
+    """
+    years = overlapping_partitions(start_day, end_day, archive_dir)
+    if len(years) > ARCHIVE_MAX_ATTACHED:
+        raise ValueError(f"Date range spans {len(years)} archived years; narrow it to {ARCHIVE_MAX_ATTACHED} or fewer")
+
+    schemas = []
+    try:
+        for year in years:
+            schema = f"archive_{year}"
+            _attach(conn, partition_path(year, archive_dir), schema)
+            schemas.append(schema)
+
+        invoice_selects = [f"SELECT {INVOICE_COLUMNS} FROM main.invoices"]
+        item_selects = [f"SELECT {INVOICE_ITEM_COLUMNS} FROM main.invoice_items"]
+        for schema in schemas:
+            invoice_selects.append(f"SELECT {INVOICE_COLUMNS} FROM {schema}.invoices")
+            item_selects.append(f"SELECT {INVOICE_ITEM_COLUMNS} FROM {schema}.invoice_items")
+        conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS {INVOICES_VIEW} AS {' UNION ALL '.join(invoice_selects)}")
+        conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS {INVOICE_ITEMS_VIEW} AS {' UNION ALL '.join(item_selects)}")
+        yield conn
+    finally:
+        conn.execute(f"DROP VIEW IF EXISTS temp.{INVOICES_VIEW}")
+        conn.execute(f"DROP VIEW IF EXISTS temp.{INVOICE_ITEMS_VIEW}")
+        for schema in schemas:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+def searchable_partitions(conn):
+    """Schemas of the attached archives that have an invoice search index"""
+    schemas = [row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith("archive_")]
+    return [schema for schema in schemas if conn.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'invoices_fts'"
+    ).fetchone()]
+
+def clear_archives(archive_dir: str = ARCHIVE_DIR):
+    """Delete every archive file"""
+    for year in list_partitions(archive_dir):
+        os.remove(partition_path(year, archive_dir))
+
+if __name__ == "__main__":
+    # Usage: python -m utils.archive list|run [db_path] [--vacuum]
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    args = [arg for arg in sys.argv[2:] if not arg.startswith("--")]
+    db_path = args[0] if args else os.getenv("LOCAL_DB_PATH", "meat_shop.db")
+    archive_dir = os.getenv("ARCHIVE_DIR", f"{os.path.splitext(db_path)[0]}_archive")
+    if command == "run":
+        from utils.timeutils import business_today
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            for month, moved in archive_closed_months(conn, business_today(), archive_dir=archive_dir).items():
+                print(f"{month}: {moved} invoice(s) archived")
+            if "--vacuum" in sys.argv:
+                conn.execute("VACUUM")
+                print("Live database vacuumed.")
+        finally:
+            conn.close()
+    for year in list_partitions(archive_dir):
+        print(f"{year}: {partition_path(year, archive_dir)}")
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import re
+from pathlib import Path
+import streamlit as st
+
+# Stylesheet delivery. assets/app.css is minified once per process, together
+# with @font-face rules for any fonts self-hosted in static/fonts, and written
+# to static/ under a name carrying its content hash. Streamlit serves static/
+# (server.enableStaticServing in .streamlit/config.toml), so each rerun only
+# sends a one-line @import of that URL and the browser fetches the file once;
+# a changed stylesheet gets a new name. Without static serving the minified
+# CSS is inlined instead. Nothing is loaded from the internet, so offline
+# tills never wait on a font server: without font files the system UI font
+# is used.
+
+APP_DIR = Path(__file__).resolve().parent.parent
+ASSETS_DIR = APP_DIR / "assets"
+# Streamlit serves the static folder next to the main script
+STATIC_DIR = APP_DIR / "static"
+# Self-hosted fonts, named <Family>-<weight>.woff2 (e.g. Inter-600.woff2)
+FONT_DIR = STATIC_DIR / "fonts"
+
+_FONT_FILE = re.compile(r"^(?P<family>[A-Za-z ]+)-(?P<weight>\d{3})\.woff2$")
+
+def minify_css(css: str) -> str:
+    """Strip comments and the whitespace CSS does not need"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+def static_url(name: str) -> str:
+    """URL of a file in the static folder, honouring server.baseUrlPath"""
+    base = st.get_option("server.baseUrlPath").strip("/")
+    return f"/{base}/app/static/{name}" if base else f"/app/static/{name}"
+
+def font_faces() -> str:
+    """@font-face rules for the fonts found in static/fonts"""
+    rules = []
+    for path in sorted(FONT_DIR.glob("*.woff2")):
+        match = _FONT_FILE.match(path.name)
+        if match:
+            rules.append(
+                f"@font-face{{font-family:'{match['family']}';font-weight:{match['weight']};font-display:swap;"
+                f"src:url('{static_url(f'fonts/{path.name}')}') format('woff2')}}"
+            )
+    return "".join(rules)
+
+def build_stylesheet():
+    """Minify the app stylesheet into static/app.<hash>.css; returns (file name, css)
+
+    Earlier builds are removed. The file is only written when its content changed.
+    """
+    css = font_faces() + minify_css((ASSETS_DIR / "app.css").read_text(encoding="utf-8"))
+    name = f"app.{hashlib.sha256(css.encode()).hexdigest()[:12]}.css"
+    path = STATIC_DIR / name
+    if not path.exists():
+        STATIC_DIR.mkdir(exist_ok=True)
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(css, encoding="utf-8")
+        os.replace(temp_path, path)
+        for old in STATIC_DIR.glob("app.*.css"):
+            if old.name != name:
+                old.unlink(missing_ok=True)
+    return name, css
+
+def _stylesheet_html() -> str:
+    name, css = build_stylesheet()
+    if st.get_option("server.enableStaticServing"):
+        return f"<style>@import url('{static_url(name)}');</style>"
+    return f"<style>{css}</style>"
+
+# Built once at import; every rerun sends the same short string
+STYLESHEET_HTML = _stylesheet_html()
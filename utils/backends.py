@@ -0,0 +1,317 @@
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import count
+from utils.profiler import POOL_WAIT_KEY, profiler
+
+# Storage backends. The application writes SQL in the SQLite dialect (with ?
+# placeholders); a backend hands out pooled connections and a Dialect that
+# translates statements and supplies the few constructs that differ. SQLite is
+# the default single-till setup. PostgreSQL (DB_BACKEND=postgresql) is for
+# multi-till stores: it takes concurrent writers, with row locks on the
+# products being sold instead of one database-wide write lock.
+
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite").strip().lower()
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "30"))
+# Rows per round trip when streaming large reads
+STREAM_CHUNK_SIZE = int(os.getenv("DB_STREAM_CHUNK_SIZE", "2000"))
+
+BACKENDS = ("sqlite", "postgresql")
+
+class SQLiteDialect:
+    """SQL as the application writes it"""
+
+    name = "sqlite"
+
+    def sql(self, statement: str) -> str:
+        return statement
+
+    def in_list(self, column: str) -> str:
+        """Condition matching column against a list passed as one parameter"""
+        return f"{column} IN (SELECT value FROM json_each(?))"
+
+    def list_param(self, values):
+        return json.dumps(list(values))
+
+    def begin_write(self, cursor):
+        """Open a write transaction, taking the database write lock up front"""
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def lock_products(self, cursor, product_ids):
+        """Lock product rows before reading their stock (covered by the write lock here)"""
+        pass
+
+# ? outside quoted strings and identifiers becomes %s; psycopg reads % everywhere, so it is doubled
+_PLACEHOLDER_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\?|%")
+
+def _pyformat_token(match) -> str:
+    token = match.group(0)
+    return "%s" if token == "?" else token.replace("%", "%%")
+
+@lru_cache(maxsize=1024)
+def _pyformat(statement: str) -> str:
+    return _PLACEHOLDER_TOKENS.sub(_pyformat_token, statement)
+
+class PostgresDialect:
+    """Translation of the application's SQL for psycopg"""
+
+    name = "postgresql"
+
+    def sql(self, statement: str) -> str:
+        return _pyformat(statement)
+
+    def in_list(self, column: str) -> str:
+        return f"{column} = ANY(?)"
+
+    def list_param(self, values):
+        return list(values)
+
+    def begin_write(self, cursor):
+        # psycopg opens the transaction on the first statement; row locks do the rest
+        pass
+
+    def lock_products(self, cursor, product_ids):
+        # Always in id order, so two tills selling the same products cannot deadlock
+        cursor.execute(
+            "SELECT id FROM products WHERE id = ANY(?) ORDER BY id FOR UPDATE", (sorted(product_ids),)
+        )
+
+DIALECTS = {"sqlite": SQLiteDialect(), "postgresql": PostgresDialect()}
+
+class Row(tuple):
+    """Result row readable by position or column name, like sqlite3.Row"""
+
+    def __new__(cls, values, index):
+        row = super().__new__(cls, values)
+        row._index = index
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._index)
+
+def _row_factory(cursor):
+    """psycopg row factory producing Row objects"""
+    if cursor.description is None:
+        return tuple
+    index = {column.name: position for position, column in enumerate(cursor.description)}
+    return lambda values: Row(values, index)
+
+class PgCursor:
+    """psycopg cursor that accepts the application's ?-style SQL"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            if parameters:
+                self._cursor.execute(_pyformat(sql), parameters)
+            else:
+                self._cursor.execute(sql)
+        except Exception:
+            if profiler.enabled:
+                profiler.record(sql, time.perf_counter() - start, 0, True)
+            raise
+        if profiler.enabled:
+            profiler.record(sql, time.perf_counter() - start, max(self._cursor.rowcount, 0))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        self._cursor.executemany(_pyformat(sql), list(seq_of_parameters))
+        if profiler.enabled:
+            profiler.record(sql, time.perf_counter() - start, max(self._cursor.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+class PgConnection:
+    """psycopg connection with the sqlite3.Connection methods the application uses"""
+
+    _stream_ids = count(1)
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def cursor(self):
+        return PgCursor(self.raw.cursor())
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    @property
+    def in_transaction(self) -> bool:
+        from psycopg.pq import TransactionStatus
+        return self.raw.info.transaction_status != TransactionStatus.IDLE
+
+    def stream(self, sql, parameters=(), chunk_size: int = STREAM_CHUNK_SIZE):
+        """Yield lists of rows from a server-side cursor, chunk_size rows per round trip"""
+        cursor = self.raw.cursor(name=f"meatops_stream_{next(self._stream_ids)}")
+        try:
+            cursor.itersize = chunk_size
+            cursor.execute(_pyformat(sql) if parameters else sql, parameters or None)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            cursor.close()
+
+def stream_rows(conn, sql, parameters=(), chunk_size: int = STREAM_CHUNK_SIZE):
+    """Yield lists of rows without loading the whole result
+
+    PostgreSQL reads through a server-side cursor; SQLite steps its cursor a
+    chunk at a time.
+    """
+    if isinstance(conn, PgConnection):
+        yield from conn.stream(sql, parameters, chunk_size)
+        return
+    cursor = conn.execute(sql, parameters)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+class SQLiteBackend:
+    """The local database file, through the application's SQLite connection pool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.dialect = DIALECTS["sqlite"]
+
+    def connection(self):
+        return self.pool.connection()
+
+    def describe(self) -> str:
+        return f"SQLite ({self.pool.db_path})"
+
+    def close(self):
+        self.pool.close_all()
+
+class PostgresBackend:
+    """A PostgreSQL server, through a psycopg connection pool"""
+
+    def __init__(self, url: str = DATABASE_URL, min_size: int = PG_POOL_MIN_SIZE,
+                 max_size: int = PG_POOL_MAX_SIZE, timeout: float = PG_POOL_TIMEOUT):
+        try:
+            from psycopg_pool import ConnectionPool as PgPool
+        except ImportError:
+            raise RuntimeError("DB_BACKEND=postgresql needs the psycopg[pool] package")
+        if not url:
+            raise RuntimeError("DB_BACKEND=postgresql needs DATABASE_URL")
+        self.url = url
+        self.dialect = DIALECTS["postgresql"]
+        self.pool = PgPool(
+            url, min_size=min_size, max_size=max_size, timeout=timeout,
+            kwargs={"row_factory": _row_factory}, name="meatops", open=True
+        )
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; an unfinished transaction is rolled back on return"""
+        start = time.perf_counter()
+        with self.pool.connection() as raw:
+            waited = time.perf_counter() - start
+            if profiler.enabled and waited > 0.001:
+                profiler.record_wait(POOL_WAIT_KEY, waited)
+            conn = PgConnection(raw)
+            try:
+                yield conn
+            finally:
+                # Match the SQLite pool instead of psycopg_pool's commit-on-exit
+                if not raw.closed and conn.in_transaction:
+                    raw.rollback()
+
+    def describe(self) -> str:
+        info = self.pool.get_stats()
+        return f"PostgreSQL (pool {info.get('pool_size', 0)}/{self.pool.max_size})"
+
+    def close(self):
+        self.pool.close()
+
+def create_backend(sqlite_pool, name: str = DB_BACKEND):
+    """Backend selected by DB_BACKEND"""
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_pool)
+    if name in ("postgresql", "postgres"):
+        return PostgresBackend()
+    raise ValueError(f"Unknown DB_BACKEND: {name} (expected one of {', '.join(BACKENDS)})")
+
+def require_sqlite(dialect, feature: str):
+    """Raise for features built on SQLite files (archives, snapshots, bulk loads)"""
+    if dialect.name != "sqlite":
+        raise RuntimeError(f"{feature} is only available with the SQLite backend")
+
+if __name__ == "__main__":
+    # Usage: DB_BACKEND=postgresql DATABASE_URL=postgresql://... python -m utils.backends smoke
+    # Run against a scratch database: creates the schema, a product, six concurrent
+    # checkouts for five kilograms of stock, a search and a streamed read.
+    if len(sys.argv) < 2 or sys.argv[1] != "smoke":
+        print("Usage: python -m utils.backends smoke")
+        sys.exit(1)
+    from concurrent.futures import ThreadPoolExecutor
+    from utils import database
+
+    print(f"Backend: {database.describe_backend()}")
+    product_id = database.add_product("Smoke test beef", 10.0, 5.0, "Beef")
+    cart = [{'product_id': product_id, 'product_name': "Smoke test beef",
+             'weight_kg': 1.0, 'price_per_kg': 10.0, 'total_price': 10.0}]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: database.create_invoice(None, None, cart, 'cash'), range(6)))
+    sold = sum(1 for success, _, _ in results if success)
+    stock = database.get_product_by_id(product_id)['stock_kg']
+    print(f"Concurrent checkouts: {sold} sold, {len(results) - sold} rejected, stock left {stock:.1f} kg")
+    assert sold == 5 and abs(stock) < 1e-9, "stock was oversold or lost"
+    print(f"Search: {[row['name'] for row in database.search_products('smoke be')]}")
+    with database.db_connection() as conn:
+        streamed = sum(len(rows) for rows in stream_rows(conn, "SELECT * FROM invoices WHERE total_amount > ?", (0,), 2))
+    print(f"Streamed {streamed} invoice(s)")
+    print("OK")
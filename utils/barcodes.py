@@ -0,0 +1,87 @@
+import os
+import re
+from typing import NamedTuple, Optional
+
+# Scan and keyboard entry for the sale screen. Deli scales print EAN-13
+# labels in the in-store range (first digit 2): a two-digit prefix, the
+# product's PLU, the weight or price of the piece and a check digit, e.g.
+#
+#   2 1 | 0 1 2 3 4 | 0 1 2 5 0 | 5
+#   prefix  PLU       1.250 kg    check
+#
+# Which prefixes carry a weight and which a price is set on the scales, so
+# it is configured here too. Cashiers can also key "PLU*weight" (or just the
+# PLU), and packaged goods can carry their full barcode as their PLU.
+
+SCALE_WEIGHT_PREFIXES = tuple(os.getenv("SCALE_WEIGHT_PREFIXES", "20,21,22,23,24").split(","))
+SCALE_PRICE_PREFIXES = tuple(os.getenv("SCALE_PRICE_PREFIXES", "25,26,27,28,29").split(","))
+SCALE_PLU_DIGITS = int(os.getenv("SCALE_PLU_DIGITS", "5"))
+# Weights are printed in grams, prices in cents
+SCALE_WEIGHT_DIVISOR = 1000
+SCALE_PRICE_DIVISOR = 100
+
+_KEYED_ENTRY = re.compile(r"^(\d+)(?:\s*[*xX]\s*(\d+(?:[.,]\d+)?))?$")
+
+class ScanEntry(NamedTuple):
+    """A parsed scan or keyed entry; weight_kg and price are None when not given"""
+    plu: str
+    weight_kg: Optional[float] = None
+    price: Optional[float] = None
+
+def normalize_plu(code) -> str:
+    """PLUs are compared without leading zeros ("01234" and "1234" are the same PLU)"""
+    code = str(code or "").strip()
+    return code.lstrip("0") or ("0" if code else "")
+
+def ean13_check_digit(digits: str) -> int:
+    """Check digit for the first 12 digits of an EAN-13"""
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits[:12]))
+    return (10 - total % 10) % 10
+
+def parse_scale_label(code: str) -> Optional[ScanEntry]:
+    """Parse an in-store EAN-13 scale label; None if code is not one
+
+    Raises ValueError for a scale label with a wrong check digit.
+    """
+    if len(code) != 13 or not code.isdigit() or code[:2] not in SCALE_WEIGHT_PREFIXES + SCALE_PRICE_PREFIXES:
+        return None
+    if ean13_check_digit(code) != int(code[12]):
+        raise ValueError(f"Barcode {code} has a wrong check digit - scan it again")
+    plu = normalize_plu(code[2:2 + SCALE_PLU_DIGITS])
+    value = int(code[2 + SCALE_PLU_DIGITS:12])
+    if value <= 0:
+        raise ValueError(f"Label {code} shows no weight or price - weigh the item again")
+    if code[:2] in SCALE_WEIGHT_PREFIXES:
+        return ScanEntry(plu, weight_kg=value / SCALE_WEIGHT_DIVISOR)
+    return ScanEntry(plu, price=value / SCALE_PRICE_DIVISOR)
+
+def price_label_weight(price: float, price_per_kg: float, name: str = "This product") -> float:
+    """Weight a price-embedded label stands for, to the gram
+
+    Raises ValueError when the product has no price per kg or the price is
+    less than a gram's worth.
+    """
+    if price_per_kg <= 0:
+        raise ValueError(f"{name} has no price per kg, so its price label cannot be read")
+    weight = round(price / price_per_kg, 3)
+    if weight <= 0:
+        raise ValueError(f"A {price:.2f} label is less than 1 g of {name}")
+    return weight
+
+def parse_entry(text: str) -> ScanEntry:
+    """Parse a scanned barcode or a keyed "PLU" / "PLU*weight" entry
+
+    Raises ValueError when the text is neither.
+    """
+    text = (text or "").strip()
+    label = parse_scale_label(text)
+    if label is not None:
+        return label
+    match = _KEYED_ENTRY.match(text)
+    if not match:
+        raise ValueError(f"'{text}' is not a barcode or PLU (type PLU or PLU*weight, e.g. 1234*0.75)")
+    plu, weight = match.groups()
+    weight_kg = float(weight.replace(",", ".")) if weight else None
+    if weight_kg is not None and weight_kg <= 0:
+        raise ValueError("Weight must be greater than 0 (type PLU*weight, e.g. 1234*0.75)")
+    return ScanEntry(normalize_plu(plu), weight_kg=weight_kg)
@@ -0,0 +1,453 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+import pandas as pd
+from utils.catalog import invalidate_catalog
+from utils.backends import require_sqlite
+from utils.barcodes import normalize_plu
+from utils.database import db_connection, db_dialect, allocate_invoice_number
+from utils.images import store_product_image
+from utils.rollups import add_to_rollups
+from utils.sales_overview import sales_accumulator
+from utils.stock_ledger import record_movements, record_stock_sets
+from utils.timeutils import SHOP_TZ, now_ts
+
+# Bulk import of product catalogs, opening stock and historical sales from CSV
+# or JSON Lines. Each chunk is validated with vectorized pandas checks and
+# loaded with executemany in its own transaction, which also advances the
+# job's row counter, so a failed import resumes after the last committed
+# chunk when the same file is imported again. Invalid rows are skipped and
+# kept in import_errors as a per-row report.
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+
+IMPORT_KINDS = {
+    "products": "Product catalog",
+    "stock": "Opening stock",
+    "sales": "Historical sales",
+}
+
+# kind -> (required columns, optional columns)
+IMPORT_COLUMNS = {
+    "products": (("name", "price_per_kg"), ("category", "description", "stock_kg", "image", "plu")),
+    "stock": (("name", "stock_kg"), ()),
+    "sales": (
+        ("invoice_ref", "created_at", "payment_method", "product_name", "weight_kg", "price_per_kg"),
+        ("total_price", "product_id", "customer_name", "customer_phone")
+    ),
+}
+
+# Per-row triggers replaced by one set-based pass per chunk during sales loads
+SALES_LOAD_TRIGGERS = ("trg_invoices_rollup", "trg_invoice_items_rollup", "trg_invoices_fts_insert")
+
+def _source_hash(source) -> str:
+    source.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: source.read(1 << 20), b""):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+def _read_chunks(source, source_name: str, chunk_size: int):
+    """Yield raw DataFrames indexed by 1-based data row number"""
+    source.seek(0)
+    if source_name.lower().endswith(".csv"):
+        reader = pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    else:
+        reader = pd.read_json(source, lines=True, chunksize=chunk_size, dtype=False)
+    offset = 0
+    for chunk in reader:
+        chunk.columns = [str(column).strip().lower() for column in chunk.columns]
+        chunk.index = pd.RangeIndex(offset + 1, offset + len(chunk) + 1)
+        offset += len(chunk)
+        yield chunk
+
+def _invoice_aligned(chunks):
+    """Regroup sales chunks so an invoice's lines (consecutive rows) never span two chunks"""
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pd.concat([pending, chunk])
+        refs = _text(chunk, "invoice_ref")
+        tail = refs == refs.iloc[-1]
+        # Keep the trailing invoice back unless the whole chunk is one invoice
+        if tail.all():
+            pending = chunk
+            continue
+        first_tail = tail[::-1].idxmin() + 1
+        pending = chunk.loc[first_tail:]
+        yield chunk.loc[:first_tail - 1]
+    if pending is not None and len(pending):
+        yield pending
+
+def _text(df, column):
+    if column not in df:
+        return pd.Series("", index=df.index)
+    return df[column].fillna("").astype(str).str.strip()
+
+def _number(df, column):
+    if column not in df:
+        return pd.Series(float("nan"), index=df.index)
+    return pd.to_numeric(df[column].replace("", None), errors="coerce")
+
+def _row_errors(index, checks):
+    """Combine (mask, message) checks into a Series of messages for the failing rows"""
+    messages = pd.Series("", index=index)
+    for mask, message in checks:
+        messages = messages.where(~mask, messages + message + "; ")
+    messages = messages[messages != ""]
+    return messages.str.rstrip("; ")
+
+def _validate_products(df, images):
+    rows = pd.DataFrame({
+        "name": _text(df, "name"),
+        "price_per_kg": _number(df, "price_per_kg"),
+        "category": _text(df, "category"),
+        "description": _text(df, "description"),
+        "stock_kg": _number(df, "stock_kg"),
+        "image": _text(df, "image"),
+        "plu": _text(df, "plu").map(normalize_plu),
+    })
+    errors = _row_errors(rows.index, [
+        (rows["name"] == "", "name is required"),
+        (~(rows["price_per_kg"] > 0), "price_per_kg must be a number above 0"),
+        (rows["stock_kg"] < 0, "stock_kg cannot be negative"),
+        ((rows["image"] != "") & ~rows["image"].isin(list(images or {})), "image file was not uploaded"),
+        (rows["name"].str.lower().duplicated(keep="first") & (rows["name"] != ""), "duplicate name in file"),
+        (rows["plu"].duplicated(keep="first") & (rows["plu"] != ""), "duplicate plu in file"),
+    ])
+    return rows.drop(errors.index), errors
+
+def _validate_stock(df, images):
+    rows = pd.DataFrame({"name": _text(df, "name"), "stock_kg": _number(df, "stock_kg")})
+    errors = _row_errors(rows.index, [
+        (rows["name"] == "", "name is required"),
+        (~(rows["stock_kg"] >= 0), "stock_kg must be a number of at least 0"),
+    ])
+    return rows.drop(errors.index), errors
+
+def _validate_sales(df, images):
+    created = pd.to_datetime(_text(df, "created_at"), errors="coerce", format="mixed")
+    if created.dt.tz is None:
+        created = created.dt.tz_localize(SHOP_TZ, ambiguous="NaT", nonexistent="shift_forward")
+    rows = pd.DataFrame({
+        "invoice_ref": _text(df, "invoice_ref"),
+        "created": created.dt.tz_convert(SHOP_TZ),
+        "payment_method": _text(df, "payment_method").str.lower(),
+        "customer_name": _text(df, "customer_name").replace("", None),
+        "customer_phone": _text(df, "customer_phone").replace("", None),
+        "product_id": _number(df, "product_id"),
+        "product_name": _text(df, "product_name"),
+        "weight_kg": _number(df, "weight_kg"),
+        "price_per_kg": _number(df, "price_per_kg"),
+        "total_price": _number(df, "total_price"),
+    })
+    rows["total_price"] = rows["total_price"].fillna((rows["weight_kg"] * rows["price_per_kg"]).round(2))
+    errors = _row_errors(rows.index, [
+        (rows["invoice_ref"] == "", "invoice_ref is required"),
+        (rows["created"].isna(), "created_at is not a valid date/time"),
+        (rows["payment_method"] == "", "payment_method is required"),
+        (rows["product_name"] == "", "product_name is required"),
+        (~(rows["weight_kg"] > 0), "weight_kg must be a number above 0"),
+        (~(rows["price_per_kg"] >= 0), "price_per_kg must be a number of at least 0"),
+        (~(rows["total_price"] >= 0), "total_price must be a number of at least 0"),
+    ])
+    # An invoice is imported whole or not at all
+    rejected = rows["invoice_ref"].isin(rows.loc[errors.index, "invoice_ref"]) & ~rows.index.isin(errors.index)
+    skipped = pd.Series("invoice skipped: another of its lines is invalid", index=rows.index[rejected])
+    errors = pd.concat([errors, skipped]).sort_index()
+    return rows.drop(errors.index), errors
+
+def _product_ids(cursor, names):
+    """Map lower-cased product names to ids"""
+    cursor.execute("""
+        SELECT lower(name) AS key, MIN(id) AS id FROM products
+        WHERE lower(name) IN (SELECT lower(value) FROM json_each(?))
+        GROUP BY lower(name)
+    """, (json.dumps(list(names)),))
+    return {row['key']: row['id'] for row in cursor.fetchall()}
+
+def _image_columns(image):
+    """image_path, image_hash, image_width, image_height for a stored image (or none)"""
+    if image is None:
+        return "", None, None, None
+    return image.path, image.image_hash, image.width, image.height
+
+def _load_products(cursor, rows, job):
+    """Insert new products and update existing ones (matched by name); returns extra row errors"""
+    # A PLU already held by another product fails its row rather than the whole chunk
+    cursor.execute("""
+        SELECT plu, lower(name) AS key, name FROM products
+        WHERE plu IN (SELECT value FROM json_each(?))
+    """, (json.dumps([plu for plu in rows["plu"] if plu]),))
+    owners = {row['plu']: row for row in cursor.fetchall()}
+    taken = pd.Series([plu in owners and owners[plu]['key'] != name.lower()
+                       for plu, name in zip(rows["plu"], rows["name"])], index=rows.index, dtype=bool)
+    errors = pd.Series([f"plu {plu} is already used by {owners[plu]['name']}" for plu in rows["plu"][taken]],
+                       index=rows.index[taken], dtype=str)
+    rows = rows[~taken]
+
+    keys = rows["name"].str.lower()
+    existing = _product_ids(cursor, keys)
+    is_new = ~keys.isin(list(existing))
+    images = rows["stored_image"]
+    created_ts = now_ts()
+
+    new_rows = rows[is_new]
+    cursor.executemany("""
+        INSERT INTO products (name, price_per_kg, stock_kg, category, description, image_path,
+                              image_hash, image_width, image_height, plu)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULLIF(?, ''))
+    """, [(r.name, r.price_per_kg, 0 if pd.isna(r.stock_kg) else r.stock_kg, r.category or 'Other',
+           r.description, *_image_columns(images[index]), r.plu)
+          for index, r in zip(new_rows.index, new_rows.itertuples(index=False))])
+    new_ids = _product_ids(cursor, keys[is_new])
+    record_movements(cursor, [
+        (new_ids[r.name.lower()], 'opening', r.stock_kg, "Catalog import", job['username'], None, created_ts)
+        for r in new_rows.itertuples(index=False) if not pd.isna(r.stock_kg) and r.stock_kg
+    ])
+
+    old_rows = rows[~is_new]
+    updates = [(r.price_per_kg, r.category, r.description, *_image_columns(images[index]), r.plu,
+                existing[r.name.lower()])
+               for index, r in zip(old_rows.index, old_rows.itertuples(index=False))]
+    # A row without an image keeps the product's current one
+    cursor.executemany("""
+        UPDATE products SET
+            price_per_kg = ?,
+            category = COALESCE(NULLIF(?, ''), category),
+            description = COALESCE(NULLIF(?, ''), description),
+            image_path = COALESCE(NULLIF(?, ''), image_path),
+            image_hash = COALESCE(?, image_hash),
+            image_width = COALESCE(?, image_width),
+            image_height = COALESCE(?, image_height),
+            plu = COALESCE(NULLIF(?, ''), plu),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, updates)
+    stock_changes = [(existing[r.name.lower()], r.stock_kg, 'adjustment', "Catalog import", job['username'], created_ts)
+                     for r in old_rows.itertuples(index=False) if not pd.isna(r.stock_kg)]
+    _set_stock(cursor, stock_changes)
+    return errors
+
+def _load_stock(cursor, rows, job):
+    """Set stock levels of existing products; returns errors for unknown names"""
+    keys = rows["name"].str.lower()
+    existing = _product_ids(cursor, keys)
+    unknown = ~keys.isin(list(existing))
+    created_ts = now_ts()
+    _set_stock(cursor, [(existing[r.name.lower()], r.stock_kg, 'opening', "Stock import", job['username'], created_ts)
+                        for r in rows[~unknown].itertuples(index=False)])
+    return pd.Series("unknown product name", index=rows.index[unknown])
+
+def _set_stock(cursor, changes):
+    """Overwrite stock levels, ledgering the differences"""
+    record_stock_sets(cursor, changes)
+    cursor.executemany("""
+        UPDATE products SET stock_kg = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+    """, [(new_stock, product_id) for product_id, new_stock, *_ in changes])
+
+@contextmanager
+def _suspended_triggers(cursor, names):
+    """Drop triggers for the rest of the open transaction and recreate them on exit
+
+    DDL is transactional in SQLite, so other connections never see the
+    triggers missing; on error the caller's rollback restores them.
+    """
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(names)),)
+    )
+    definitions = [row[0] for row in cursor.fetchall()]
+    for name in names:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    yield
+    for definition in definitions:
+        cursor.execute(definition)
+
+def _load_sales(cursor, rows, job):
+    """Insert historical invoices and items; stock is not touched"""
+    if rows.empty:
+        return pd.Series(dtype=str)
+    known_ids = _product_ids(cursor, rows["product_name"].str.lower().unique())
+    rows = rows.assign(
+        product_id=rows["product_id"].fillna(rows["product_name"].str.lower().map(known_ids)),
+        created_ts=(rows["created"] - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1),
+        business_day=rows["created"].dt.strftime("%Y-%m-%d"),
+        business_hour=rows["created"].dt.hour,
+    )
+    invoices = rows.groupby("invoice_ref", sort=False).agg(
+        created_ts=("created_ts", "first"),
+        business_day=("business_day", "first"),
+        business_hour=("business_hour", "first"),
+        payment_method=("payment_method", "first"),
+        customer_name=("customer_name", "first"),
+        customer_phone=("customer_phone", "first"),
+        total_amount=("total_price", "sum"),
+    )
+    invoices["invoice_number"] = [allocate_invoice_number(cursor, day) for day in invoices["business_day"]]
+
+    with _suspended_triggers(cursor, SALES_LOAD_TRIGGERS):
+        cursor.executemany("""
+            INSERT INTO invoices (invoice_number, customer_name, customer_phone, total_amount, payment_method,
+                                  created_ts, business_day, business_hour)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, list(zip(invoices["invoice_number"], invoices["customer_name"], invoices["customer_phone"],
+                      invoices["total_amount"].round(2), invoices["payment_method"], invoices["created_ts"].astype(int),
+                      invoices["business_day"], invoices["business_hour"].astype(int))))
+        cursor.execute("""
+            SELECT id, invoice_number FROM invoices
+            WHERE invoice_number IN (SELECT value FROM json_each(?))
+        """, (json.dumps(list(invoices["invoice_number"])),))
+        number_ids = {row['invoice_number']: row['id'] for row in cursor.fetchall()}
+        invoice_ids = rows["invoice_ref"].map(invoices["invoice_number"]).map(number_ids)
+        cursor.executemany("""
+            INSERT INTO invoice_items (invoice_id, product_id, product_name, weight_kg, price_per_kg, total_price)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(int(invoice_id), None if pd.isna(product_id) else int(product_id), name, weight, price, total)
+              for invoice_id, product_id, name, weight, price, total in zip(
+                  invoice_ids, rows["product_id"], rows["product_name"], rows["weight_kg"],
+                  rows["price_per_kg"], rows["total_price"])])
+
+        first_id, last_id = min(number_ids.values()), max(number_ids.values())
+        add_to_rollups(cursor, first_id, last_id)
+        cursor.execute("""
+            INSERT INTO invoices_fts (rowid, invoice_number, customer_name, customer_phone)
+            SELECT id, invoice_number, customer_name, customer_phone FROM invoices WHERE id BETWEEN ? AND ?
+        """, (first_id, last_id))
+    return pd.Series(dtype=str)
+
+IMPORTERS = {
+    "products": (_validate_products, _load_products),
+    "stock": (_validate_stock, _load_stock),
+    "sales": (_validate_sales, _load_sales),
+}
+
+def _find_job(kind: str, source_hash: str):
+    with db_connection() as conn:
+        return conn.execute("""
+            SELECT * FROM import_jobs WHERE kind = ? AND source_hash = ?
+            ORDER BY id DESC LIMIT 1
+        """, (kind, source_hash)).fetchone()
+
+def _get_job(job_id: int):
+    with db_connection() as conn:
+        return conn.execute("SELECT * FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+
+def _start_job(kind: str, source_name: str, source_hash: str, username: str):
+    with db_connection() as conn:
+        try:
+            cursor = conn.execute("""
+                INSERT INTO import_jobs (kind, source_name, source_hash, username, started_ts, updated_ts)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (kind, source_name, source_hash, username, now_ts(), now_ts()))
+            conn.commit()
+            return cursor.lastrowid
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def _finish_job(job_id: int, status: str, last_error: str = None):
+    with db_connection() as conn:
+        try:
+            conn.execute("""
+                UPDATE import_jobs SET status = ?, last_error = ?, updated_ts = ? WHERE id = ?
+            """, (status, last_error, now_ts(), job_id))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def run_import(kind: str, source, source_name: str, images: dict = None, username: str = None,
+               chunk_size: int = IMPORT_CHUNK_SIZE):
+    """Import a CSV / JSON Lines file (binary file object) and return the job row
+
+    images maps file names used in a products file's 'image' column to
+    uploaded image files. Importing a file that previously failed resumes
+    after its last committed chunk; a file that was fully imported is not
+    imported twice. For sales, an invoice's lines must be consecutive rows.
+    """
+    # Sales loading suspends SQLite triggers and rebuilds FTS rows directly
+    require_sqlite(db_dialect, "Bulk import")
+    if kind not in IMPORTERS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    validate, load = IMPORTERS[kind]
+    required, _ = IMPORT_COLUMNS[kind]
+
+    source_hash = _source_hash(source)
+    job = _find_job(kind, source_hash)
+    if job is not None and job['status'] == 'done':
+        return job
+    job_id = job['id'] if job is not None else _start_job(kind, source_name, source_hash, username)
+    job = _get_job(job_id)
+    rows_done = job['rows_done']
+
+    try:
+        chunks = _read_chunks(source, source_name, chunk_size)
+        if kind == "sales":
+            chunks = _invoice_aligned(chunks)
+        for chunk in chunks:
+            missing = [column for column in required if column not in chunk.columns]
+            if missing:
+                raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+            # Rows up to rows_done were committed by an earlier run of this job
+            chunk = chunk.loc[chunk.index > rows_done]
+            if chunk.empty:
+                continue
+
+            rows, errors = validate(chunk, images)
+            if kind == "products":
+                # Image files are written before the transaction to keep it short; each file once
+                stored = {image: store_product_image(images[image]) for image in set(rows["image"]) if image}
+                rows["stored_image"] = [stored.get(image) for image in rows["image"]]
+
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("BEGIN IMMEDIATE")
+                    load_errors = load(cursor, rows, job)
+                    errors = pd.concat([errors, load_errors])
+                    cursor.executemany("""
+                        INSERT OR REPLACE INTO import_errors (job_id, row_number, message) VALUES (?, ?, ?)
+                    """, [(job_id, int(row_number), message) for row_number, message in errors.items()])
+                    rows_done = int(chunk.index[-1])
+                    cursor.execute("""
+                        UPDATE import_jobs SET
+                            rows_done = ?,
+                            rows_imported = rows_imported + ?,
+                            rows_failed = rows_failed + ?,
+                            updated_ts = ?
+                        WHERE id = ?
+                    """, (rows_done, len(rows) - len(load_errors), len(errors), now_ts(), job_id))
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    raise e
+                finally:
+                    cursor.close()
+            if kind != "sales":
+                invalidate_catalog()
+            else:
+                sales_accumulator.invalidate()
+    except Exception as e:
+        _finish_job(job_id, 'failed', str(e))
+        raise
+
+    _finish_job(job_id, 'done')
+    return _get_job(job_id)
+
+def get_import_jobs(limit: int = 10):
+    """Most recent import jobs"""
+    with db_connection() as conn:
+        return conn.execute("SELECT * FROM import_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+def get_import_errors(job_id: int, limit: int = None):
+    """Per-row errors of an import job, in file order"""
+    with db_connection() as conn:
+        return conn.execute("""
+            SELECT row_number, message FROM import_errors
+            WHERE job_id = ?
+            ORDER BY row_number
+            LIMIT ?
+        """, (job_id, -1 if limit is None else limit)).fetchall()
@@ -0,0 +1,82 @@
+import threading
+from types import MappingProxyType
+from utils.barcodes import normalize_plu
+from utils.database import db_connection, get_catalog_versions
+
+class CatalogSnapshot:
+    """Immutable, indexed view of the product catalog at one catalog/stock version"""
+
+    __slots__ = ("version", "stock_version", "products", "by_id", "by_category", "by_plu")
+
+    def __init__(self, version: int, stock_version: int, products):
+        # Products are read-only mappings so cached rows cannot be mutated by callers
+        products = tuple(MappingProxyType(dict(p)) for p in products)
+        by_category = {}
+        for product in products:
+            by_category.setdefault(product['category'] or 'Other', []).append(product)
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "stock_version", stock_version)
+        object.__setattr__(self, "products", products)
+        object.__setattr__(self, "by_id", MappingProxyType({p['id']: p for p in products}))
+        object.__setattr__(self, "by_category", MappingProxyType({k: tuple(v) for k, v in by_category.items()}))
+        # PLUs are stored normalized, so scans look them up directly
+        object.__setattr__(self, "by_plu", MappingProxyType({p['plu']: p for p in products if p['plu']}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogSnapshot is immutable")
+
+    def get(self, product_id):
+        """Product by id, or None"""
+        return self.by_id.get(product_id)
+
+    def find_plu(self, code):
+        """Product by PLU or barcode, or None"""
+        return self.by_plu.get(normalize_plu(code))
+
+    def with_stock(self, stock_version: int, stock_levels: dict):
+        """New snapshot with refreshed stock levels, reusing the cached product data"""
+        products = []
+        for product in self.products:
+            row = dict(product)
+            row['stock_kg'] = stock_levels.get(row['id'], row['stock_kg'])
+            products.append(row)
+        return CatalogSnapshot(self.version, stock_version, products)
+
+_snapshot = None
+_lock = threading.Lock()
+
+def _load_products():
+    with db_connection() as conn:
+        return conn.execute("SELECT * FROM products ORDER BY name").fetchall()
+
+def _load_stock_levels():
+    with db_connection() as conn:
+        return {row['id']: row['stock_kg'] for row in conn.execute("SELECT id, stock_kg FROM products")}
+
+def get_catalog() -> CatalogSnapshot:
+    """Return the process-wide catalog snapshot, reloading only what changed
+
+    A product change reloads the catalog; a stock-only change (sales, stock
+    updates) re-reads just the id/stock_kg pairs.
+    """
+    global _snapshot
+    # Read the versions before loading: a concurrent write then only causes an extra reload
+    catalog_version, stock_version = get_catalog_versions()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == catalog_version and snapshot.stock_version == stock_version:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version != catalog_version:
+            snapshot = CatalogSnapshot(catalog_version, stock_version, _load_products())
+        elif snapshot.stock_version != stock_version:
+            snapshot = snapshot.with_stock(stock_version, _load_stock_levels())
+        _snapshot = snapshot
+        return snapshot
+
+def invalidate_catalog():
+    """Drop the cached snapshot (e.g. after the database file was changed externally)"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
@@ -1,419 +1,1102 @@
 import sqlite3
 import os
-from datetime import datetime
+import base64
+import re
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import date, datetime
 import streamlit as st
 from typing import List, Dict, Optional
+from utils.migrations import apply_migrations
+from utils.pg_schema import apply_pg_migrations, pg_data_tables
+from utils.backends import create_backend, require_sqlite
+from utils.barcodes import normalize_plu
+from utils.profiler import POOL_WAIT_KEY, ProfiledConnection, profiler
+from utils.archive import (
+    ARCHIVE_KEEP_MONTHS, INVOICES_VIEW, INVOICE_ITEMS_VIEW,
+    archive_closed_months, attached_partitions, clear_archives, list_partitions, overlapping_partitions,
+    searchable_partitions
+)
+from utils.queries import (
+    HELD_STOCK_SQL, INVOICE_ITEMS_SQL, INVOICES_PAGE_SQL, LOW_STOCK_SQL, PARTITION_SEARCH_SQL, PERIOD_SALES_SQL,
+    SALES_OVERVIEW_RECENT_SQL, SALES_OVERVIEW_SEED_SQL, SEARCH_SQL, STOCK_MOVEMENT_SUMMARY_SQL, STOCK_MOVEMENTS_SQL
+)
+from utils.rollups import ROLLUP_TABLES
+from utils.sales_overview import RECENT_WINDOW, SalesOverview, sales_accumulator
+from utils.stock_ledger import (
+    STOCK_CHECKPOINT_INTERVAL, record_movements, record_stock_sets, create_stock_checkpoint, latest_checkpoint_ts,
+    stock_as_of
+)
+from utils.stock_holds import available_stock, extend_holds, place_hold, purge_expired_holds
+from utils.sync import SYNC_HUB_PATH, get_sync_status, has_synced, open_database, sync_databases
+from utils.timeutils import now_ts, business_time, business_today, day_range
 
 DB_PATH = os.getenv("LOCAL_DB_PATH", "meat_shop.db")
+DB_POOL_SIZE = int(os.getenv("LOCAL_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("LOCAL_DB_POOL_TIMEOUT", "30"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("LOCAL_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE = 256
+# Checkouts arriving within this window are committed in one transaction
+CHECKOUT_BATCH_WINDOW = float(os.getenv("CHECKOUT_BATCH_WINDOW_MS", "5")) / 1000
+CHECKOUT_MAX_BATCH = int(os.getenv("CHECKOUT_MAX_BATCH", "100"))
+# Optional per-till prefix for invoice numbers, e.g. TERMINAL_ID=T2 -> INV-T2-20250611-0001
+TERMINAL_ID = os.getenv("TERMINAL_ID", "").strip().upper()
 
-def get_db_connection():
-    """Get SQLite database connection"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+# Per-connection tuning applied once when a pooled connection is opened
+CONNECTION_PRAGMAS = (
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",      # ~16 MB page cache
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped I/O
+)
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections shared by all sessions"""
+
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT,
+                 read_only: bool = False):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.read_only = read_only
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._wal_lock = threading.Lock()
+        self._wal_enabled = False
+
+    def _connect(self):
+        """Open a new connection and apply the tuning pragmas"""
+        try:
+            if self.read_only:
+                target, uri = f"{Path(self.db_path).absolute().as_uri()}?mode=ro", True
+            else:
+                target, uri = self.db_path, False
+            conn = sqlite3.connect(
+                target,
+                timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False,
+                cached_statements=DB_STATEMENT_CACHE,
+                uri=uri,
+                factory=ProfiledConnection
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+        except Exception as e:
+            st.error(f"Database connection failed: {str(e)}")
+            raise e
+        if self.read_only:
+            return conn
+        # journal_mode is persistent in the database file, so set it only once
+        with self._wal_lock:
+            if not self._wal_enabled:
+                conn.execute("PRAGMA journal_mode = WAL")
+                self._wal_enabled = True
         return conn
-    except Exception as e:
-        st.error(f"Database connection failed: {str(e)}")
-        raise e
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, returning it to the pool when done"""
+        # Only a contended pool is worth timing
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            if not self._slots.acquire(timeout=self.timeout):
+                raise sqlite3.OperationalError("Timed out waiting for a free database connection")
+            if profiler.enabled:
+                profiler.record_wait(POOL_WAIT_KEY, time.perf_counter() - start)
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                # Never hand out a connection with a half-finished transaction
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """Close every idle connection (e.g. before replacing the database file)"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = ConnectionPool(DB_PATH)
+# DB_BACKEND=postgresql swaps the SQLite file for a pooled PostgreSQL server
+_backend = create_backend(_pool)
+db_dialect = _backend.dialect
+
+# Bumped after every committed catalog / stock write so in-process caches know to reload
+_catalog_versions = {'catalog': 0, 'stock': 0}
+_catalog_versions_lock = threading.Lock()
+
+def _bump_version(kind: str):
+    """Record that products ('catalog') or stock levels ('stock') changed"""
+    with _catalog_versions_lock:
+        _catalog_versions[kind] += 1
+
+def get_catalog_versions():
+    """Return the current (catalog_version, stock_version) pair"""
+    return _catalog_versions['catalog'], _catalog_versions['stock']
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled database connection for the duration of a with-block
+
+    Usage:
+        with db_connection() as conn:
+            rows = conn.execute("SELECT ...").fetchall()
+    """
+    with _backend.connection() as conn:
+        yield conn
+
+def describe_backend() -> str:
+    """Human-readable name of the storage backend in use"""
+    return _backend.describe()
 
 def init_local_db():
-    """Initialize local SQLite database with all required tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT DEFAULT 'cashier',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        # Create products table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                price_per_kg REAL NOT NULL,
-                stock_kg REAL DEFAULT 0,
-                category TEXT,
-                description TEXT,
-                image_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        # Create invoices table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS invoices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                invoice_number TEXT UNIQUE NOT NULL,
-                customer_name TEXT,
-                customer_phone TEXT,
-                total_amount REAL NOT NULL,
-                payment_method TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        # Create invoice_items table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS invoice_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                invoice_id INTEGER REFERENCES invoices(id) ON DELETE CASCADE,
-                product_id INTEGER REFERENCES products(id),
-                product_name TEXT NOT NULL,
-                weight_kg REAL NOT NULL,
-                price_per_kg REAL NOT NULL,
-                total_price REAL NOT NULL
-            )
-        """)
-        # Insert default users if they don't exist
-        default_users = [
-            ("admin", "240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9", "admin"),
-            ("cashier", "8d23cf6c86e834a7aa6eded54c26ce2bb2e74903538c61bdd5d2197997ab2f72", "cashier"),
-            ("manager", "ef92b778bafe771e89245b89ecbc08a44a4e166c06659911881f383d4473e94f", "manager")
-        ]
-        for username, password_hash, role in default_users:
-            cursor.execute("""
-                INSERT OR IGNORE INTO users (username, password_hash, role)
-                VALUES (?, ?, ?)
-            """, (username, password_hash, role))
-        # Note: No sample products will be inserted automatically
-        # Products should be added through the Stock Management interface
-        # Add image_path column to existing products table if it doesn't exist
+    """Initialize the database: apply schema migrations and seed default users"""
+    with db_connection() as conn:
+        if db_dialect.name == "sqlite":
+            apply_migrations(conn)
+        else:
+            apply_pg_migrations(conn.raw)
+        cursor = conn.cursor()
         try:
-            cursor.execute("ALTER TABLE products ADD COLUMN image_path TEXT")
-        except sqlite3.OperationalError:
-            # Column already exists, which is fine
-            pass
+            # Insert default users if they don't exist
+            default_users = [
+                ("admin", "240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9", "admin"),
+                ("cashier", "8d23cf6c86e834a7aa6eded54c26ce2bb2e74903538c61bdd5d2197997ab2f72", "cashier"),
+                ("manager", "ef92b778bafe771e89245b89ecbc08a44a4e166c06659911881f383d4473e94f", "manager")
+            ]
+            for username, password_hash, role in default_users:
+                cursor.execute("""
+                    INSERT INTO users (username, password_hash, role)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (username) DO NOTHING
+                """, (username, password_hash, role))
+            # Note: No sample products will be inserted automatically
+            # Products should be added through the Stock Management interface
         
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        print(f"Error initializing database: {e}")
-        raise
-    finally:
-        cursor.close()
-        conn.close()
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error initializing database: {e}")
+            raise
+        finally:
+            cursor.close()
+        maybe_checkpoint_stock(conn)
+
+def allocate_invoice_number(cursor, business_day: str, terminal_id: str = TERMINAL_ID):
+    """Allocate the next invoice number for a terminal and business day
 
-def generate_invoice_number():
-    """Generate unique invoice number"""
-    now = datetime.now()
-    timestamp = now.strftime("%Y%m%d%H%M%S")
-    return f"INV-{timestamp}"
+    Must run inside the invoice transaction: the counter increment commits or
+    rolls back together with the invoice, so numbers stay gap-free per day.
+    Raises ValueError on a till that syncs but has no TERMINAL_ID, whose
+    numbers would clash with the other tills'.
+    """
+    if not terminal_id and db_dialect.name == "sqlite" and (SYNC_HUB_PATH or has_synced(cursor)):
+        raise ValueError("Set TERMINAL_ID to a name unique to this till before selling on a synced till")
+    cursor.execute("""
+        INSERT INTO invoice_sequences (terminal_id, business_day, last_value)
+        VALUES (?, ?, 1)
+        ON CONFLICT (terminal_id, business_day) DO UPDATE SET last_value = invoice_sequences.last_value + 1
+        RETURNING last_value
+    """, (terminal_id, business_day))
+    sequence = cursor.fetchone()[0]
+    prefix = f"INV-{terminal_id}-" if terminal_id else "INV-"
+    return f"{prefix}{business_day.replace('-', '')}-{sequence:04d}"
 
-def add_product(name: str, price_per_kg: float, stock_kg: float, category: str, description: str = "", image_path: str = ""):
+def add_product(name: str, price_per_kg: float, stock_kg: float, category: str, description: str = "", image_path: str = "",
+                image_hash: str = None, image_width: int = None, image_height: int = None, plu: str = None):
     """Add a new product"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        cursor.execute("""
-            INSERT INTO products (name, price_per_kg, stock_kg, category, description, image_path)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (name, price_per_kg, stock_kg, category, description, image_path))
+        try:
+            cursor.execute("""
+                INSERT INTO products (name, price_per_kg, stock_kg, category, description, image_path,
+                                      image_hash, image_width, image_height, plu)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING id
+            """, (name, price_per_kg, stock_kg, category, description, image_path, image_hash, image_width, image_height,
+                  normalize_plu(plu) or None))
         
-        product_id = cursor.lastrowid
-        conn.commit()
-        return product_id
+            product_id = cursor.fetchone()[0]
+            if stock_kg:
+                record_movements(cursor, [(product_id, 'opening', stock_kg, "Initial stock", None, None, now_ts())])
+            conn.commit()
+            _bump_version('catalog')
+            return product_id
         
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
 
 def get_products():
     """Get all products from database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM products ORDER BY name")
-    products = cursor.fetchall()
+        cursor.execute("SELECT * FROM products ORDER BY name")
+        products = cursor.fetchall()
     
-    cursor.close()
-    conn.close()
-    return products
+        cursor.close()
+        return products
 
 def get_product_by_id(product_id: int):
     """Get a specific product by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
-    product = cursor.fetchone()
+        cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
+        product = cursor.fetchone()
     
-    cursor.close()
-    conn.close()
-    return product
+        cursor.close()
+        return product
 
 def update_product(product_id: int, **kwargs):
     """Update product information"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        # Build dynamic update query
-        update_fields = []
-        values = []
+        try:
+            # Build dynamic update query
+            update_fields = []
+            values = []
         
-        for field, value in kwargs.items():
-            if field in ['name', 'price_per_kg', 'stock_kg', 'category', 'description', 'image_path']:
-                update_fields.append(f"{field} = ?")
-                values.append(value)
+            for field, value in kwargs.items():
+                if field in ['name', 'price_per_kg', 'stock_kg', 'category', 'description', 'image_path',
+                             'image_hash', 'image_width', 'image_height', 'plu']:
+                    update_fields.append(f"{field} = ?")
+                    values.append((normalize_plu(value) or None) if field == 'plu' else value)
         
-        if not update_fields:
-            return False
+            if not update_fields:
+                return False
         
-        update_fields.append("updated_at = CURRENT_TIMESTAMP")
-        values.append(product_id)
-        query = f"UPDATE products SET {', '.join(update_fields)} WHERE id = ?"
+            update_fields.append("updated_at = CURRENT_TIMESTAMP")
+            values.append(product_id)
+            query = f"UPDATE products SET {', '.join(update_fields)} WHERE id = ?"
         
-        cursor.execute(query, values)
-        conn.commit()
+            # A direct stock edit is recorded in the ledger as an adjustment
+            if 'stock_kg' in kwargs:
+                _record_stock_set(cursor, product_id, kwargs['stock_kg'], 'adjustment', "Product edit", None)
         
-        return cursor.rowcount > 0
+            cursor.execute(query, values)
+            conn.commit()
+            _bump_version('catalog')
         
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
-
-def update_stock(product_id: int, new_stock: float):
-    """Update product stock"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("""
-            UPDATE products SET stock_kg = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
-        """, (new_stock, product_id))
+            return cursor.rowcount > 0
         
-        conn.commit()
-        return cursor.rowcount > 0
-        
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
 
-def reduce_stock(product_id: int, amount: float):
-    """Reduce product stock by specified amount"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _record_stock_set(cursor, product_id: int, new_stock: float, movement_type: str, reason: str, username: str):
+    """Ledger the difference between the current and new stock, before the stock update runs"""
+    db_dialect.lock_products(cursor, [product_id])
+    record_stock_sets(cursor, [(product_id, new_stock, movement_type, reason, username, now_ts())])
+
+def update_stock(product_id: int, new_stock: float, movement_type: str = 'adjustment',
+                 reason: str = None, username: str = None):
+    """Set product stock, recording the change in the stock ledger"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        cursor.execute("""
-            UPDATE products SET stock_kg = stock_kg - ?, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = ? AND stock_kg >= ?
-        """, (amount, product_id, amount))
-        
-        if cursor.rowcount == 0:
-            # Check if product exists and has insufficient stock
-            cursor.execute("SELECT stock_kg FROM products WHERE id = ?", (product_id,))
-            result = cursor.fetchone()
-            if result:
-                raise ValueError(f"Insufficient stock. Available: {result['stock_kg']:.3f} kg, Requested: {amount:.3f} kg")
-            else:
-                raise ValueError("Product not found")
+        try:
+            _record_stock_set(cursor, product_id, new_stock, movement_type, reason, username)
+            cursor.execute("""
+                UPDATE products SET stock_kg = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+            """, (new_stock, product_id))
         
-        conn.commit()
-        return True
+            conn.commit()
+            _bump_version('stock')
+            return cursor.rowcount > 0
         
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
 
-def create_invoice(customer_name: str, customer_phone: str, items: List[Dict], payment_method: str):
-    """Create a new invoice with items"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def reduce_stock(product_id: int, amount: float, movement_type: str = 'adjustment',
+                 reason: str = None, username: str = None):
+    """Reduce product stock by specified amount, recording it in the stock ledger"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        # Calculate total amount
-        total_amount = sum(item['total_price'] for item in items)
-        
-        # Generate invoice number
-        invoice_number = generate_invoice_number()
-        
-        # Insert invoice
-        cursor.execute("""
-            INSERT INTO invoices (invoice_number, customer_name, customer_phone, total_amount, payment_method)
-            VALUES (?, ?, ?, ?, ?)
-        """, (invoice_number, customer_name, customer_phone, total_amount, payment_method))
-        
-        invoice_id = cursor.lastrowid
-        
-        # Insert invoice items and update stock
-        for item in items:
-            cursor.execute("""
-                INSERT INTO invoice_items (invoice_id, product_id, product_name, weight_kg, price_per_kg, total_price)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (invoice_id, item['product_id'], item['product_name'], 
-                  item['weight_kg'], item['price_per_kg'], item['total_price']))
-            
-            # Reduce stock within the same transaction
+        try:
             cursor.execute("""
                 UPDATE products SET stock_kg = stock_kg - ?, updated_at = CURRENT_TIMESTAMP 
                 WHERE id = ? AND stock_kg >= ?
-            """, (item['weight_kg'], item['product_id'], item['weight_kg']))
-            
+            """, (amount, product_id, amount))
+        
             if cursor.rowcount == 0:
                 # Check if product exists and has insufficient stock
-                cursor.execute("SELECT stock_kg FROM products WHERE id = ?", (item['product_id'],))
+                cursor.execute("SELECT stock_kg FROM products WHERE id = ?", (product_id,))
                 result = cursor.fetchone()
                 if result:
-                    raise ValueError(f"Insufficient stock for {item['product_name']}. Available: {result['stock_kg']:.3f} kg, Requested: {item['weight_kg']:.3f} kg")
+                    raise ValueError(f"Insufficient stock. Available: {result['stock_kg']:.3f} kg, Requested: {amount:.3f} kg")
                 else:
-                    raise ValueError(f"Product {item['product_name']} not found")
+                    raise ValueError("Product not found")
         
-        conn.commit()
-        return True, invoice_number, invoice_id
+            record_movements(cursor, [(product_id, movement_type, -amount, reason, username, None, now_ts())])
+            conn.commit()
+            _bump_version('stock')
+            return True
         
-    except Exception as e:
-        conn.rollback()
-        return False, str(e), None
-    finally:
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+
+def _insert_invoices(cursor, carts: List[Dict]):
+    """Insert a batch of carts inside an already open write transaction
+
+    Each cart is a dict with 'items', 'payment_method' and optional
+    'customer_name', 'customer_phone', 'username', 'cart_id' (whose stock
+    holds the sale may use) and 'created_ts' (for replayed or historical
+    sales). Stock is checked cart by cart against a running balance, so a
+    cart that would oversell is rejected without affecting the others.
+    Returns one (success, invoice_number_or_error, invoice_id) tuple per
+    cart, in input order.
+    """
+    results = [None] * len(carts)
+    
+    # Current stock for every product referenced in the batch
+    product_ids = sorted({item['product_id'] for cart in carts for item in cart.get('items', [])})
+    db_dialect.lock_products(cursor, product_ids)
+    cursor.execute(f"""
+        SELECT id, stock_kg FROM products
+        WHERE {db_dialect.in_list('id')}
+    """, (db_dialect.list_param(product_ids),))
+    available = {row['id']: row['stock_kg'] for row in cursor.fetchall()}
+    
+    # Stock held by open carts is not available, except to the cart holding it
+    cursor.execute(f"""
+        SELECT cart_id, product_id, SUM(weight_kg) AS weight_kg FROM stock_holds
+        WHERE {db_dialect.in_list('product_id')} AND expires_ts > ?
+        GROUP BY cart_id, product_id
+    """, (db_dialect.list_param(product_ids), now_ts()))
+    own_holds = {}
+    for row in cursor.fetchall():
+        if row['product_id'] in available:
+            available[row['product_id']] -= row['weight_kg']
+        own_holds[(row['cart_id'], row['product_id'])] = row['weight_kg']
+    
+    # Accept or reject each cart against the running balance
+    accepted = []
+    decrements = {}
+    for index, cart in enumerate(carts):
+        items = cart.get('items') or []
+        if not items:
+            results[index] = (False, "Invoice has no items", None)
+            continue
+        
+        needed = {}
+        for item in items:
+            needed[item['product_id']] = needed.get(item['product_id'], 0) + item['weight_kg']
+        
+        held = {product_id: own_holds.get((cart.get('cart_id'), product_id), 0) for product_id in needed}
+        
+        error = None
+        for item in items:
+            product_id = item['product_id']
+            if product_id not in available:
+                error = f"Product {item['product_name']} not found"
+                break
+            if available[product_id] + held[product_id] < needed[product_id]:
+                error = f"Insufficient stock for {item['product_name']}. Available: {available[product_id] + held[product_id]:.3f} kg, Requested: {needed[product_id]:.3f} kg"
+                break
+        if error:
+            results[index] = (False, error, None)
+            continue
+        
+        # The sale replaces the cart's holds
+        for product_id, weight in needed.items():
+            available[product_id] -= weight - held[product_id]
+            decrements[product_id] = decrements.get(product_id, 0) + weight
+        accepted.append(index)
+    
+    if not accepted:
+        return results
+    
+    # Build invoice rows, allocating numbers in cart order
+    invoice_rows = []
+    for index in accepted:
+        cart = carts[index]
+        created_ts = cart.get('created_ts') or now_ts()
+        business_day, business_hour = business_time(created_ts)
+        invoice_number = allocate_invoice_number(cursor, business_day)
+        total_amount = sum(item['total_price'] for item in cart['items'])
+        invoice_rows.append((
+            invoice_number, cart.get('customer_name'), cart.get('customer_phone'),
+            total_amount, cart['payment_method'], created_ts, business_day, business_hour
+        ))
+    
+    cursor.executemany("""
+        INSERT INTO invoices (invoice_number, customer_name, customer_phone, total_amount, payment_method,
+                              created_ts, business_day, business_hour)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, invoice_rows)
+    
+    # executemany does not report row ids, so look them up through the unique number index
+    invoice_numbers = [row[0] for row in invoice_rows]
+    cursor.execute(f"""
+        SELECT id, invoice_number FROM invoices
+        WHERE {db_dialect.in_list('invoice_number')}
+    """, (db_dialect.list_param(invoice_numbers),))
+    invoice_ids = {row['invoice_number']: row['id'] for row in cursor.fetchall()}
+    
+    item_rows = []
+    movement_rows = []
+    for index, invoice_number, invoice_row in zip(accepted, invoice_numbers, invoice_rows):
+        invoice_id = invoice_ids[invoice_number]
+        for item in carts[index]['items']:
+            item_rows.append((invoice_id, item['product_id'], item['product_name'],
+                              item['weight_kg'], item['price_per_kg'], item['total_price']))
+            movement_rows.append((item['product_id'], 'sale', -item['weight_kg'], None,
+                                  carts[index].get('username'), invoice_id, invoice_row[5]))
+        results[index] = (True, invoice_number, invoice_id)
+    
+    cursor.executemany("""
+        INSERT INTO invoice_items (invoice_id, product_id, product_name, weight_kg, price_per_kg, total_price)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, item_rows)
+    
+    record_movements(cursor, movement_rows)
+    
+    # Convert every accepted cart's holds in one statement
+    cart_ids = [carts[index]['cart_id'] for index in accepted if carts[index].get('cart_id')]
+    if cart_ids:
+        cursor.execute(f"""
+            DELETE FROM stock_holds WHERE {db_dialect.in_list('cart_id')}
+        """, (db_dialect.list_param(cart_ids),))
+    
+    # One stock update per product for the whole batch
+    cursor.executemany("""
+        UPDATE products SET stock_kg = stock_kg - ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+    """, [(weight, product_id) for product_id, weight in decrements.items()])
+    
+    return results
+
+def _record_sales(carts: List[Dict], results):
+    """Add just-committed invoices to the in-process sales overview"""
+    now = now_ts()
+    sales_accumulator.record([
+        (invoice_id, cart.get('created_ts') or now, sum(item['total_price'] for item in cart['items']))
+        for cart, (success, _, invoice_id) in zip(carts, results) if success
+    ])
+
+def get_sales_overview() -> SalesOverview:
+    """Today's invoice count and revenue plus the last hour's sales, without a query on most calls
+
+    Served from the process-wide accumulator, which is seeded here on a new
+    business day and re-seeded periodically to reconcile with the database.
+    """
+    now = now_ts()
+    business_day = business_time(now)[0]
+    if sales_accumulator.needs_seed(business_day):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SALES_OVERVIEW_SEED_SQL, (business_day,))
+            count, revenue, max_id = cursor.fetchone()
+            cursor.execute(SALES_OVERVIEW_RECENT_SQL, (now - RECENT_WINDOW,))
+            # Invoices committed after the first query are left to the ones recorded in memory
+            recent = [tuple(row) for row in cursor.fetchall() if row[0] <= max_id]
+            cursor.close()
+        sales_accumulator.seed(business_day, count, revenue, max_id, recent)
+    return sales_accumulator.snapshot(now)
+
+def create_invoices_bulk(carts: List[Dict]):
+    """Create many invoices in a single transaction
+
+    Used for replaying sales from offline terminals and importing history.
+    Carts that fail validation (e.g. insufficient stock) are reported and
+    skipped; the rest are committed together. Returns one
+    (success, invoice_number_or_error, invoice_id) tuple per cart.
+    """
+    if not carts:
+        return []
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        try:
+            # Take the write lock up front so the stock read cannot go stale
+            db_dialect.begin_write(cursor)
+            results = _insert_invoices(cursor, carts)
+            conn.commit()
+            _bump_version('stock')
+            _record_sales(carts, results)
+            return results
+        
+        except Exception as e:
+            conn.rollback()
+            return [(False, str(e), None)] * len(carts)
+        finally:
+            cursor.close()
+
+class CheckoutWriter:
+    """Single writer thread that group-commits checkouts
+
+    Requests arriving within a few milliseconds of each other are written in
+    one transaction (one fsync), and each caller gets a Future resolving to
+    the usual (success, invoice_number_or_error, invoice_id) tuple. A Future
+    cancelled while still queued is skipped, so its cart is never written.
+    """
+
+    def __init__(self, batch_window: float = CHECKOUT_BATCH_WINDOW, max_batch: int = CHECKOUT_MAX_BATCH):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._requests = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the writer thread if it is not already running"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="checkout-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Ask the writer thread to finish pending work and exit"""
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, cart: Dict) -> Future:
+        """Queue a cart for writing and return a Future for its result"""
+        future = Future()
+        self._requests.put((cart, future))
+        # After queueing, so a writer thread that is giving up either fails this cart or is replaced
+        self.start()
+        return future
+
+    def _collect_batch(self, first):
+        """Gather requests that arrive within the batch window"""
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Re-queue the stop marker so the loop exits after this batch
+                self._requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _fail_pending(self, error: str):
+        """Resolve every queued request with an error"""
+        while True:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None and request[1].set_running_or_notify_cancel():
+                request[1].set_result((False, error, None))
+
+    def _run(self):
+        try:
+            conn = _pool._connect()
+        except Exception as e:
+            # Nothing can be written; fail the queued checkouts rather than leave their callers waiting
+            with self._start_lock:
+                self._fail_pending(f"Could not open the database for checkout: {e}")
+                self._thread = None
+            return
+        try:
+            while True:
+                first = self._requests.get()
+                if first is None:
+                    break
+                batch = self._collect_batch(first)
+                self._write_batch(conn, batch)
+                maybe_checkpoint_stock(conn)
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        # Callers that gave up waiting cancelled their Future; after this they can no longer cancel
+        batch = [(cart, future) for cart, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        carts = [cart for cart, _ in batch]
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            results = _insert_invoices(cursor, carts)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for _, future in batch:
+                future.set_result((False, str(e), None))
+            return
+        finally:
+            cursor.close()
+        # The invoices are written: report them before anything else can fail
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        try:
+            _bump_version('stock')
+            _record_sales(carts, results)
+        except Exception as e:
+            print(f"Warning: Could not update in-process state after checkout: {e}")
+
+_checkout_writer = CheckoutWriter()
+
+def create_invoice(customer_name: str, customer_phone: str, items: List[Dict], payment_method: str,
+                   username: str = None, cart_id: str = None):
+    """Create a new invoice with items
+
+    Stock held for cart_id counts as available to this sale and the holds
+    are released with it. On SQLite the sale goes through the shared checkout writer so concurrent
+    sessions are group-committed instead of contending for the write lock.
+    PostgreSQL takes concurrent writers, so each sale commits on its own.
+    If the writer does not answer in time and the sale is already being
+    written, success is None: the sale is pending and may still be recorded,
+    so it must not be retried blindly.
+    """
+    cart = {
+        'customer_name': customer_name,
+        'customer_phone': customer_phone,
+        'items': items,
+        'payment_method': payment_method,
+        'username': username,
+        'cart_id': cart_id
+    }
+    if db_dialect.name != "sqlite":
+        return create_invoices_bulk([cart])[0]
+    future = _checkout_writer.submit(cart)
+    try:
+        return future.result(timeout=DB_POOL_TIMEOUT)
+    except FutureTimeoutError:
+        pass
+    if future.cancel():
+        return False, "Timed out waiting for the checkout writer; the sale was not recorded", None
+    # Already in a transaction, which normally finishes well within another timeout
+    try:
+        return future.result(timeout=DB_POOL_TIMEOUT)
+    except FutureTimeoutError:
+        return None, "The sale is still being saved. Check the invoice list before selling these items again.", None
+
+def hold_stock(cart_id: str, product_id: int, weight_kg: float):
+    """Hold stock for an item being added to a cart; returns the hold id
+
+    Raises ValueError when less than weight_kg is left after other carts'
+    holds, so contention shows up when the item is added, not at checkout.
+    Adding an item also renews the expiry of the cart's other holds.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        try:
+            db_dialect.begin_write(cursor)
+            db_dialect.lock_products(cursor, [product_id])
+            now = now_ts()
+            purge_expired_holds(cursor, now)
+            hold_id = place_hold(cursor, cart_id, product_id, weight_kg, now)
+            if hold_id is None:
+                available = available_stock(cursor, product_id, now)
+                raise ValueError(f"Insufficient stock. Available: {max(available, 0):.3f} kg, Requested: {weight_kg:.3f} kg")
+            extend_holds(cursor, cart_id, now)
+            conn.commit()
+            return hold_id
+        
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+
+def release_hold(hold_id: int):
+    """Give back the stock held for one cart item (e.g. the item was removed)"""
+    with db_connection() as conn:
+        try:
+            conn.execute("DELETE FROM stock_holds WHERE id = ?", (hold_id,))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def release_cart_holds(cart_id: str):
+    """Give back all stock held for a cart (e.g. the cart was cleared)"""
+    with db_connection() as conn:
+        try:
+            conn.execute("DELETE FROM stock_holds WHERE cart_id = ?", (cart_id,))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def get_held_stock():
+    """Kilograms held by open carts, per product id"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute(HELD_STOCK_SQL[db_dialect.name], (now_ts(),))
+        held = {row['product_id']: row['weight_kg'] for row in cursor.fetchall()}
         cursor.close()
-        conn.close()
+        return held
 
 def get_invoices(limit: int = 100, offset: int = 0):
     """Get invoices with pagination"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT * FROM invoices 
-        ORDER BY created_at DESC 
-        LIMIT ? OFFSET ?
-    """, (limit, offset))
+        cursor.execute("""
+            SELECT * FROM invoices 
+            ORDER BY created_ts DESC, id DESC 
+            LIMIT ? OFFSET ?
+        """, (limit, offset))
     
-    invoices = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return invoices
+        invoices = cursor.fetchall()
+        cursor.close()
+        return invoices
+
+def _encode_page_cursor(created_ts: int, invoice_id: int) -> str:
+    """Opaque continuation token for keyset pagination"""
+    return base64.urlsafe_b64encode(f"{created_ts}:{invoice_id}".encode()).decode()
+
+def _decode_page_cursor(token: str):
+    try:
+        created_ts, invoice_id = base64.urlsafe_b64decode(token.encode()).decode().split(":")
+        return int(created_ts), int(invoice_id)
+    except Exception:
+        raise ValueError("Invalid page cursor")
+
+@contextmanager
+def _with_archives(conn, start_day: str = None, end_day: str = None):
+    """Yield (conn, invoices table, items table) covering archived years on SQLite"""
+    if db_dialect.name != "sqlite":
+        yield conn, "invoices", "invoice_items"
+        return
+    with attached_partitions(conn, start_day, end_day) as conn:
+        yield conn, INVOICES_VIEW, INVOICE_ITEMS_VIEW
+
+def get_invoices_page(limit: int = 50, page_token: str = None, start_ts: int = None, end_ts: int = None):
+    """Get one page of invoices, newest first, using keyset pagination on (created_ts, id)
+
+    Pass the returned token back to fetch the next page; it is None on the
+    last page. Each page is an index range read, so page N costs the same as
+    page 1. Archived years overlapping the range are read too. Returns
+    (invoices, next_page_token).
+    """
+    lower = start_ts if start_ts is not None else 0
+    upper = end_ts if end_ts is not None else 2**62
+    after_ts, after_id = upper, 0
+    if page_token:
+        after_ts, after_id = _decode_page_cursor(page_token)
+        # Tighten the index range to the cursor; the row-value test only skips same-second rows
+        upper = min(upper, after_ts + 1)
+    
+    start_day = business_time(start_ts)[0] if start_ts is not None else None
+    end_day = business_time(end_ts)[0] if end_ts is not None else None
+    
+    with db_connection() as conn:
+        with _with_archives(conn, start_day, end_day) as (conn, invoices_table, _):
+            cursor = conn.cursor()
+        
+            cursor.execute(INVOICES_PAGE_SQL.format(invoices=invoices_table),
+                           (lower, upper, after_ts, after_id, limit + 1))
+        
+            invoices = cursor.fetchall()
+            cursor.close()
+    
+    next_page_token = None
+    if len(invoices) > limit:
+        invoices = invoices[:limit]
+        next_page_token = _encode_page_cursor(invoices[-1]['created_ts'], invoices[-1]['id'])
+    return invoices, next_page_token
 
 def get_invoice_by_id(invoice_id: int):
     """Get a specific invoice by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM invoices WHERE id = ?", (invoice_id,))
-    invoice = cursor.fetchone()
+        cursor.execute("SELECT * FROM invoices WHERE id = ?", (invoice_id,))
+        invoice = cursor.fetchone()
     
-    cursor.close()
-    conn.close()
-    return invoice
+        cursor.close()
+        return invoice
 
-def get_invoice_items(invoice_id: int):
-    """Get items for a specific invoice"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_invoice_items(invoice_id: int, business_day: str = None):
+    """Get items for a specific invoice
+
+    Pass the invoice's business_day to also look in that year's archive.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT product_name, weight_kg, price_per_kg, total_price
-        FROM invoice_items
-        WHERE invoice_id = ?
-        ORDER BY id
-    """, (invoice_id,))
+        cursor.execute(INVOICE_ITEMS_SQL.format(invoice_items="invoice_items"), (invoice_id,))
     
-    items = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return items
+        items = cursor.fetchall()
+        cursor.close()
+    
+        if not items and business_day and db_dialect.name == "sqlite" and overlapping_partitions(business_day, business_day):
+            with _with_archives(conn, business_day, business_day) as (conn, _, items_table):
+                items = conn.execute(INVOICE_ITEMS_SQL.format(invoice_items=items_table), (invoice_id,)).fetchall()
+        return items
 
 def get_low_stock_products(threshold: float = 5.0):
     """Get products with stock below threshold"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT * FROM products 
-        WHERE stock_kg < ? 
-        ORDER BY stock_kg ASC
-    """, (threshold,))
+        cursor.execute(LOW_STOCK_SQL, (threshold,))
     
-    products = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return products
+        products = cursor.fetchall()
+        cursor.close()
+        return products
 
 def get_sales_summary(start_date: str = None, end_date: str = None):
-    """Get sales summary for a date range"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Get sales summary for an inclusive range of business days ('YYYY-MM-DD')"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    if start_date and end_date:
-        cursor.execute("""
-            SELECT COUNT(*) as invoice_count,
-                   SUM(total_amount) as total_revenue,
-                   AVG(total_amount) as avg_invoice_value
-            FROM invoices
-            WHERE DATE(created_at) BETWEEN ? AND ?
-        """, (start_date, end_date))
-    else:
-        cursor.execute("""
-            SELECT COUNT(*) as invoice_count,
-                   SUM(total_amount) as total_revenue,
-                   AVG(total_amount) as avg_invoice_value
-            FROM invoices
-        """)
-    
-    summary = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return summary
-
-def search_products(query: str):
-    """Search products by name or category"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+        if start_date and end_date:
+            cursor.execute(PERIOD_SALES_SQL, day_range(date.fromisoformat(start_date), date.fromisoformat(end_date)))
+        else:
+            cursor.execute("""
+                SELECT COUNT(*) as invoice_count,
+                       SUM(total_amount) as total_revenue,
+                       AVG(total_amount) as avg_invoice_value
+                FROM invoices
+            """)
     
-    cursor.execute("""
-        SELECT * FROM products 
-        WHERE name LIKE ? OR category LIKE ?
-        ORDER BY name
-    """, (f"%{query}%", f"%{query}%"))
+        summary = cursor.fetchone()
+        cursor.close()
+        return summary
+
+def _fts_query(text: str) -> str:
+    """Turn free text into a safe FTS5 query: every word must match, the last one as a prefix"""
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _tsquery(text: str) -> str:
+    """The PostgreSQL counterpart of _fts_query, for to_tsquery"""
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return ""
+    terms[-1] += ":*"
+    return " & ".join(terms)
+
+def _search_query(text: str) -> str:
+    return _fts_query(text) if db_dialect.name == "sqlite" else _tsquery(text)
+
+def search_products(query: str, limit: int = 20):
+    """Search products by name, category or description (ranked, prefix search-as-you-type)"""
+    fts_query = _search_query(query)
+    if not fts_query:
+        return []
     
-    products = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return products
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute(SEARCH_SQL[db_dialect.name]["products"], (fts_query, limit))
+    
+        products = cursor.fetchall()
+        cursor.close()
+        return products
 
-def reset_database():
-    """Reset database - Clear all data except user accounts"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def search_invoices(query: str, start_ts: int = None, end_ts: int = None, limit: int = 50):
+    """Search invoices by number, customer name or phone, optionally within [start_ts, end_ts)
+
+    Archived years overlapping the range are searched too, each through its own index.
+    """
+    fts_query = _search_query(query)
+    if not fts_query:
+        return []
+    params = (fts_query, start_ts if start_ts is not None else 0, end_ts if end_ts is not None else 2**62)
+    start_day = business_time(start_ts)[0] if start_ts is not None else None
+    end_day = business_time(end_ts)[0] if end_ts is not None else None
+    
+    with db_connection() as conn:
+        if db_dialect.name != "sqlite" or not overlapping_partitions(start_day, end_day):
+            cursor = conn.cursor()
+            cursor.execute(SEARCH_SQL[db_dialect.name]["invoices"], params + (limit,))
+            invoices = cursor.fetchall()
+            cursor.close()
+            return invoices
     
+        with attached_partitions(conn, start_day, end_day) as conn:
+            cursor = conn.cursor()
+            schemas = ["main"] + searchable_partitions(conn)
+            cursor.execute(
+                " UNION ALL ".join(PARTITION_SEARCH_SQL.format(schema=schema) for schema in schemas)
+                + " ORDER BY search_rank LIMIT ?",
+                params * len(schemas) + (limit,)
+            )
+            invoices = cursor.fetchall()
+            cursor.close()
+            return invoices
+
+_last_stock_checkpoint_ts = None
+
+def maybe_checkpoint_stock(conn, interval: int = STOCK_CHECKPOINT_INTERVAL):
+    """Write a stock checkpoint if the last one is older than interval seconds"""
+    global _last_stock_checkpoint_ts
+    cursor = conn.cursor()
     try:
-        # Clear all tables except users
-        cursor.execute("DELETE FROM invoice_items")
-        cursor.execute("DELETE FROM invoices")
-        cursor.execute("DELETE FROM products")
-        
-        # Reset auto-increment counters
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('invoice_items', 'invoices', 'products')")
-        
+        if _last_stock_checkpoint_ts is None:
+            _last_stock_checkpoint_ts = latest_checkpoint_ts(cursor) or 0
+        current_ts = now_ts()
+        if current_ts - _last_stock_checkpoint_ts < interval:
+            return False
+        db_dialect.begin_write(cursor)
+        create_stock_checkpoint(cursor, current_ts)
         conn.commit()
+        _last_stock_checkpoint_ts = current_ts
         return True
-        
     except Exception as e:
         conn.rollback()
-        raise e
+        print(f"Warning: Could not write stock checkpoint: {e}")
+        return False
     finally:
         cursor.close()
+
+def get_stock_as_of(as_of_ts: int, product_id: int = None):
+    """Stock on hand at a point in time, per product (from the nearest checkpoint)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        rows = stock_as_of(cursor, as_of_ts, product_id)
+        cursor.close()
+        return rows
+
+def get_stock_movements(product_id: int, limit: int = 100):
+    """Most recent ledger movements for a product"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute(STOCK_MOVEMENTS_SQL, (product_id, limit))
+    
+        movements = cursor.fetchall()
+        cursor.close()
+        return movements
+
+def get_stock_movement_summary(start_ts: int, end_ts: int):
+    """Net quantity per product and movement type in [start_ts, end_ts), for shrinkage/reconciliation"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute(STOCK_MOVEMENT_SUMMARY_SQL, (start_ts, end_ts))
+    
+        summary = cursor.fetchall()
+        cursor.close()
+        return summary
+
+def archive_old_sales(keep_months: int = ARCHIVE_KEEP_MONTHS):
+    """Move sales older than the last keep_months months into the yearly archives
+
+    Returns {month: invoices moved}. Rollups stay in the live database.
+    """
+    require_sqlite(db_dialect, "Sales archiving")
+    conn = _pool._connect()
+    try:
+        return archive_closed_months(conn, business_today(), keep_months)
+    finally:
         conn.close()
 
+def get_archived_years():
+    """Years whose sales have been moved to archive files"""
+    return list_partitions() if db_dialect.name == "sqlite" else []
+
+def sync_with_hub(hub_path: str = SYNC_HUB_PATH):
+    """Send this till's changes to the hub database and take everyone else's
+
+    Returns (changes sent, changes received, renumbered invoices as (old, new) numbers).
+    """
+    require_sqlite(db_dialect, "Terminal sync")
+    if not hub_path:
+        raise ValueError("Set SYNC_HUB_PATH to the hub database file")
+    conn = _pool._connect()
+    hub = open_database(hub_path)
+    try:
+        sent, received, renumbered = sync_databases(conn, hub, TERMINAL_ID)
+    finally:
+        hub.close()
+        conn.close()
+    if received:
+        _bump_version('catalog')
+        sales_accumulator.invalidate()
+    return sent, received, renumbered
+
+def get_terminal_sync_status():
+    """Terminal id, hub path, pending local changes and last sync time"""
+    with db_connection() as conn:
+        status = get_sync_status(conn)
+    return {**status, "terminal_id": TERMINAL_ID, "hub_path": SYNC_HUB_PATH}
+
+def reset_database():
+    """Reset database - Clear all data except user accounts"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        try:
+            if db_dialect.name == "sqlite":
+                # Clear all tables except users
+                cursor.execute("DELETE FROM stock_holds")
+                cursor.execute("DELETE FROM stock_checkpoints")
+                cursor.execute("DELETE FROM stock_movements")
+                cursor.execute("DELETE FROM invoice_items")
+                cursor.execute("DELETE FROM invoices")
+                cursor.execute("DELETE FROM products")
+                cursor.execute("DELETE FROM invoice_sequences")
+                cursor.execute("DELETE FROM export_watermarks")
+                cursor.execute("DELETE FROM import_errors")
+                cursor.execute("DELETE FROM import_jobs")
+                # The next sync pulls the store's data back from the hub
+                cursor.execute("DELETE FROM sync_product_aliases")
+                cursor.execute("DELETE FROM sync_watermarks")
+                cursor.execute("DELETE FROM sync_journal")
+                for table in ROLLUP_TABLES:
+                    cursor.execute(f"DELETE FROM {table}")
+            
+                # Reset auto-increment counters
+                cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('invoice_items', 'invoices', 'products', 'stock_movements', 'import_jobs', 'stock_holds')")
+            else:
+                # One TRUNCATE clears every table except users and restarts the identity counters
+                cursor.execute(f"TRUNCATE {', '.join(pg_data_tables())} RESTART IDENTITY")
+        
+            conn.commit()
+            # Archived invoice ids would collide with the restarted counters
+            clear_archives()
+            _bump_version('catalog')
+            sales_accumulator.invalidate()
+            return True
+        
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+
 # Initialize database when module is imported
 try:
     init_local_db()
@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import zipfile
+from datetime import datetime
+from utils.archive import ARCHIVE_DIR, INVOICE_COLUMNS, INVOICE_ITEM_COLUMNS, list_partitions, partition_path
+from utils.backends import stream_rows
+from utils.database import db_connection, db_dialect
+from utils.timeutils import now_ts
+
+# Streaming export of the shop data into a zip of CSV, JSON Lines or Parquet
+# files. Tables are read in keyset chunks on id, each chunk on a briefly
+# borrowed connection, so memory and lock time stay flat however long the
+# history is. Named targets (e.g. "accounting") remember the last exported id
+# per table and only send newer rows on the next run. On PostgreSQL each table
+# is read through one server-side cursor instead.
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+
+# table -> (columns, incremental, has archived rows). Products are small and
+# edited in place, so they are always exported in full.
+EXPORT_TABLES = {
+    "products": ("*", False, False),
+    "invoices": (INVOICE_COLUMNS, True, True),
+    "invoice_items": (INVOICE_ITEM_COLUMNS, True, True),
+    "stock_movements": ("*", True, False),
+}
+
+def get_export_watermarks(target: str):
+    """Last exported id per table for an export target"""
+    with db_connection() as conn:
+        rows = conn.execute(
+            "SELECT table_name, last_id, exported_ts FROM export_watermarks WHERE target = ?", (target,)
+        ).fetchall()
+        return {row['table_name']: (row['last_id'], row['exported_ts']) for row in rows}
+
+def _save_watermarks(target: str, high_ids: dict):
+    with db_connection() as conn:
+        try:
+            conn.executemany("""
+                INSERT INTO export_watermarks (target, table_name, last_id, exported_ts)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (target, table_name) DO UPDATE SET
+                    last_id = excluded.last_id,
+                    exported_ts = excluded.exported_ts
+            """, [(target, table, last_id, now_ts()) for table, last_id in high_ids.items()])
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def _export_plan(tables):
+    """Existing tables with their upper id bound and column types, read in one transaction"""
+    if db_dialect.name != "sqlite":
+        return _export_plan_postgres(tables)
+    with db_connection() as conn:
+        conn.execute("BEGIN")
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        plan = {}
+        for table in tables:
+            if table not in existing:
+                continue
+            # sqlite_sequence still counts rows that were archived or deleted
+            high_id = conn.execute(f"""
+                SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0),
+                           (SELECT COALESCE(MAX(id), 0) FROM {table}))
+            """, (table,)).fetchone()[0]
+            column_types = {row['name']: (row['type'] or "").upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+            plan[table] = (high_id, column_types)
+        conn.rollback()
+        return plan
+
+def _export_plan_postgres(tables):
+    with db_connection() as conn:
+        existing = {row[0] for row in conn.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema()"
+        )}
+        plan = {}
+        for table in tables:
+            if table not in existing:
+                continue
+            high_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            # Named like the SQLite declared types so the Parquet schema comes out the same
+            column_types = {
+                row['column_name']: "INTEGER" if "int" in row['data_type'] else
+                                    "REAL" if row['data_type'] == "double precision" else row['data_type'].upper()
+                for row in conn.execute("""
+                    SELECT column_name, data_type FROM information_schema.columns
+                    WHERE table_schema = current_schema() AND table_name = ?
+                """, (table,))
+            }
+            plan[table] = (high_id, column_types)
+        conn.rollback()
+        return plan
+
+def _iter_chunks(table: str, columns: str, low_id: int, high_id: int, chunk_size: int):
+    """Yield lists of rows with low_id < id <= high_id, oldest first, archives before live rows"""
+    if db_dialect.name != "sqlite":
+        # A PostgreSQL read snapshot does not hold up writers, so one cursor covers the table
+        with db_connection() as conn:
+            yield from stream_rows(
+                conn, f"SELECT {columns} FROM {table} WHERE id > ? AND id <= ? ORDER BY id",
+                (low_id, high_id), chunk_size
+            )
+        return
+
+    select_sql = f"SELECT {columns} FROM {{table}} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?"
+    if EXPORT_TABLES[table][2]:
+        # Archived ids are all older than live ones, so reading year by year keeps id order
+        for year in list_partitions(ARCHIVE_DIR):
+            conn = sqlite3.connect(f"file:{os.path.abspath(partition_path(year))}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            try:
+                yield from _keyset_chunks(
+                    lambda sql, params: conn.execute(sql, params).fetchall(),
+                    select_sql.format(table=table), low_id, high_id, chunk_size
+                )
+            finally:
+                conn.close()
+
+    def execute(sql, params):
+        with db_connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    yield from _keyset_chunks(execute, select_sql.format(table=table), low_id, high_id, chunk_size)
+
+def _keyset_chunks(execute, select_sql: str, low_id: int, high_id: int, chunk_size: int):
+    last_id = low_id
+    while True:
+        rows = execute(select_sql, (last_id, high_id, chunk_size))
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+def _write_text(archive, name: str, fmt: str, chunks):
+    """Stream chunks into a CSV or JSON Lines member; returns the row count"""
+    count = 0
+    with archive.open(f"{name}.{fmt}", "w") as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as text:
+        writer = csv.writer(text) if fmt == "csv" else None
+        for rows in chunks:
+            if writer is not None:
+                if count == 0:
+                    writer.writerow(rows[0].keys())
+                writer.writerows(tuple(row) for row in rows)
+            else:
+                text.writelines(json.dumps(dict(row), default=str) + "\n" for row in rows)
+            count += len(rows)
+    return count
+
+def _write_parquet(archive, name: str, column_types: dict, chunks):
+    """Stream chunks into a Parquet member as one row group per chunk; returns the row count"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    count = 0
+    writer = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, f"{name}.parquet")
+        try:
+            for rows in chunks:
+                if writer is None:
+                    # Typed from the declared columns so an all-NULL first chunk cannot fix the type
+                    schema = pa.schema([
+                        (column, pa.int64() if "INT" in column_types.get(column, "") else
+                                 pa.float64() if "REAL" in column_types.get(column, "") else pa.string())
+                        for column in rows[0].keys()
+                    ])
+                    writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+                columns = {column: [row[column] for row in rows] for column in schema.names}
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                count += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is not None:
+            # Parquet pages are already compressed
+            archive.write(tmp_path, f"{name}.parquet", compress_type=zipfile.ZIP_STORED)
+    return count
+
+def export_data(fmt: str = "csv", target: str = None, tables=None, export_dir: str = EXPORT_DIR,
+                chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Export tables into a zip file and return (path, {table: rows exported})
+
+    With a target name, only rows newer than that target's watermark are
+    exported, and the watermark advances once the zip is complete.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    plan = _export_plan(tables or EXPORT_TABLES)
+    watermarks = get_export_watermarks(target) if target else {}
+
+    os.makedirs(export_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(export_dir, f"meatops_{target or 'full'}_{stamp}_{fmt}.zip")
+    tmp_path = f"{path}.tmp"
+
+    counts = {}
+    manifest = {"format": fmt, "target": target, "exported_ts": now_ts(), "tables": {}}
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for table, (high_id, column_types) in plan.items():
+            columns, incremental, _ = EXPORT_TABLES[table]
+            low_id = watermarks.get(table, (0, None))[0] if incremental else 0
+            chunks = _iter_chunks(table, columns, low_id, high_id, chunk_size)
+            if fmt == "parquet":
+                counts[table] = _write_parquet(archive, table, column_types, chunks)
+            else:
+                counts[table] = _write_text(archive, table, fmt, chunks)
+            manifest["tables"][table] = {"rows": counts[table], "after_id": low_id, "to_id": high_id}
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    os.replace(tmp_path, path)
+
+    if target:
+        _save_watermarks(target, {table: plan[table][0] for table in plan if EXPORT_TABLES[table][1]})
+    return path, counts
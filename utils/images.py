@@ -0,0 +1,142 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple
+from PIL import Image, ImageOps, features
+
+# Product images. An upload is decoded once and stored as fixed-size
+# thumbnails named by the hash of its content, so the same picture uploaded
+# for several products is kept once. Pages read thumbnails through a
+# process-wide LRU byte cache shared by every session, so redrawing the picker
+# neither decodes images nor touches the disk once they have been served.
+
+PRODUCT_IMAGE_DIR = "products_images"
+# Standard size for product pictures
+PRODUCT_IMAGE_SIZE = (300, 200)
+# Thumbnails generated for every upload; "card" is the one kept in products.image_path
+THUMBNAIL_SIZES = {"card": PRODUCT_IMAGE_SIZE, "small": (120, 80)}
+# WebP is about a third smaller than JPEG at the same quality
+THUMBNAIL_FORMAT = os.getenv("PRODUCT_IMAGE_FORMAT", "webp" if features.check("webp") else "jpeg").lower()
+THUMBNAIL_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+IMAGE_CACHE_MB = float(os.getenv("IMAGE_CACHE_MB", "64"))
+
+class StoredImage(NamedTuple):
+    """An uploaded image as stored: content hash, original dimensions and card thumbnail path"""
+    image_hash: str
+    width: int
+    height: int
+    path: str
+
+class ImageCache:
+    """Process-wide LRU cache of image file bytes, bounded by their total size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str):
+        """Bytes of the file at path, read from disk only on a miss; None if it does not exist"""
+        with self._lock:
+            data = self._entries.get(path)
+            if data is not None:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return data or None
+            self.misses += 1
+        try:
+            data = Path(path).read_bytes()
+        except OSError:
+            # Remember missing files too, so they are not looked up on every rerun
+            data = b""
+        self.put(path, data)
+        return data or None
+
+    def put(self, path: str, data: bytes):
+        """Store bytes for path, evicting the least recently used entries over the budget"""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[path] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+image_cache = ImageCache(int(IMAGE_CACHE_MB * 1024 * 1024))
+
+def thumbnail_path(image_hash: str, size: str = "card", image_format: str = THUMBNAIL_FORMAT) -> str:
+    """Path of one thumbnail of a stored image"""
+    return f"{PRODUCT_IMAGE_DIR}/{image_hash}_{size}.{THUMBNAIL_EXTENSIONS[image_format]}"
+
+def _read_source(source) -> bytes:
+    if isinstance(source, (str, os.PathLike)):
+        return Path(source).read_bytes()
+    # Uploaded files may already have been read for a preview
+    source.seek(0)
+    return source.read()
+
+def _write_atomic(path: str, data: bytes):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def store_product_image(source) -> StoredImage:
+    """Store an uploaded image (path or file object) as thumbnails named by its content hash
+
+    Thumbnails are cropped to fill each size. An image stored before is not
+    decoded again. The new thumbnails also go straight into the image cache.
+    """
+    data = _read_source(source)
+    image_hash = hashlib.sha256(data).hexdigest()[:32]
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    width, height = image.size
+    # Convert to RGB if it's RGBA (PNG with transparency)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    os.makedirs(PRODUCT_IMAGE_DIR, exist_ok=True)
+    for size_name, size in THUMBNAIL_SIZES.items():
+        path = thumbnail_path(image_hash, size_name)
+        if os.path.exists(path):
+            continue
+        buffer = io.BytesIO()
+        ImageOps.fit(image, size, Image.Resampling.LANCZOS).save(buffer, THUMBNAIL_FORMAT.upper(), quality=85)
+        _write_atomic(path, buffer.getvalue())
+        image_cache.put(path, buffer.getvalue())
+    return StoredImage(image_hash, width, height, thumbnail_path(image_hash))
+
+def product_thumbnail(product, size: str = "card"):
+    """Thumbnail bytes for a product row from the image cache, or None if it has no image
+
+    Products stored before thumbnails (or synced without their hash) are
+    served from image_path as is.
+    """
+    image_path = product['image_path']
+    if not image_path:
+        return None
+    if product['image_hash']:
+        # Same format as the card thumbnail recorded with the product
+        image_format = "jpeg" if image_path.endswith(".jpg") else "webp"
+        image_path = thumbnail_path(product['image_hash'], size, image_format)
+    return image_cache.get(image_path)
@@ -0,0 +1,377 @@
+import os
+import re
+import sqlite3
+import sys
+from utils.timeutils import business_time, utc_text_to_ts
+from utils.rollups import create_rollup_schema, rebuild_rollups
+from utils.stock_ledger import create_ledger_schema
+from utils.stock_holds import create_holds_schema
+from utils.sync import create_sync_schema
+from utils.queries import (
+    DAILY_SALES_SQL, HELD_STOCK_SQL, HOURLY_SALES_SQL, INVOICE_ITEMS_SQL, INVOICES_PAGE_SQL, LOW_STOCK_SQL,
+    PARTITION_SEARCH_SQL, PAYMENT_SALES_SQL, PERIOD_SALES_SQL, SALES_OVERVIEW_RECENT_SQL, SALES_OVERVIEW_SEED_SQL,
+    SEARCH_SQL, STOCK_MOVEMENT_SUMMARY_SQL, STOCK_MOVEMENTS_SQL, TOP_PRODUCTS_SQL
+)
+
+# Schema version is tracked in SQLite's built-in PRAGMA user_version.
+# Migrations run in order, each inside its own transaction, and are never edited
+# once released - add a new migration instead.
+
+def _column_exists(conn, table: str, column: str) -> bool:
+    """Check whether a column exists on a table"""
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+def _m001_base_schema(conn):
+    """Core tables (matches the pre-migration CREATE TABLE IF NOT EXISTS schema)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'cashier',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price_per_kg REAL NOT NULL,
+            stock_kg REAL DEFAULT 0,
+            category TEXT,
+            description TEXT,
+            image_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_number TEXT UNIQUE NOT NULL,
+            customer_name TEXT,
+            customer_phone TEXT,
+            total_amount REAL NOT NULL,
+            payment_method TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_id INTEGER REFERENCES invoices(id) ON DELETE CASCADE,
+            product_id INTEGER REFERENCES products(id),
+            product_name TEXT NOT NULL,
+            weight_kg REAL NOT NULL,
+            price_per_kg REAL NOT NULL,
+            total_price REAL NOT NULL
+        )
+    """)
+    # Databases created before image support lack this column
+    if not _column_exists(conn, "products", "image_path"):
+        conn.execute("ALTER TABLE products ADD COLUMN image_path TEXT")
+
+def _m002_indexes(conn):
+    """Secondary indexes for the hot lookup and report queries"""
+    # Covers get_invoice_items and the invoice_items side of the top-products join
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice
+        ON invoice_items (invoice_id, product_name, weight_kg, price_per_kg, total_price)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoice_items_product ON invoice_items (product_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_created_at ON invoices (created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products (category)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_stock ON products (stock_kg)")
+
+def _m003_invoice_timestamps(conn):
+    """Epoch timestamp and shop-local business day/hour on invoices"""
+    conn.execute("ALTER TABLE invoices ADD COLUMN created_ts INTEGER")
+    conn.execute("ALTER TABLE invoices ADD COLUMN business_day TEXT")
+    conn.execute("ALTER TABLE invoices ADD COLUMN business_hour INTEGER")
+    # Backfill from the UTC CURRENT_TIMESTAMP text column
+    rows = conn.execute("SELECT id, created_at FROM invoices").fetchall()
+    updates = []
+    for invoice_id, created_at in rows:
+        ts = utc_text_to_ts(created_at)
+        day, hour = business_time(ts)
+        updates.append((ts, day, hour, invoice_id))
+    conn.executemany("""
+        UPDATE invoices SET created_ts = ?, business_day = ?, business_hour = ? WHERE id = ?
+    """, updates)
+    # Report aggregates read only from this index; the invoice list pages on created_ts
+    conn.execute("DROP INDEX IF EXISTS idx_invoices_created_at")
+    conn.execute("""
+        CREATE INDEX idx_invoices_business_day
+        ON invoices (business_day, business_hour, payment_method, total_amount)
+    """)
+    conn.execute("CREATE INDEX idx_invoices_created_ts ON invoices (created_ts)")
+
+def _m004_invoice_sequences(conn):
+    """Per-terminal, per-day invoice number counters"""
+    conn.execute("""
+        CREATE TABLE invoice_sequences (
+            terminal_id TEXT NOT NULL,
+            business_day TEXT NOT NULL,
+            last_value INTEGER NOT NULL,
+            PRIMARY KEY (terminal_id, business_day)
+        ) WITHOUT ROWID
+    """)
+
+def _m005_sales_rollups(conn):
+    """Trigger-maintained daily sales rollups, backfilled from existing invoices"""
+    create_rollup_schema(conn)
+    rebuild_rollups(conn)
+
+def _m006_full_text_search(conn):
+    """FTS5 indexes over products and invoices, kept in sync by triggers"""
+    conn.execute("""
+        CREATE VIRTUAL TABLE products_fts USING fts5(
+            name, category, description,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+        )
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE invoices_fts USING fts5(
+            invoice_number, customer_name, customer_phone,
+            content='invoices', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+        )
+    """)
+    # External-content sync triggers: deletes are issued through the special 'delete' command
+    for table, columns in (("products", ("name", "category", "description")),
+                           ("invoices", ("invoice_number", "customer_name", "customer_phone"))):
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"NEW.{c}" for c in columns)
+        old_values = ", ".join(f"OLD.{c}" for c in columns)
+        conn.execute(f"""
+            CREATE TRIGGER trg_{table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {table}_fts (rowid, {column_list}) VALUES (NEW.id, {new_values});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER trg_{table}_fts_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER trg_{table}_fts_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO {table}_fts (rowid, {column_list}) VALUES (NEW.id, {new_values});
+            END
+        """)
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+def _m007_stock_ledger(conn):
+    """Stock movement ledger and checkpoints, opened with each product's current stock"""
+    create_ledger_schema(conn)
+    conn.execute("""
+        INSERT INTO stock_movements (product_id, movement_type, quantity_kg, reason, created_ts)
+        SELECT id, 'opening', stock_kg, 'Balance at ledger start', CAST(strftime('%s', 'now') AS INTEGER)
+        FROM products
+    """)
+
+def _m008_export_watermarks(conn):
+    """Last exported row id per export target and table, for incremental exports"""
+    conn.execute("""
+        CREATE TABLE export_watermarks (
+            target TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            last_id INTEGER NOT NULL,
+            exported_ts INTEGER NOT NULL,
+            PRIMARY KEY (target, table_name)
+        ) WITHOUT ROWID
+    """)
+
+def _m009_import_jobs(conn):
+    """Bulk import jobs (for resuming) and their per-row error reports"""
+    conn.execute("""
+        CREATE TABLE import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            source_name TEXT,
+            source_hash TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            rows_imported INTEGER NOT NULL DEFAULT 0,
+            rows_failed INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            username TEXT,
+            started_ts INTEGER NOT NULL,
+            updated_ts INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_import_jobs_source ON import_jobs (kind, source_hash)")
+    conn.execute("""
+        CREATE TABLE import_errors (
+            job_id INTEGER NOT NULL,
+            row_number INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            PRIMARY KEY (job_id, row_number)
+        ) WITHOUT ROWID
+    """)
+
+def _m010_sync_journal(conn):
+    """Global row uids, ledger counts and the change journal for terminal sync"""
+    for table in ("products", "invoices", "invoice_items", "stock_movements"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN uid TEXT")
+        conn.execute(f"UPDATE {table} SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+        conn.execute(f"CREATE UNIQUE INDEX idx_{table}_uid ON {table} (uid)")
+    conn.execute("ALTER TABLE stock_movements ADD COLUMN count_kg REAL")
+    # Ledger openings are the stock counted when the ledger started
+    conn.execute("UPDATE stock_movements SET count_kg = quantity_kg WHERE movement_type = 'opening'")
+    conn.execute("""
+        CREATE INDEX idx_stock_movements_counts ON stock_movements (product_id, created_ts, uid)
+        WHERE count_kg IS NOT NULL
+    """)
+    conn.execute("CREATE INDEX idx_stock_movements_product_ts ON stock_movements (product_id, created_ts)")
+    create_sync_schema(conn)
+    # Everything already in the database is sent on the first sync
+    for entity, table in (("product", "products"), ("invoice", "invoices"), ("stock_movement", "stock_movements")):
+        conn.execute(f"""
+            INSERT INTO sync_journal (entity, row_id, created_ts)
+            SELECT '{entity}', id, CAST(strftime('%s', 'now') AS INTEGER) FROM {table} ORDER BY id
+        """)
+
+def _m011_stock_holds(conn):
+    """Short-lived stock holds for open carts"""
+    create_holds_schema(conn)
+
+def _m012_product_image_hashes(conn):
+    """Content hash and original dimensions of each product image"""
+    conn.execute("ALTER TABLE products ADD COLUMN image_hash TEXT")
+    conn.execute("ALTER TABLE products ADD COLUMN image_width INTEGER")
+    conn.execute("ALTER TABLE products ADD COLUMN image_height INTEGER")
+
+def _m013_product_plu(conn):
+    """PLU or barcode per product, for scan and keyboard entry"""
+    conn.execute("ALTER TABLE products ADD COLUMN plu TEXT")
+    conn.execute("CREATE UNIQUE INDEX idx_products_plu ON products (plu)")
+
+def _m014_stock_holds_covering_index(conn):
+    """Expiry index covering the held-stock totals"""
+    conn.execute("DROP INDEX IF EXISTS idx_stock_holds_expires")
+    conn.execute("CREATE INDEX idx_stock_holds_expires ON stock_holds (expires_ts, product_id, weight_kg)")
+
+# Ordered list of (version, description, function)
+MIGRATIONS = [
+    (1, "Base schema", _m001_base_schema),
+    (2, "Secondary indexes", _m002_indexes),
+    (3, "Invoice epoch timestamps and business day", _m003_invoice_timestamps),
+    (4, "Invoice number sequences", _m004_invoice_sequences),
+    (5, "Sales rollup tables", _m005_sales_rollups),
+    (6, "Full-text search", _m006_full_text_search),
+    (7, "Stock ledger", _m007_stock_ledger),
+    (8, "Export watermarks", _m008_export_watermarks),
+    (9, "Bulk import jobs", _m009_import_jobs),
+    (10, "Terminal sync journal", _m010_sync_journal),
+    (11, "Cart stock holds", _m011_stock_holds),
+    (12, "Product image hashes", _m012_product_image_hashes),
+    (13, "Product PLU codes", _m013_product_plu),
+    (14, "Covering index for held stock", _m014_stock_holds_covering_index),
+]
+
+def get_schema_version(conn) -> int:
+    """Return the schema version recorded in the database file"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn) -> int:
+    """Apply all pending migrations in order, one transaction each
+
+    Returns the resulting schema version.
+    """
+    current = get_schema_version(conn)
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise RuntimeError(f"Migration {version} ({description}) failed: {e}") from e
+        current = version
+    return current
+
+# Tables small enough by design that a hot query may scan them, as named in the plan (alias if used)
+SCANNABLE_TABLES = frozenset()
+
+# Hot queries whose plans must stay on an index: name -> (sql, sample params), built from the
+# statements production runs (utils/queries.py)
+_DAYS = ("2025-01-01", "2025-01-08")
+HOT_QUERIES = {
+    "get_invoice_items": (INVOICE_ITEMS_SQL.format(invoice_items="invoice_items"), (1,)),
+    "get_low_stock_products": (LOW_STOCK_SQL, (5.0,)),
+    "get_invoices_page": (INVOICES_PAGE_SQL.format(invoices="invoices"), (0, 1, 1, 0, 51)),
+    "render_daily_sales": (DAILY_SALES_SQL, _DAYS),
+    "render_period_sales": (PERIOD_SALES_SQL, _DAYS),
+    "render_top_products": (TOP_PRODUCTS_SQL, _DAYS),
+    "render_analytics_payment": (PAYMENT_SALES_SQL, _DAYS),
+    "render_analytics_hourly": (HOURLY_SALES_SQL, _DAYS),
+    "search_products": (SEARCH_SQL["sqlite"]["products"], ('"beef"*', 20)),
+    "search_invoices": (SEARCH_SQL["sqlite"]["invoices"], ('"inv"*', 0, 1, 50)),
+    "search_invoices_partition": (PARTITION_SEARCH_SQL.format(schema="main"), ('"inv"*', 0, 1)),
+    "seed_sales_overview": (SALES_OVERVIEW_SEED_SQL, ("2025-01-01",)),
+    "seed_sales_overview_recent": (SALES_OVERVIEW_RECENT_SQL, (0,)),
+    "get_stock_movements": (STOCK_MOVEMENTS_SQL, (1, 100)),
+    "get_stock_movement_summary": (STOCK_MOVEMENT_SUMMARY_SQL, (0, 1)),
+    "get_held_stock": (HELD_STOCK_SQL["sqlite"], (0,)),
+}
+
+def explain_query_plans(conn, queries: dict = None) -> dict:
+    """Return the EXPLAIN QUERY PLAN detail lines for each hot query"""
+    plans = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        plans[name] = [row[3] for row in rows]
+    return plans
+
+def _is_full_scan(detail: str) -> bool:
+    if not detail.startswith("SCAN"):
+        return False
+    # A MATCH on a full-text table is answered from its own index; FTS5 lists the constraints it
+    # uses after the colon (M for MATCH), and nothing there means it reads every row
+    virtual = re.search(r"VIRTUAL TABLE INDEX \d+:(\S*)", detail)
+    if virtual:
+        return not virtual.group(1)
+    # SCAN ... USING [COVERING] INDEX still reads every entry of the index
+    return detail.split()[1] not in SCANNABLE_TABLES
+
+def find_full_scans(plans: dict) -> dict:
+    """Pick out the queries whose plan reads a whole table or index; only SEARCH plans pass"""
+    scans = {}
+    for name, details in plans.items():
+        bad = [d for d in details if _is_full_scan(d)]
+        if bad:
+            scans[name] = bad
+    return scans
+
+def check_query_plans(conn, queries: dict = None, verbose: bool = True) -> dict:
+    """Print every hot query plan and raise if any of them falls back to a full scan"""
+    plans = explain_query_plans(conn, queries)
+    if verbose:
+        for name, details in plans.items():
+            print(f"{name}:")
+            for detail in details:
+                print(f"    {detail}")
+    scans = find_full_scans(plans)
+    if scans:
+        raise AssertionError(f"Full table scan in hot queries: {scans}")
+    return plans
+
+if __name__ == "__main__":
+    # Usage: python -m utils.migrations [db_path]
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("LOCAL_DB_PATH", "meat_shop.db")
+    conn = sqlite3.connect(db_path)
+    try:
+        print(f"Schema version: {apply_migrations(conn)}")
+        check_query_plans(conn)
+        print("All hot queries use an index.")
+    except AssertionError as e:
+        print(f"FAILED: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
@@ -0,0 +1,274 @@
+import re
+import sys
+
+# PostgreSQL schema for DB_BACKEND=postgresql, kept equivalent to the SQLite
+# migrations in utils/migrations.py (version 1 here matches SQLite version 9).
+# The version lives in a one-row schema_version table; an advisory lock lets
+# several tills start against the same server at once.
+
+SCHEMA_LOCK_ID = 720_412_017
+
+# Full-text search documents; queries must repeat these expressions to use the GIN indexes
+PRODUCT_SEARCH_VECTOR = (
+    "to_tsvector('simple', name || ' ' || coalesce(category, '') || ' ' || coalesce(description, ''))"
+)
+INVOICE_SEARCH_VECTOR = (
+    "to_tsvector('simple', invoice_number || ' ' || coalesce(customer_name, '') || ' ' || "
+    "coalesce(customer_phone, ''))"
+)
+
+PG_MIGRATIONS = [
+    (1, "Schema equivalent to SQLite migration 9", (
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'cashier',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            name TEXT NOT NULL,
+            price_per_kg DOUBLE PRECISION NOT NULL,
+            stock_kg DOUBLE PRECISION DEFAULT 0,
+            category TEXT,
+            description TEXT,
+            image_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS invoices (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            invoice_number TEXT UNIQUE NOT NULL,
+            customer_name TEXT,
+            customer_phone TEXT,
+            total_amount DOUBLE PRECISION NOT NULL,
+            payment_method TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_ts BIGINT,
+            business_day TEXT,
+            business_hour INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS invoice_items (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            invoice_id BIGINT REFERENCES invoices(id) ON DELETE CASCADE,
+            product_id BIGINT REFERENCES products(id),
+            product_name TEXT NOT NULL,
+            weight_kg DOUBLE PRECISION NOT NULL,
+            price_per_kg DOUBLE PRECISION NOT NULL,
+            total_price DOUBLE PRECISION NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS invoice_sequences (
+            terminal_id TEXT NOT NULL,
+            business_day TEXT NOT NULL,
+            last_value INTEGER NOT NULL,
+            PRIMARY KEY (terminal_id, business_day)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_hourly (
+            business_day TEXT NOT NULL,
+            business_hour INTEGER NOT NULL,
+            invoice_count INTEGER NOT NULL DEFAULT 0,
+            revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (business_day, business_hour)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_by_payment (
+            business_day TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            invoice_count INTEGER NOT NULL DEFAULT 0,
+            revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (business_day, payment_method)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_by_product (
+            business_day TEXT NOT NULL,
+            product_id BIGINT NOT NULL,
+            product_name TEXT NOT NULL,
+            weight_kg DOUBLE PRECISION NOT NULL DEFAULT 0,
+            line_count INTEGER NOT NULL DEFAULT 0,
+            revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (business_day, product_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            product_id BIGINT NOT NULL REFERENCES products(id),
+            movement_type TEXT NOT NULL
+                CHECK (movement_type IN ('opening', 'sale', 'receipt', 'adjustment', 'waste')),
+            quantity_kg DOUBLE PRECISION NOT NULL,
+            reason TEXT,
+            username TEXT,
+            invoice_id BIGINT REFERENCES invoices(id),
+            created_ts BIGINT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stock_checkpoints (
+            checkpoint_ts BIGINT NOT NULL,
+            product_id BIGINT NOT NULL,
+            balance_kg DOUBLE PRECISION NOT NULL,
+            last_movement_id BIGINT NOT NULL,
+            PRIMARY KEY (checkpoint_ts, product_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS export_watermarks (
+            target TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            last_id BIGINT NOT NULL,
+            exported_ts BIGINT NOT NULL,
+            PRIMARY KEY (target, table_name)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products (category)",
+        "CREATE INDEX IF NOT EXISTS idx_products_stock ON products (stock_kg)",
+        f"CREATE INDEX IF NOT EXISTS idx_products_search ON products USING GIN (({PRODUCT_SEARCH_VECTOR}))",
+        "CREATE INDEX IF NOT EXISTS idx_invoices_created_ts ON invoices (created_ts, id)",
+        "CREATE INDEX IF NOT EXISTS idx_invoices_business_day ON invoices (business_day, business_hour)",
+        f"CREATE INDEX IF NOT EXISTS idx_invoices_search ON invoices USING GIN (({INVOICE_SEARCH_VECTOR}))",
+        """
+        CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice
+        ON invoice_items (invoice_id) INCLUDE (product_name, weight_kg, price_per_kg, total_price)
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_invoice_items_product ON invoice_items (product_id)",
+        "CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements (product_id, id)",
+        """
+        CREATE INDEX IF NOT EXISTS idx_stock_movements_created
+        ON stock_movements (created_ts) INCLUDE (product_id, movement_type, quantity_kg)
+        """,
+        # Rollups, maintained in the sale's transaction as on SQLite
+        """
+        CREATE OR REPLACE FUNCTION rollup_invoice() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO sales_hourly (business_day, business_hour, invoice_count, revenue)
+            VALUES (NEW.business_day, NEW.business_hour, 1, NEW.total_amount)
+            ON CONFLICT (business_day, business_hour) DO UPDATE SET
+                invoice_count = sales_hourly.invoice_count + 1,
+                revenue = sales_hourly.revenue + excluded.revenue;
+            INSERT INTO sales_by_payment (business_day, payment_method, invoice_count, revenue)
+            VALUES (NEW.business_day, NEW.payment_method, 1, NEW.total_amount)
+            ON CONFLICT (business_day, payment_method) DO UPDATE SET
+                invoice_count = sales_by_payment.invoice_count + 1,
+                revenue = sales_by_payment.revenue + excluded.revenue;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION rollup_invoice_item() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO sales_by_product (business_day, product_id, product_name, weight_kg, line_count, revenue)
+            SELECT i.business_day, COALESCE(NEW.product_id, 0), NEW.product_name, NEW.weight_kg, 1, NEW.total_price
+            FROM invoices i
+            WHERE i.id = NEW.invoice_id AND i.business_day IS NOT NULL
+            ON CONFLICT (business_day, product_id) DO UPDATE SET
+                product_name = excluded.product_name,
+                weight_kg = sales_by_product.weight_kg + excluded.weight_kg,
+                line_count = sales_by_product.line_count + 1,
+                revenue = sales_by_product.revenue + excluded.revenue;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_invoices_rollup ON invoices",
+        """
+        CREATE TRIGGER trg_invoices_rollup AFTER INSERT ON invoices
+        FOR EACH ROW WHEN (NEW.business_day IS NOT NULL) EXECUTE FUNCTION rollup_invoice()
+        """,
+        "DROP TRIGGER IF EXISTS trg_invoice_items_rollup ON invoice_items",
+        """
+        CREATE TRIGGER trg_invoice_items_rollup AFTER INSERT ON invoice_items
+        FOR EACH ROW EXECUTE FUNCTION rollup_invoice_item()
+        """,
+    )),
+    # Terminal sync (SQLite migration 10) is SQLite-only; the ledger counts are shared
+    (2, "Stock counts in the ledger", (
+        "ALTER TABLE stock_movements ADD COLUMN IF NOT EXISTS count_kg DOUBLE PRECISION",
+    )),
+    (3, "Cart stock holds", (
+        """
+        CREATE TABLE IF NOT EXISTS stock_holds (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            cart_id TEXT NOT NULL,
+            product_id BIGINT NOT NULL REFERENCES products(id),
+            weight_kg DOUBLE PRECISION NOT NULL CHECK (weight_kg > 0),
+            expires_ts BIGINT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_stock_holds_product ON stock_holds (product_id, expires_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_stock_holds_cart ON stock_holds (cart_id)",
+        "CREATE INDEX IF NOT EXISTS idx_stock_holds_expires ON stock_holds (expires_ts)",
+    )),
+    (4, "Product image hashes", (
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS image_hash TEXT",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS image_width INTEGER",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS image_height INTEGER",
+    )),
+    (5, "Product PLU codes", (
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS plu TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_products_plu ON products (plu)",
+    )),
+    (6, "Covering index for held stock", (
+        "DROP INDEX IF EXISTS idx_stock_holds_expires",
+        "CREATE INDEX idx_stock_holds_expires ON stock_holds (expires_ts, product_id, weight_kg)",
+    )),
+]
+
+# Tables whose rows survive a data reset
+PG_KEPT_TABLES = ("users",)
+
+def pg_data_tables():
+    """Tables created by PG_MIGRATIONS that a data reset clears, in creation order"""
+    tables = [name for _, _, statements in PG_MIGRATIONS for statement in statements
+              for name in re.findall(r"CREATE TABLE IF NOT EXISTS (\w+)", statement)]
+    return [name for name in tables if name not in PG_KEPT_TABLES]
+
+def get_pg_schema_version(conn) -> int:
+    """Current schema version of a PostgreSQL database (0 if empty)"""
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        return cursor.fetchone()[0] or 0
+
+def apply_pg_migrations(conn) -> int:
+    """Apply all pending PostgreSQL migrations, one transaction each
+
+    conn is a psycopg connection. Returns the resulting schema version.
+    """
+    current = 0
+    for version, description, statements in PG_MIGRATIONS:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+                current = get_pg_schema_version(conn)
+                if version > current:
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute("INSERT INTO schema_version (version) VALUES (%s)", (version,))
+                    current = version
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise RuntimeError(f"PostgreSQL migration {version} ({description}) failed: {e}") from e
+    return current
+
+if __name__ == "__main__":
+    # Usage: python -m utils.pg_schema postgresql://user@host/db
+    import psycopg
+    with psycopg.connect(sys.argv[1]) as conn:
+        print(f"Schema version: {apply_pg_migrations(conn)}")
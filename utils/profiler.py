@@ -0,0 +1,268 @@
+import bisect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from time import perf_counter
+
+# Statement-level profiling for the SQLite connection layer. Pooled
+# connections are opened with ProfiledConnection, whose cursors time every
+# execute/executemany/fetch and fold the result into per-statement stats
+# keyed by normalized SQL. The latency histogram covers execute (which runs
+# the statement up to its first row); fetch time is added to the totals.
+# Statements slower than DB_SLOW_QUERY_MS also go to a slow-query log (in
+# memory, plus DB_SLOW_QUERY_LOG as JSON Lines if set). Lock wait is the time
+# spent in BEGIN IMMEDIATE/EXCLUSIVE and waiting for a pooled connection.
+# Profiling is off unless DB_PROFILE=1 (or switched on in System Info).
+
+DB_PROFILE = os.getenv("DB_PROFILE", "0") == "1"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+DB_SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG", "")
+SLOW_LOG_SIZE = 200
+
+# Latency histogram bucket upper bounds in seconds: 10 µs growing by 1.5x to about 2 minutes
+LATENCY_BUCKETS = tuple(1e-5 * 1.5 ** i for i in range(41))
+
+# Pseudo-statement used for time spent waiting for a pooled connection
+POOL_WAIT_KEY = "-- wait for pooled connection"
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Statements whose whole duration is spent acquiring the database write lock
+_LOCKING = re.compile(r"^\s*BEGIN\s+(IMMEDIATE|EXCLUSIVE)", re.IGNORECASE)
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and replace literals with ? so equivalent statements share a key"""
+    return _LITERALS.sub("?", _WHITESPACE.sub(" ", sql).strip())
+
+class StatementStats:
+    """Counters and latency histogram for one normalized statement"""
+
+    __slots__ = ("sql", "locking", "calls", "errors", "total", "max", "rows", "lock_wait", "buckets")
+
+    def __init__(self, sql: str, locking: bool = False):
+        self.sql = sql
+        self.locking = locking
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.lock_wait = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def percentile(self, fraction: float) -> float:
+        """Approximate latency percentile in seconds (upper bound of the matching bucket)"""
+        if not self.calls:
+            return 0.0
+        target = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return min(LATENCY_BUCKETS[index], self.max) if index < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+class QueryProfiler:
+    """Thread-safe per-statement statistics and slow-query log"""
+
+    def __init__(self, enabled: bool = DB_PROFILE, slow_ms: float = DB_SLOW_QUERY_MS,
+                 slow_log_path: str = DB_SLOW_QUERY_LOG):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self.slow_log_path = slow_log_path
+        self.started_at = time.time()
+        self._stats = {}
+        # Raw SQL text -> stats, so the hot path skips normalization
+        self._by_sql = {}
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def stats_for(self, sql: str) -> StatementStats:
+        """Stats entry for a statement, created on first use"""
+        stats = self._by_sql.get(sql)
+        if stats is None:
+            key = normalize_sql(sql)
+            with self._lock:
+                stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = StatementStats(key, bool(_LOCKING.match(sql)))
+                self._by_sql[sql] = stats
+        return stats
+
+    def record(self, sql: str, elapsed: float, rows: int = 0, failed: bool = False) -> StatementStats:
+        """Add one statement execution; returns its stats entry for later fetches"""
+        stats = self.stats_for(sql)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+        with self._lock:
+            stats.calls += 1
+            stats.total += elapsed
+            stats.rows += rows
+            stats.buckets[bucket] += 1
+            if elapsed > stats.max:
+                stats.max = elapsed
+            if stats.locking:
+                stats.lock_wait += elapsed
+            if failed:
+                stats.errors += 1
+        if elapsed >= self.slow_seconds:
+            self._log_slow(stats.sql, elapsed, failed)
+        return stats
+
+    def add_fetch(self, stats: StatementStats, rows: int, elapsed: float, spent_before: float = 0.0):
+        """Attribute rows fetched (and the time spent fetching) to an executed statement
+
+        spent_before is the time already spent on this execution, so a
+        statement that only becomes slow while fetching still reaches the
+        slow log.
+        """
+        with self._lock:
+            stats.rows += rows
+            stats.total += elapsed
+        if spent_before < self.slow_seconds <= spent_before + elapsed:
+            self._log_slow(stats.sql, spent_before + elapsed, False)
+
+    def record_wait(self, key: str, elapsed: float):
+        """Record time spent waiting for a lock outside SQLite (e.g. the connection pool)"""
+        stats = self.stats_for(key)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+        with self._lock:
+            stats.calls += 1
+            stats.total += elapsed
+            stats.lock_wait += elapsed
+            stats.buckets[bucket] += 1
+            stats.max = max(stats.max, elapsed)
+
+    def _log_slow(self, key: str, elapsed: float, failed: bool):
+        entry = {"ts": time.time(), "sql": key, "ms": round(elapsed * 1000, 2), "failed": failed,
+                 "thread": threading.current_thread().name}
+        self._slow.append(entry)
+        if self.slow_log_path:
+            try:
+                with open(self.slow_log_path, "a", encoding="utf-8") as log_file:
+                    log_file.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                print(f"Warning: Could not write slow query log: {e}")
+
+    def top_statements(self, limit: int = 20, order_by: str = "total"):
+        """Per-statement summaries, largest first by total, p95, calls or lock_wait"""
+        with self._lock:
+            rows = [{
+                "sql": s.sql,
+                "calls": s.calls,
+                "errors": s.errors,
+                "total_ms": s.total * 1000,
+                "avg_ms": s.total * 1000 / s.calls if s.calls else 0.0,
+                "p50_ms": s.percentile(0.50) * 1000,
+                "p95_ms": s.percentile(0.95) * 1000,
+                "p99_ms": s.percentile(0.99) * 1000,
+                "max_ms": s.max * 1000,
+                "rows": s.rows,
+                "lock_wait_ms": s.lock_wait * 1000,
+            } for s in self._stats.values() if s.calls]
+        sort_key = {"total": "total_ms", "p95": "p95_ms", "calls": "calls", "lock_wait": "lock_wait_ms"}[order_by]
+        rows.sort(key=lambda row: row[sort_key], reverse=True)
+        return rows[:limit]
+
+    def slow_queries(self, limit: int = 50):
+        """Most recent slow statements, newest first"""
+        return list(self._slow)[-limit:][::-1]
+
+    def reset(self):
+        """Clear all statistics and the in-memory slow log"""
+        with self._lock:
+            for stats in self._stats.values():
+                stats.__init__(stats.sql, stats.locking)
+            self._slow.clear()
+            self.started_at = time.time()
+
+profiler = QueryProfiler()
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that reports execute and fetch timings to the profiler"""
+
+    _profile_stats = None
+    _profile_elapsed = 0.0
+
+    def execute(self, sql, parameters=()):
+        if not profiler.enabled:
+            return super().execute(sql, parameters)
+        start = perf_counter()
+        try:
+            result = super().execute(sql, parameters)
+        except Exception:
+            self._profile_stats = profiler.record(sql, perf_counter() - start, 0, True)
+            raise
+        self._profile_elapsed = elapsed = perf_counter() - start
+        self._profile_stats = profiler.record(sql, elapsed, self.rowcount if self.rowcount > 0 else 0)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        if not profiler.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        start = perf_counter()
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+        except Exception:
+            self._profile_stats = profiler.record(sql, perf_counter() - start, 0, True)
+            raise
+        self._profile_elapsed = elapsed = perf_counter() - start
+        self._profile_stats = profiler.record(sql, elapsed, self.rowcount if self.rowcount > 0 else 0)
+        return result
+
+    def fetchone(self):
+        if self._profile_stats is None or not profiler.enabled:
+            return super().fetchone()
+        start = perf_counter()
+        row = super().fetchone()
+        elapsed = perf_counter() - start
+        profiler.add_fetch(self._profile_stats, 0 if row is None else 1, elapsed, self._profile_elapsed)
+        self._profile_elapsed += elapsed
+        return row
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        if self._profile_stats is None or not profiler.enabled:
+            return super().fetchmany(size)
+        start = perf_counter()
+        rows = super().fetchmany(size)
+        elapsed = perf_counter() - start
+        profiler.add_fetch(self._profile_stats, len(rows), elapsed, self._profile_elapsed)
+        self._profile_elapsed += elapsed
+        return rows
+
+    def fetchall(self):
+        if self._profile_stats is None or not profiler.enabled:
+            return super().fetchall()
+        start = perf_counter()
+        rows = super().fetchall()
+        elapsed = perf_counter() - start
+        profiler.add_fetch(self._profile_stats, len(rows), elapsed, self._profile_elapsed)
+        self._profile_elapsed += elapsed
+        return rows
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute shortcuts) and commits are profiled"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute opens its cursor internally, bypassing cursor(); route it through one
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not profiler.enabled or not self.in_transaction:
+            return super().commit()
+        start = perf_counter()
+        try:
+            return super().commit()
+        finally:
+            profiler.record("COMMIT", perf_counter() - start)
@@ -0,0 +1,167 @@
+from utils.archive import INVOICE_COLUMNS
+from utils.pg_schema import INVOICE_SEARCH_VECTOR, PRODUCT_SEARCH_VECTOR
+
+# SQL of the hot read paths. The code that runs these statements and the
+# query plan check (HOT_QUERIES in utils/migrations.py) share the constants
+# below, so the check explains exactly what production runs. Statements
+# reading sales name their tables {invoices} / {invoice_items}: the live
+# tables, or the union views over the attached archives.
+
+INVOICE_ITEMS_SQL = """
+    SELECT product_name, weight_kg, price_per_kg, total_price
+    FROM {invoice_items}
+    WHERE invoice_id = ?
+    ORDER BY id
+"""
+
+# Keyset pagination on (created_ts, id), newest first
+INVOICES_PAGE_SQL = """
+    SELECT * FROM {invoices}
+    WHERE created_ts >= ? AND created_ts < ?
+      AND (created_ts, id) < (?, ?)
+    ORDER BY created_ts DESC, id DESC
+    LIMIT ?
+"""
+
+LOW_STOCK_SQL = """
+    SELECT * FROM products
+    WHERE stock_kg < ?
+    ORDER BY stock_kg ASC
+"""
+
+SALES_OVERVIEW_SEED_SQL = """
+    SELECT COUNT(*), COALESCE(SUM(total_amount), 0), (SELECT COALESCE(MAX(id), 0) FROM invoices)
+    FROM invoices
+    WHERE business_day = ?
+"""
+
+SALES_OVERVIEW_RECENT_SQL = """
+    SELECT id, created_ts, total_amount
+    FROM invoices
+    WHERE created_ts > ?
+"""
+
+HELD_STOCK_SQL = {
+    # The unary + keeps SQLite from walking idx_stock_holds_product in product order (a scan of every
+    # hold, expired or not) and makes it read only the active holds from the covering expiry index
+    "sqlite": """
+        SELECT product_id, SUM(weight_kg) AS weight_kg FROM stock_holds
+        WHERE expires_ts > ?
+        GROUP BY +product_id
+    """,
+    "postgresql": """
+        SELECT product_id, SUM(weight_kg) AS weight_kg FROM stock_holds
+        WHERE expires_ts > ?
+        GROUP BY product_id
+    """,
+}
+
+STOCK_MOVEMENTS_SQL = """
+    SELECT * FROM stock_movements
+    WHERE product_id = ?
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+STOCK_MOVEMENT_SUMMARY_SQL = """
+    SELECT m.product_id, p.name, m.movement_type,
+           COUNT(*) AS movement_count, SUM(m.quantity_kg) AS quantity_kg
+    FROM stock_movements m
+    JOIN products p ON p.id = m.product_id
+    WHERE m.created_ts >= ? AND m.created_ts < ?
+    GROUP BY m.product_id, p.name, m.movement_type
+    ORDER BY p.name, m.movement_type
+"""
+
+# Ranked full-text search: FTS5 tables on SQLite, GIN-indexed tsvector expressions on PostgreSQL
+SEARCH_SQL = {
+    "sqlite": {
+        "products": """
+            SELECT p.* FROM products_fts f
+            JOIN products p ON p.id = f.rowid
+            WHERE products_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        """,
+        "invoices": """
+            SELECT i.* FROM invoices_fts f
+            JOIN invoices i ON i.id = f.rowid
+            WHERE invoices_fts MATCH ?
+              AND i.created_ts >= ? AND i.created_ts < ?
+            ORDER BY f.rank
+            LIMIT ?
+        """,
+    },
+    "postgresql": {
+        "products": f"""
+            SELECT * FROM products, to_tsquery('simple', ?) AS q
+            WHERE {PRODUCT_SEARCH_VECTOR} @@ q
+            ORDER BY ts_rank({PRODUCT_SEARCH_VECTOR}, q) DESC
+            LIMIT ?
+        """,
+        "invoices": f"""
+            SELECT * FROM invoices, to_tsquery('simple', ?) AS q
+            WHERE {INVOICE_SEARCH_VECTOR} @@ q
+              AND created_ts >= ? AND created_ts < ?
+            ORDER BY ts_rank({INVOICE_SEARCH_VECTOR}, q) DESC
+            LIMIT ?
+        """,
+    },
+}
+
+# One branch per database when archived years are searched with the live invoices
+PARTITION_SEARCH_SQL = f"""
+    SELECT {", ".join(f"i.{column.strip()}" for column in INVOICE_COLUMNS.split(","))}, f.rank AS search_rank
+    FROM {{schema}}.invoices_fts f
+    JOIN {{schema}}.invoices i ON i.id = f.rowid
+    WHERE f.invoices_fts MATCH ?
+      AND i.created_ts >= ? AND i.created_ts < ?
+"""
+
+# Report queries over the rollups, for a half-open range of business days
+DAILY_SALES_SQL = """
+    SELECT business_day as sale_date,
+           SUM(invoice_count) as invoice_count,
+           SUM(revenue) as daily_total
+    FROM sales_hourly
+    WHERE business_day >= ? AND business_day < ?
+    GROUP BY business_day
+    ORDER BY business_day
+"""
+
+PERIOD_SALES_SQL = """
+    SELECT SUM(invoice_count) as invoice_count,
+           SUM(revenue) as total_revenue,
+           SUM(revenue) / NULLIF(SUM(invoice_count), 0) as avg_invoice_value
+    FROM sales_hourly
+    WHERE business_day >= ? AND business_day < ?
+"""
+
+TOP_PRODUCTS_SQL = """
+    SELECT MAX(product_name) as product_name,
+           SUM(weight_kg) as total_weight,
+           SUM(line_count) as times_sold,
+           SUM(revenue) as total_revenue
+    FROM sales_by_product
+    WHERE business_day >= ? AND business_day < ?
+    GROUP BY product_id
+    ORDER BY total_weight DESC
+    LIMIT 10
+"""
+
+PAYMENT_SALES_SQL = """
+    SELECT payment_method, SUM(invoice_count) as count, SUM(revenue) as total
+    FROM sales_by_payment
+    WHERE business_day >= ? AND business_day < ?
+    GROUP BY payment_method
+"""
+
+HOURLY_SALES_SQL = """
+    SELECT business_hour as hour,
+           SUM(invoice_count) as invoice_count,
+           SUM(revenue) as hourly_revenue
+    FROM sales_hourly
+    WHERE business_day >= ? AND business_day < ?
+    GROUP BY business_hour
+    ORDER BY hour
+"""
@@ -0,0 +1,225 @@
+import os
+import sqlite3
+import sys
+
+# Sales rollups keyed by business day. Triggers on invoices / invoice_items keep
+# them current in the same transaction as the sale, whichever code path writes it.
+# They only ever add: after deleting or editing raw sales, run rebuild_rollups().
+# Rollups are not archived, so once months move to archive files, rebuilds and
+# checks read the sales_invoices / sales_invoice_items views of
+# utils.archive.attached_partitions instead of the live tables.
+
+ROLLUP_TABLES = ("sales_hourly", "sales_by_payment", "sales_by_product")
+
+ROLLUP_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS sales_hourly (
+        business_day TEXT NOT NULL,
+        business_hour INTEGER NOT NULL,
+        invoice_count INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (business_day, business_hour)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_by_payment (
+        business_day TEXT NOT NULL,
+        payment_method TEXT NOT NULL,
+        invoice_count INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (business_day, payment_method)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_by_product (
+        business_day TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        weight_kg REAL NOT NULL DEFAULT 0,
+        line_count INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (business_day, product_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_invoices_rollup
+    AFTER INSERT ON invoices
+    WHEN NEW.business_day IS NOT NULL
+    BEGIN
+        INSERT INTO sales_hourly (business_day, business_hour, invoice_count, revenue)
+        VALUES (NEW.business_day, NEW.business_hour, 1, NEW.total_amount)
+        ON CONFLICT (business_day, business_hour) DO UPDATE SET
+            invoice_count = invoice_count + 1,
+            revenue = revenue + excluded.revenue;
+        INSERT INTO sales_by_payment (business_day, payment_method, invoice_count, revenue)
+        VALUES (NEW.business_day, NEW.payment_method, 1, NEW.total_amount)
+        ON CONFLICT (business_day, payment_method) DO UPDATE SET
+            invoice_count = invoice_count + 1,
+            revenue = revenue + excluded.revenue;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_invoice_items_rollup
+    AFTER INSERT ON invoice_items
+    BEGIN
+        INSERT INTO sales_by_product (business_day, product_id, product_name, weight_kg, line_count, revenue)
+        SELECT i.business_day, COALESCE(NEW.product_id, 0), NEW.product_name, NEW.weight_kg, 1, NEW.total_price
+        FROM invoices i
+        WHERE i.id = NEW.invoice_id AND i.business_day IS NOT NULL
+        ON CONFLICT (business_day, product_id) DO UPDATE SET
+            product_name = excluded.product_name,
+            weight_kg = weight_kg + excluded.weight_kg,
+            line_count = line_count + 1,
+            revenue = revenue + excluded.revenue;
+    END
+    """,
+)
+
+# Raw aggregates used for rebuilds and consistency checks: table -> (key columns, SELECT)
+# The SELECTs name their sources {invoices} and {invoice_items}; see SALES_TABLES
+RAW_AGGREGATES = {
+    "sales_hourly": (
+        ("business_day", "business_hour"),
+        """
+        SELECT business_day, business_hour, COUNT(*) AS invoice_count, SUM(total_amount) AS revenue
+        FROM {invoices}
+        WHERE business_day >= ? AND business_day < ?
+        GROUP BY business_day, business_hour
+        """
+    ),
+    "sales_by_payment": (
+        ("business_day", "payment_method"),
+        """
+        SELECT business_day, payment_method, COUNT(*) AS invoice_count, SUM(total_amount) AS revenue
+        FROM {invoices}
+        WHERE business_day >= ? AND business_day < ?
+        GROUP BY business_day, payment_method
+        """
+    ),
+    "sales_by_product": (
+        ("business_day", "product_id"),
+        """
+        SELECT i.business_day, COALESCE(ii.product_id, 0) AS product_id, MAX(ii.product_name) AS product_name,
+               SUM(ii.weight_kg) AS weight_kg, COUNT(*) AS line_count, SUM(ii.total_price) AS revenue
+        FROM {invoices} i
+        JOIN {invoice_items} ii ON ii.invoice_id = i.id
+        WHERE i.business_day >= ? AND i.business_day < ?
+        GROUP BY i.business_day, COALESCE(ii.product_id, 0)
+        """
+    ),
+}
+
+# Open-ended bounds for "all days"
+ALL_DAYS = ("0000-00-00", "9999-99-99")
+# Raw sales read by rebuilds and checks: the live tables, or the archive union views
+SALES_TABLES = ("invoices", "invoice_items")
+
+def _raw_aggregate(select_sql: str, sales_tables) -> str:
+    invoices, invoice_items = sales_tables
+    return select_sql.format(invoices=invoices, invoice_items=invoice_items)
+
+def create_rollup_schema(conn):
+    """Create rollup tables and their maintenance triggers"""
+    for statement in ROLLUP_SCHEMA:
+        conn.execute(statement)
+
+def rebuild_rollups(conn, start_day: str = None, end_day: str = None, sales_tables=SALES_TABLES):
+    """Recompute rollups from raw sales for business days in [start_day, end_day)
+
+    Pass the archive union views as sales_tables once months are archived,
+    or the archived days are rebuilt as empty. Runs on the caller's
+    transaction; the caller commits.
+    """
+    bounds = (start_day or ALL_DAYS[0], end_day or ALL_DAYS[1])
+    for table, (_, select_sql) in RAW_AGGREGATES.items():
+        conn.execute(f"DELETE FROM {table} WHERE business_day >= ? AND business_day < ?", bounds)
+        conn.execute(f"INSERT INTO {table} {_raw_aggregate(select_sql, sales_tables)}", bounds)
+
+def add_to_rollups(conn, first_invoice_id: int, last_invoice_id: int):
+    """Fold invoices with ids in [first, last] and their items into the rollups
+
+    Set-based equivalent of the per-row triggers, for bulk loads that suspend
+    them. Runs on the caller's transaction.
+    """
+    bounds = (first_invoice_id, last_invoice_id)
+    conn.execute("""
+        INSERT INTO sales_hourly (business_day, business_hour, invoice_count, revenue)
+        SELECT business_day, business_hour, COUNT(*), SUM(total_amount)
+        FROM invoices
+        WHERE id BETWEEN ? AND ? AND business_day IS NOT NULL
+        GROUP BY business_day, business_hour
+        ON CONFLICT (business_day, business_hour) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            revenue = revenue + excluded.revenue
+    """, bounds)
+    conn.execute("""
+        INSERT INTO sales_by_payment (business_day, payment_method, invoice_count, revenue)
+        SELECT business_day, payment_method, COUNT(*), SUM(total_amount)
+        FROM invoices
+        WHERE id BETWEEN ? AND ? AND business_day IS NOT NULL
+        GROUP BY business_day, payment_method
+        ON CONFLICT (business_day, payment_method) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            revenue = revenue + excluded.revenue
+    """, bounds)
+    conn.execute("""
+        INSERT INTO sales_by_product (business_day, product_id, product_name, weight_kg, line_count, revenue)
+        SELECT i.business_day, COALESCE(ii.product_id, 0), MAX(ii.product_name),
+               SUM(ii.weight_kg), COUNT(*), SUM(ii.total_price)
+        FROM invoices i
+        JOIN invoice_items ii ON ii.invoice_id = i.id
+        WHERE i.id BETWEEN ? AND ? AND i.business_day IS NOT NULL
+        GROUP BY i.business_day, COALESCE(ii.product_id, 0)
+        ON CONFLICT (business_day, product_id) DO UPDATE SET
+            product_name = excluded.product_name,
+            weight_kg = weight_kg + excluded.weight_kg,
+            line_count = line_count + excluded.line_count,
+            revenue = revenue + excluded.revenue
+    """, bounds)
+
+def check_rollups(conn, start_day: str = None, end_day: str = None, tolerance: float = 0.005,
+                  sales_tables=SALES_TABLES):
+    """Compare rollups with raw aggregates and return a list of mismatch descriptions"""
+    bounds = (start_day or ALL_DAYS[0], end_day or ALL_DAYS[1])
+    mismatches = []
+    for table, (key_columns, select_sql) in RAW_AGGREGATES.items():
+        raw_rows = conn.execute(_raw_aggregate(select_sql, sales_tables), bounds).fetchall()
+        rollup_rows = conn.execute(
+            f"SELECT * FROM {table} WHERE business_day >= ? AND business_day < ?", bounds
+        ).fetchall()
+        raw = {tuple(row[:len(key_columns)]): row for row in raw_rows}
+        rolled = {tuple(row[:len(key_columns)]): row for row in rollup_rows}
+        for key in sorted(set(raw) | set(rolled), key=str):
+            raw_row, rolled_row = raw.get(key), rolled.get(key)
+            if raw_row is None or rolled_row is None:
+                mismatches.append(f"{table} {key}: raw={raw_row and tuple(raw_row)} rollup={rolled_row and tuple(rolled_row)}")
+                continue
+            for raw_value, rolled_value in zip(raw_row[len(key_columns):], rolled_row[len(key_columns):]):
+                if isinstance(raw_value, str):
+                    continue
+                if abs((raw_value or 0) - (rolled_value or 0)) > tolerance:
+                    mismatches.append(f"{table} {key}: raw={tuple(raw_row)} rollup={tuple(rolled_row)}")
+                    break
+    return mismatches
+
+if __name__ == "__main__":
+    # Usage: python -m utils.rollups check|rebuild [db_path]
+    from utils.archive import INVOICES_VIEW, INVOICE_ITEMS_VIEW, attached_partitions
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.getenv("LOCAL_DB_PATH", "meat_shop.db")
+    archive_dir = os.getenv("ARCHIVE_DIR", f"{os.path.splitext(db_path)[0]}_archive")
+    conn = sqlite3.connect(db_path)
+    try:
+        # Archived days still have rollups; read their sales from the archive files
+        with attached_partitions(conn, archive_dir=archive_dir) as conn:
+            if command == "rebuild":
+                with conn:
+                    rebuild_rollups(conn, sales_tables=(INVOICES_VIEW, INVOICE_ITEMS_VIEW))
+                print("Rollups rebuilt.")
+            mismatches = check_rollups(conn, sales_tables=(INVOICES_VIEW, INVOICE_ITEMS_VIEW))
+        for mismatch in mismatches:
+            print(mismatch)
+        print(f"{len(mismatches)} mismatch(es).")
+        sys.exit(1 if mismatches else 0)
+    finally:
+        conn.close()
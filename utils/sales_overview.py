@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from typing import NamedTuple
+from utils.timeutils import business_time
+
+# In-process running totals for the sidebar's "Today's Overview". The
+# accumulator is seeded from the database once per business day, every
+# checkout committed by this process adds its invoice, and it is re-seeded
+# every SALES_OVERVIEW_RECONCILE seconds to pick up sales it did not see
+# (other app processes, synced tills, imports). Reruns read it without a
+# query. Invoice ids de-duplicate sales that are both recorded and seeded.
+
+SALES_OVERVIEW_RECONCILE = float(os.getenv("SALES_OVERVIEW_RECONCILE", "60"))
+# Window of the "last hour" figure
+RECENT_WINDOW = 3600
+
+class SalesOverview(NamedTuple):
+    """Sales totals at one moment"""
+    business_day: str
+    invoice_count: int
+    revenue: float
+    last_hour_count: int
+    last_hour_revenue: float
+
+class SalesAccumulator:
+    """Running invoice count and revenue for the current business day, plus the last hour's sales"""
+
+    def __init__(self, reconcile_interval: float = SALES_OVERVIEW_RECONCILE):
+        self.reconcile_interval = reconcile_interval
+        self._business_day = None
+        self._count = 0
+        self._revenue = 0.0
+        self._max_id = 0
+        # (invoice_id, created_ts, amount) of the last hour's sales
+        self._recent = []
+        self._seeded_at = None
+        self._lock = threading.Lock()
+
+    def needs_seed(self, business_day: str) -> bool:
+        """True on a new business day, when the last seed is due for reconciling, or after invalidate()"""
+        with self._lock:
+            return (self._seeded_at is None or self._business_day != business_day
+                    or time.monotonic() - self._seeded_at >= self.reconcile_interval)
+
+    def seed(self, business_day: str, count: int, revenue: float, max_id: int, recent):
+        """Replace the totals with ones read from the database
+
+        count, revenue and recent cover invoices up to max_id. Sales recorded
+        while the query ran are kept when their id is above max_id.
+        """
+        with self._lock:
+            later = [sale for sale in self._recent if sale[0] > max_id]
+            self._business_day = business_day
+            self._count = count
+            self._revenue = revenue
+            self._max_id = max_id
+            self._recent = list(recent)
+            for sale in later:
+                self._add(sale)
+            self._seeded_at = time.monotonic()
+
+    def record(self, sales):
+        """Add committed sales, given as (invoice_id, created_ts, amount)"""
+        with self._lock:
+            for sale in sales:
+                if sale[0] > self._max_id:
+                    self._add(sale)
+
+    def _add(self, sale):
+        invoice_id, created_ts, amount = sale
+        if business_time(created_ts)[0] == self._business_day:
+            self._count += 1
+            self._revenue += amount
+        self._recent.append(sale)
+
+    def invalidate(self):
+        """Drop the totals so the next read re-seeds (e.g. after sales were imported, synced or deleted)"""
+        with self._lock:
+            self._business_day = None
+            self._count = 0
+            self._revenue = 0.0
+            self._max_id = 0
+            self._recent = []
+            self._seeded_at = None
+
+    def snapshot(self, now: int) -> SalesOverview:
+        with self._lock:
+            # Replayed sales can be recorded out of order, so filter the whole window
+            self._recent = [sale for sale in self._recent if sale[1] > now - RECENT_WINDOW]
+            recent = [sale for sale in self._recent if sale[1] <= now]
+            return SalesOverview(self._business_day, self._count, self._revenue,
+                                 len(recent), sum(sale[2] for sale in recent))
+
+sales_accumulator = SalesAccumulator()
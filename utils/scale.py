@@ -0,0 +1,199 @@
+import os
+import re
+import threading
+import time
+from typing import NamedTuple, Optional
+
+# Weighing scale on a serial (or USB-serial) port. A background thread reads
+# the scale's continuous output in the widespread "ST,GS,+0001.250kg" line
+# format:
+#
+#   ST / US / OL   stable, unstable (in motion) or overload
+#   GS / NT        gross, or net with a tare applied
+#
+# and keeps the latest reading. Each time the weight settles on a new value
+# the reader counts a weighing, which the sale screen copies into its weight
+# field once. Scales in polled mode get SCALE_POLL_COMMAND sent before each
+# read. The port is opened with termios, so any tty works, including the
+# slave side of a pseudo-terminal simulating a scale in tests. The POSIX
+# modules are imported only when a scale is configured; on other platforms
+# the reader reports the port as unavailable.
+
+SCALE_PORT = os.getenv("SCALE_PORT", "")
+SCALE_BAUD = int(os.getenv("SCALE_BAUD", "9600"))
+# Sent before each read for scales that only answer requests (e.g. "W\r"); empty for continuous output
+SCALE_POLL_COMMAND = os.getenv("SCALE_POLL_COMMAND", "").encode().decode("unicode_escape").encode()
+SCALE_POLL_INTERVAL = float(os.getenv("SCALE_POLL_INTERVAL", "0.3"))
+# Readings older than this are treated as "scale not responding"
+SCALE_STALE_AFTER = float(os.getenv("SCALE_STALE_AFTER", "2.0"))
+SCALE_RECONNECT_DELAY = float(os.getenv("SCALE_RECONNECT_DELAY", "2.0"))
+
+UNIT_TO_KG = {"kg": 1.0, "g": 0.001, "lb": 0.45359237}
+
+_SCALE_LINE = re.compile(
+    r"^(?P<status>ST|US|OL)\s*,\s*(?:(?P<mode>GS|NT)\s*,\s*)?(?P<value>[+-]?\s*\d+(?:\.\d+)?)?\s*(?P<unit>kg|g|lb)?$",
+    re.IGNORECASE
+)
+
+class ScaleReading(NamedTuple):
+    """One reading from the scale"""
+    weight_kg: float
+    stable: bool
+    net: bool
+    overload: bool
+    ts: float
+
+class ScaleState(NamedTuple):
+    """What the sale screen shows: the latest reading and the count of settled weighings"""
+    connected: bool
+    reading: Optional[ScaleReading]
+    weighing: int
+    weighed_kg: float
+    error: Optional[str]
+
+    @property
+    def fresh(self) -> bool:
+        return self.reading is not None and time.time() - self.reading.ts <= SCALE_STALE_AFTER
+
+    def settled_weight(self) -> Optional[float]:
+        """Weight of the last weighing while it is still on the platform; None when empty, moving or stale"""
+        if not self.fresh or not self.reading.stable or self.reading.weight_kg != self.weighed_kg:
+            return None
+        return self.weighed_kg if self.weighed_kg > 0 else None
+
+def parse_scale_line(line: str, ts: float = None) -> Optional[ScaleReading]:
+    """Parse one line of scale output; None for lines that are not readings"""
+    match = _SCALE_LINE.match(line.strip())
+    if not match:
+        return None
+    status = match["status"].upper()
+    if status != "OL" and match["value"] is None:
+        return None
+    weight = float(match["value"].replace(" ", "")) if match["value"] else 0.0
+    weight *= UNIT_TO_KG[(match["unit"] or "kg").lower()]
+    return ScaleReading(round(weight, 3), status == "ST", (match["mode"] or "").upper() == "NT", status == "OL",
+                        time.time() if ts is None else ts)
+
+def open_serial(port: str, baud: int = SCALE_BAUD) -> int:
+    """Open a tty as a raw 8N1 serial line at baud; returns the file descriptor"""
+    import termios
+    import tty
+    fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        tty.setraw(fd)
+        attrs = termios.tcgetattr(fd)
+        speed = getattr(termios, f"B{baud}")
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except Exception as e:
+        os.close(fd)
+        raise e
+    return fd
+
+class ScaleReader:
+    """Background thread keeping the latest reading of one serial scale
+
+    The port is reopened after errors, so unplugging the scale or powering it
+    off only shows as "not responding" until it is back.
+    """
+
+    def __init__(self, port: str, baud: int = SCALE_BAUD, poll_command: bytes = SCALE_POLL_COMMAND):
+        self.port = port
+        self.baud = baud
+        self.poll_command = poll_command
+        self._connected = False
+        self._reading = None
+        self._weighing = 0
+        self._weighed_kg = 0.0
+        self._error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the reader thread if it is not already running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="scale-reader", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the reader thread and close the port"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def state(self) -> ScaleState:
+        with self._lock:
+            return ScaleState(self._connected, self._reading, self._weighing, self._weighed_kg, self._error)
+
+    def _publish(self, reading: ScaleReading):
+        with self._lock:
+            previous = self._reading
+            # A weighing is a stable weight after motion, or a stable weight different from the last one
+            settled = reading.stable and not reading.overload and (
+                previous is None or not previous.stable or previous.weight_kg != reading.weight_kg
+            )
+            if settled:
+                self._weighing += 1
+                self._weighed_kg = reading.weight_kg
+            self._reading = reading
+
+    def _set_status(self, connected: bool, error: Optional[str] = None):
+        with self._lock:
+            self._connected = connected
+            self._error = error
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                fd = open_serial(self.port, self.baud)
+            except Exception as e:
+                # Also termios errors, an unknown baud rate and platforms without termios
+                self._set_status(False, f"Cannot open {self.port}: {e}")
+                self._stop.wait(SCALE_RECONNECT_DELAY)
+                continue
+            self._set_status(True)
+            try:
+                self._read_lines(fd)
+            except OSError as e:
+                self._set_status(False, f"Lost {self.port}: {e}")
+            finally:
+                os.close(fd)
+            self._stop.wait(SCALE_RECONNECT_DELAY)
+        self._set_status(False)
+
+    def _read_lines(self, fd: int):
+        import select
+        buffer = b""
+        while not self._stop.is_set():
+            if self.poll_command:
+                os.write(fd, self.poll_command)
+            ready, _, _ = select.select([fd], [], [], SCALE_POLL_INTERVAL)
+            if not ready:
+                continue
+            data = os.read(fd, 1024)
+            if not data:
+                raise OSError("port closed")
+            buffer += data
+            *lines, buffer = re.split(rb"\r\n|\r|\n", buffer)
+            for line in lines:
+                reading = parse_scale_line(line.decode("ascii", "ignore"))
+                if reading is not None:
+                    self._publish(reading)
+
+_reader = None
+_reader_lock = threading.Lock()
+
+def get_scale() -> Optional[ScaleReader]:
+    """The till's scale reader, started on first use; None when no SCALE_PORT is configured"""
+    global _reader
+    if not SCALE_PORT:
+        return None
+    with _reader_lock:
+        if _reader is None:
+            _reader = ScaleReader(SCALE_PORT)
+        _reader.start()
+        return _reader
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from utils.database import DB_PATH, ConnectionPool, db_connection, db_dialect
+
+# Reports read from a periodically refreshed copy of the live database so that
+# heavy aggregates never hold up checkouts on the file the cashiers write to.
+# PostgreSQL readers never block writers, so there reports read the live data.
+REPORT_SNAPSHOT_PATH = os.getenv("REPORT_SNAPSHOT_PATH", f"{os.path.splitext(DB_PATH)[0]}_report.db")
+REPORT_SNAPSHOT_MAX_AGE = int(os.getenv("REPORT_SNAPSHOT_MAX_AGE", "300"))
+
+class ReportSnapshot:
+    """Read-only copy of the live database, refreshed with the SQLite online backup API"""
+
+    def __init__(self, path: str = REPORT_SNAPSHOT_PATH, max_age: int = REPORT_SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def refreshed_at(self):
+        """Epoch seconds of the last refresh, or None if there is no snapshot yet"""
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def is_stale(self) -> bool:
+        """Check whether the snapshot is missing or older than max_age"""
+        refreshed_at = self.refreshed_at()
+        return refreshed_at is None or time.time() - refreshed_at > self.max_age
+
+    def refresh(self):
+        """Copy the live database into a new snapshot file and switch readers to it"""
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        tmp_path = f"{self.path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            # A single-step backup is one WAL read transaction: writers are never blocked
+            with db_connection() as source:
+                source.backup(target)
+            # Plain rollback journal so the file can be swapped without stray -wal/-shm files
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+        os.replace(tmp_path, self.path)
+        # Connections already open keep reading the old file, so start a fresh pool
+        old_pool, self._pool = self._pool, ConnectionPool(self.path, read_only=True)
+        if old_pool is not None:
+            old_pool.close_all()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a read-only snapshot connection, refreshing the snapshot first if stale"""
+        with self._lock:
+            if self.is_stale():
+                self._refresh_locked()
+            elif self._pool is None:
+                self._pool = ConnectionPool(self.path, read_only=True)
+            pool = self._pool
+        with pool.connection() as conn:
+            yield conn
+
+report_snapshot = ReportSnapshot()
+
+def snapshot_connection():
+    """Borrow a connection to the reporting snapshot (use as a with-block)"""
+    if db_dialect.name != "sqlite":
+        return db_connection()
+    return report_snapshot.connection()
+
+def refresh_snapshot():
+    """Refresh the reporting snapshot on demand"""
+    if db_dialect.name == "sqlite":
+        report_snapshot.refresh()
+
+def snapshot_refreshed_at():
+    """Epoch seconds of the last snapshot refresh, or None"""
+    if db_dialect.name != "sqlite":
+        return time.time()
+    return report_snapshot.refreshed_at()
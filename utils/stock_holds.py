@@ -0,0 +1,71 @@
+import os
+
+# Short-lived stock holds for open carts. Adding an item to a cart holds its
+# weight, so every till sees stock minus active holds as available to sell and
+# two cashiers cannot both take the last few kilograms: the second one is told
+# at add-to-cart time rather than at checkout. Holds expire after
+# STOCK_HOLD_TTL seconds without activity on their cart (an abandoned session
+# gives its stock back) and checkout replaces a cart's holds with the sale in
+# the same transaction. Holds are local to one database and are not synced.
+
+STOCK_HOLD_TTL = int(os.getenv("STOCK_HOLD_TTL", "900"))
+
+HOLDS_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS stock_holds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cart_id TEXT NOT NULL,
+        product_id INTEGER NOT NULL REFERENCES products(id),
+        weight_kg REAL NOT NULL CHECK (weight_kg > 0),
+        expires_ts INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_stock_holds_product ON stock_holds (product_id, expires_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_stock_holds_cart ON stock_holds (cart_id)",
+    "CREATE INDEX IF NOT EXISTS idx_stock_holds_expires ON stock_holds (expires_ts)",
+)
+
+def create_holds_schema(conn):
+    """Create the stock holds table"""
+    for statement in HOLDS_SCHEMA:
+        conn.execute(statement)
+
+def purge_expired_holds(cursor, now: int):
+    """Delete holds that expired at or before now"""
+    cursor.execute("DELETE FROM stock_holds WHERE expires_ts <= ?", (now,))
+
+def place_hold(cursor, cart_id: str, product_id: int, weight_kg: float, now: int):
+    """Hold weight_kg for a cart if that much is available after active holds
+
+    The availability check and the insert are one statement; the caller
+    holds the write lock (or the product row lock). Returns the hold id, or
+    None when there is not enough stock. Raises ValueError for a weight that
+    is not positive.
+    """
+    if not weight_kg or weight_kg <= 0:
+        raise ValueError(f"Cannot hold {weight_kg} kg; the weight must be greater than 0")
+    cursor.execute("""
+        INSERT INTO stock_holds (cart_id, product_id, weight_kg, expires_ts)
+        SELECT ?, p.id, ?, ? FROM products p
+        WHERE p.id = ? AND p.stock_kg - COALESCE((
+            SELECT SUM(h.weight_kg) FROM stock_holds h WHERE h.product_id = p.id AND h.expires_ts > ?
+        ), 0) >= ?
+        RETURNING id
+    """, (cart_id, weight_kg, now + STOCK_HOLD_TTL, product_id, now, weight_kg))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def extend_holds(cursor, cart_id: str, now: int):
+    """Restart the expiry of every hold in a cart (the cashier is still working on it)"""
+    cursor.execute("UPDATE stock_holds SET expires_ts = ? WHERE cart_id = ?", (now + STOCK_HOLD_TTL, cart_id))
+
+def available_stock(cursor, product_id: int, now: int) -> float:
+    """Stock of one product minus its active holds (0 if the product does not exist)"""
+    cursor.execute("""
+        SELECT p.stock_kg - COALESCE((
+            SELECT SUM(h.weight_kg) FROM stock_holds h WHERE h.product_id = p.id AND h.expires_ts > ?
+        ), 0)
+        FROM products p WHERE p.id = ?
+    """, (now, product_id))
+    row = cursor.fetchone()
+    return row[0] if row else 0.0
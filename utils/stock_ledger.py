@@ -0,0 +1,153 @@
+import os
+
+# Append-only stock ledger. Every change to products.stock_kg writes a movement in
+# the same transaction, so stock_kg is a materialized balance of the ledger.
+# Periodic checkpoints snapshot every balance so "stock as of X" only has to sum
+# the movements recorded after the nearest earlier checkpoint.
+#
+# Openings and count adjustments also store the counted level (count_kg). When
+# movements from other tills are merged in, a product's stock is the latest
+# count plus every other movement recorded after it, so all databases holding
+# the same movements agree whatever order they arrived in.
+
+MOVEMENT_TYPES = ("opening", "sale", "receipt", "adjustment", "waste")
+# Movement types whose stock-setting form records an absolute count
+COUNT_MOVEMENT_TYPES = ("opening", "adjustment")
+STOCK_CHECKPOINT_INTERVAL = int(os.getenv("STOCK_CHECKPOINT_INTERVAL", str(24 * 3600)))
+
+LEDGER_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS stock_movements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL REFERENCES products(id),
+        movement_type TEXT NOT NULL
+            CHECK (movement_type IN ('opening', 'sale', 'receipt', 'adjustment', 'waste')),
+        quantity_kg REAL NOT NULL,
+        reason TEXT,
+        username TEXT,
+        invoice_id INTEGER REFERENCES invoices(id),
+        created_ts INTEGER NOT NULL
+    )
+    """,
+    # (product_id, rowid) ordering serves "movements after checkpoint" lookups
+    "CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements (product_id)",
+    """
+    CREATE INDEX IF NOT EXISTS idx_stock_movements_created
+    ON stock_movements (created_ts, product_id, movement_type, quantity_kg)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_checkpoints (
+        checkpoint_ts INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        balance_kg REAL NOT NULL,
+        last_movement_id INTEGER NOT NULL,
+        PRIMARY KEY (checkpoint_ts, product_id)
+    ) WITHOUT ROWID
+    """,
+)
+
+def create_ledger_schema(conn):
+    """Create the ledger and checkpoint tables"""
+    for statement in LEDGER_SCHEMA:
+        conn.execute(statement)
+
+def record_movements(cursor, movements):
+    """Append movements inside the caller's transaction
+
+    Each movement is a tuple of
+    (product_id, movement_type, quantity_kg, reason, username, invoice_id, created_ts)
+    where quantity_kg is signed (negative for sales and waste). An opening
+    is also the product's first count.
+    """
+    cursor.executemany("""
+        INSERT INTO stock_movements (product_id, movement_type, quantity_kg, reason, username, invoice_id, created_ts,
+                                     count_kg)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(*movement, movement[2] if movement[1] == 'opening' else None) for movement in movements])
+
+def record_stock_sets(cursor, changes):
+    """Append the movements for overwriting stock levels, before the products are updated
+
+    Each change is a tuple of
+    (product_id, new_stock_kg, movement_type, reason, username, created_ts);
+    the movement is the difference from the current stock, and none is
+    written when the level does not change. Count types also keep the new
+    level as a count.
+    """
+    cursor.executemany("""
+        INSERT INTO stock_movements (product_id, movement_type, quantity_kg, reason, username, created_ts, count_kg)
+        SELECT id, ?, ? - stock_kg, ?, ?, ?, ? FROM products WHERE id = ? AND stock_kg != ?
+    """, [(movement_type, new_stock, reason, username, created_ts,
+           new_stock if movement_type in COUNT_MOVEMENT_TYPES else None, product_id, new_stock)
+          for product_id, new_stock, movement_type, reason, username, created_ts in changes])
+
+def create_stock_checkpoint(cursor, checkpoint_ts: int):
+    """Snapshot every product balance at checkpoint_ts inside the caller's transaction"""
+    cursor.execute("""
+        INSERT INTO stock_checkpoints (checkpoint_ts, product_id, balance_kg, last_movement_id)
+        SELECT ?, p.id, p.stock_kg, (SELECT COALESCE(MAX(id), 0) FROM stock_movements)
+        FROM products p
+        WHERE true  -- keeps SQLite from parsing ON CONFLICT as a join constraint
+        ON CONFLICT (checkpoint_ts, product_id) DO UPDATE SET
+            balance_kg = excluded.balance_kg,
+            last_movement_id = excluded.last_movement_id
+    """, (checkpoint_ts,))
+
+def latest_checkpoint_ts(cursor, as_of_ts: int = None):
+    """Timestamp of the newest checkpoint at or before as_of_ts (or overall), or None"""
+    if as_of_ts is None:
+        cursor.execute("SELECT MAX(checkpoint_ts) FROM stock_checkpoints")
+    else:
+        cursor.execute("SELECT MAX(checkpoint_ts) FROM stock_checkpoints WHERE checkpoint_ts <= ?", (as_of_ts,))
+    return cursor.fetchone()[0]
+
+def stock_as_of(cursor, as_of_ts: int, product_id: int = None):
+    """Balances as of as_of_ts: nearest earlier checkpoint plus the movements since it
+
+    Returns rows of (product_id, name, stock_kg).
+    """
+    checkpoint_ts = latest_checkpoint_ts(cursor, as_of_ts)
+    params = [as_of_ts, checkpoint_ts]
+    product_filter = ""
+    if product_id is not None:
+        product_filter = "WHERE p.id = ?"
+        params.append(product_id)
+    cursor.execute(f"""
+        SELECT p.id AS product_id, p.name,
+               COALESCE(c.balance_kg, 0) + COALESCE((
+                   SELECT SUM(m.quantity_kg) FROM stock_movements m
+                   WHERE m.product_id = p.id
+                     AND m.id > COALESCE(c.last_movement_id, 0)
+                     AND m.created_ts <= ?
+               ), 0) AS stock_kg
+        FROM products p
+        LEFT JOIN stock_checkpoints c ON c.product_id = p.id AND c.checkpoint_ts = ?
+        {product_filter}
+        ORDER BY p.name
+    """, params)
+    return cursor.fetchall()
+
+def recompute_stock(cursor, product_ids):
+    """Set stock_kg from the ledger: the latest count plus the other movements after it
+
+    Counts are ordered by (created_ts, uid) and count as taken at the start
+    of their second, so the result does not depend on the order the
+    movements were inserted in. Only the movements since the latest count
+    are read.
+    """
+    cursor.executemany("""
+        WITH latest_count AS (
+            SELECT created_ts, count_kg FROM stock_movements
+            WHERE product_id = ? AND count_kg IS NOT NULL
+            ORDER BY created_ts DESC, uid DESC
+            LIMIT 1
+        )
+        UPDATE products SET
+            stock_kg = COALESCE((SELECT count_kg FROM latest_count), 0) + COALESCE((
+                SELECT SUM(m.quantity_kg) FROM stock_movements m
+                WHERE m.product_id = products.id AND m.count_kg IS NULL
+                  AND m.created_ts >= COALESCE((SELECT created_ts FROM latest_count), 0)
+            ), 0),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, [(product_id, product_id) for product_id in product_ids])
@@ -0,0 +1,363 @@
+import json
+import os
+import sqlite3
+import sys
+from utils.stock_ledger import recompute_stock
+from utils.timeutils import now_ts
+
+# Offline-first sync between till databases through a shared hub database.
+# Triggers append every new product (or catalog edit), invoice and stock
+# movement to a local change journal whose seq is the terminal's own sequence;
+# rows carry random 128-bit uids that stay the same in every database. A sync
+# pushes the terminal's journal entries after the hub's watermark for it, then
+# pulls the hub's entries that came from anyone else, each batch in one
+# transaction together with its watermark, so an interrupted sync resumes where
+# it stopped and never applies a change twice. Work is proportional to the
+# journal entries since the last sync.
+#
+# Stock conflicts (two tills selling or counting the same product offline) are
+# settled by the ledger rule in recompute_stock: the latest count wins and
+# every other movement after it is added on top.
+
+SYNC_HUB_PATH = os.getenv("SYNC_HUB_PATH", "")
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "500"))
+# Origin recorded for changes pulled from the hub
+HUB_PEER = "HUB"
+
+PRODUCT_FIELDS = ("name", "price_per_kg", "category", "description", "image_path")
+INVOICE_FIELDS = (
+    "uid", "invoice_number", "customer_name", "customer_phone", "total_amount", "payment_method",
+    "created_at", "created_ts", "business_day", "business_hour"
+)
+
+SYNC_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS sync_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        origin TEXT,
+        created_ts INTEGER NOT NULL
+    )
+    """,
+    # peer -> last seq of the peer's journal applied here, and last seq of ours the peer confirmed
+    """
+    CREATE TABLE IF NOT EXISTS sync_watermarks (
+        peer TEXT PRIMARY KEY,
+        applied_seq INTEGER NOT NULL DEFAULT 0,
+        sent_seq INTEGER NOT NULL DEFAULT 0,
+        synced_ts INTEGER
+    ) WITHOUT ROWID
+    """,
+    # Another database's product uid matched to a local product by name
+    """
+    CREATE TABLE IF NOT EXISTS sync_product_aliases (
+        uid TEXT PRIMARY KEY,
+        product_id INTEGER NOT NULL REFERENCES products(id)
+    ) WITHOUT ROWID
+    """,
+)
+
+# table -> journal entity; rows without a uid get one when inserted
+JOURNALED_TABLES = {
+    "products": "product",
+    "invoices": "invoice",
+    "invoice_items": None,
+    "stock_movements": "stock_movement",
+}
+
+def create_sync_schema(conn):
+    """Create the journal tables and the uid / journal triggers"""
+    for statement in SYNC_SCHEMA:
+        conn.execute(statement)
+    for table, entity in JOURNALED_TABLES.items():
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_uid AFTER INSERT ON {table}
+            WHEN NEW.uid IS NULL
+            BEGIN
+                UPDATE {table} SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id;
+            END
+        """)
+        if entity:
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_journal AFTER INSERT ON {table}
+                BEGIN
+                    INSERT INTO sync_journal (entity, row_id, created_ts)
+                    VALUES ('{entity}', NEW.id, CAST(strftime('%s', 'now') AS INTEGER));
+                END
+            """)
+    # Stock levels are synced through the ledger, so only catalog edits are journaled
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_journal_update AFTER UPDATE OF {', '.join(PRODUCT_FIELDS)} ON products
+        BEGIN
+            INSERT INTO sync_journal (entity, row_id, created_ts)
+            VALUES ('product', NEW.id, CAST(strftime('%s', 'now') AS INTEGER));
+        END
+    """)
+
+def _load(conn, sql: str, ids):
+    if not ids:
+        return []
+    return conn.execute(sql, (json.dumps(sorted(ids)),)).fetchall()
+
+def read_changes(conn, after_seq: int, limit: int, local_only: bool = False, exclude_origin: str = None):
+    """Next batch of journal entries after after_seq, as ([(entity, payload)], last scanned seq)
+
+    local_only keeps the changes made in this database; exclude_origin drops
+    those that came from that peer. The scanned seq covers skipped entries
+    too, so the caller's watermark moves past them.
+    """
+    entries = conn.execute(
+        "SELECT seq, entity, row_id, origin FROM sync_journal WHERE seq > ? ORDER BY seq LIMIT ?", (after_seq, limit)
+    ).fetchall()
+    if not entries:
+        return [], after_seq
+    wanted = [entry for entry in entries
+              if (entry['origin'] is None if local_only else entry['origin'] != exclude_origin)]
+
+    ids = {"product": set(), "invoice": set(), "stock_movement": set()}
+    for entry in wanted:
+        ids[entry['entity']].add(entry['row_id'])
+    payloads = {entity: {} for entity in ids}
+
+    for row in _load(conn, f"""
+        SELECT id, uid, {', '.join(PRODUCT_FIELDS)} FROM products
+        WHERE id IN (SELECT value FROM json_each(?))
+    """, ids["product"]):
+        payloads["product"][row['id']] = {key: row[key] for key in ("uid", *PRODUCT_FIELDS)}
+
+    for row in _load(conn, f"""
+        SELECT id, {', '.join(INVOICE_FIELDS)} FROM invoices
+        WHERE id IN (SELECT value FROM json_each(?))
+    """, ids["invoice"]):
+        payloads["invoice"][row['id']] = {**{key: row[key] for key in INVOICE_FIELDS}, "items": []}
+    for row in _load(conn, """
+        SELECT ii.invoice_id, ii.uid, p.uid AS product_uid, ii.product_name, ii.weight_kg, ii.price_per_kg,
+               ii.total_price
+        FROM invoice_items ii
+        LEFT JOIN products p ON p.id = ii.product_id
+        WHERE ii.invoice_id IN (SELECT value FROM json_each(?))
+        ORDER BY ii.id
+    """, ids["invoice"]):
+        payloads["invoice"][row['invoice_id']]["items"].append(dict(row))
+
+    for row in _load(conn, """
+        SELECT m.id, m.uid, p.uid AS product_uid, p.name AS product_name, m.movement_type, m.quantity_kg,
+               m.count_kg, m.reason, m.username, i.uid AS invoice_uid, m.created_ts
+        FROM stock_movements m
+        JOIN products p ON p.id = m.product_id
+        LEFT JOIN invoices i ON i.id = m.invoice_id
+        WHERE m.id IN (SELECT value FROM json_each(?))
+    """, ids["stock_movement"]):
+        payloads["stock_movement"][row['id']] = dict(row)
+
+    # Rows archived since they were journaled are skipped
+    changes = [(entry['entity'], payloads[entry['entity']][entry['row_id']]) for entry in wanted
+               if entry['row_id'] in payloads[entry['entity']]]
+    return changes, entries[-1]['seq']
+
+def _product_id(conn, uid: str, name: str, price_per_kg: float = 0.0) -> int:
+    """Local id for another database's product: by uid, then alias, then name; created if unknown"""
+    if uid is None:
+        return None
+    row = conn.execute("SELECT id FROM products WHERE uid = ?", (uid,)).fetchone()
+    if row is None:
+        row = conn.execute("SELECT product_id FROM sync_product_aliases WHERE uid = ?", (uid,)).fetchone()
+    if row is not None:
+        return row[0]
+    # Tills that existed before syncing each created their own copy of the catalog
+    row = conn.execute("SELECT id FROM products WHERE lower(name) = lower(?) ORDER BY id LIMIT 1", (name,)).fetchone()
+    if row is not None:
+        conn.execute("INSERT INTO sync_product_aliases (uid, product_id) VALUES (?, ?)", (uid, row[0]))
+        return row[0]
+    return conn.execute(
+        "INSERT INTO products (uid, name, price_per_kg, stock_kg) VALUES (?, ?, ?, 0) RETURNING id",
+        (uid, name, price_per_kg)
+    ).fetchone()[0]
+
+def _apply_product(conn, product: dict):
+    product_id = _product_id(conn, product['uid'], product['name'], product['price_per_kg'])
+    # Skip no-op updates so they are not journaled again
+    conn.execute(f"""
+        UPDATE products SET {', '.join(f'{field} = ?' for field in PRODUCT_FIELDS)}, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND ({' OR '.join(f'{field} IS NOT ?' for field in PRODUCT_FIELDS)})
+    """, (*(product[field] for field in PRODUCT_FIELDS), product_id, *(product[field] for field in PRODUCT_FIELDS)))
+
+def renumbered_invoice_number(invoice_number: str, uid: str) -> str:
+    """Number given to a synced invoice whose number is already used by another invoice here"""
+    return f"{invoice_number}-{uid[:6].upper()}"
+
+def _apply_invoice(conn, invoice: dict):
+    """Insert an invoice unless it is already here; returns (old, new) number if it had to be renumbered"""
+    if conn.execute("SELECT 1 FROM invoices WHERE uid = ?", (invoice['uid'],)).fetchone():
+        return None
+    invoice = dict(invoice)
+    renumbered = None
+    # Tills that sold before they had a TERMINAL_ID share the same numbers; keep both sales.
+    # The new number comes from the uid, so it is the same wherever this invoice clashes.
+    if conn.execute("SELECT 1 FROM invoices WHERE invoice_number = ?", (invoice['invoice_number'],)).fetchone():
+        new_number = renumbered_invoice_number(invoice['invoice_number'], invoice['uid'])
+        renumbered = (invoice['invoice_number'], new_number)
+        invoice['invoice_number'] = new_number
+    invoice_id = conn.execute(f"""
+        INSERT INTO invoices ({', '.join(INVOICE_FIELDS)})
+        VALUES ({', '.join('?' for _ in INVOICE_FIELDS)})
+        RETURNING id
+    """, tuple(invoice[field] for field in INVOICE_FIELDS)).fetchone()[0]
+    conn.executemany("""
+        INSERT INTO invoice_items (uid, invoice_id, product_id, product_name, weight_kg, price_per_kg, total_price)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(item['uid'], invoice_id,
+           _product_id(conn, item['product_uid'], item['product_name'], item['price_per_kg']),
+           item['product_name'], item['weight_kg'], item['price_per_kg'], item['total_price'])
+          for item in invoice['items']])
+    return renumbered
+
+def _apply_movement(conn, movement: dict):
+    """Insert a movement unless it is already here; returns the local product id it moved, or None"""
+    if conn.execute("SELECT 1 FROM stock_movements WHERE uid = ?", (movement['uid'],)).fetchone():
+        return None
+    product_id = _product_id(conn, movement['product_uid'], movement['product_name'])
+    invoice = None
+    if movement['invoice_uid']:
+        invoice = conn.execute("SELECT id FROM invoices WHERE uid = ?", (movement['invoice_uid'],)).fetchone()
+    conn.execute("""
+        INSERT INTO stock_movements (uid, product_id, movement_type, quantity_kg, count_kg, reason, username,
+                                     invoice_id, created_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (movement['uid'], product_id, movement['movement_type'], movement['quantity_kg'], movement['count_kg'],
+          movement['reason'], movement['username'], invoice[0] if invoice else None, movement['created_ts']))
+    return product_id
+
+def apply_changes(conn, changes, origin: str, renumbered: list = None):
+    """Apply a batch of changes inside the caller's write transaction
+
+    The journal entries the changes generate here are stamped with origin,
+    so they are never pushed back to where they came from. Invoices whose
+    number was already taken are renumbered and their (old, new) numbers
+    appended to renumbered. Returns the number of products whose stock was
+    recomputed.
+    """
+    first_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_journal").fetchone()[0]
+    moved = set()
+    for entity, payload in changes:
+        if entity == "product":
+            _apply_product(conn, payload)
+        elif entity == "invoice":
+            conflict = _apply_invoice(conn, payload)
+            if conflict and renumbered is not None:
+                renumbered.append(conflict)
+        elif entity == "stock_movement":
+            product_id = _apply_movement(conn, payload)
+            if product_id is not None:
+                moved.add(product_id)
+    recompute_stock(conn, sorted(moved))
+    conn.execute("UPDATE sync_journal SET origin = ? WHERE seq > ? AND origin IS NULL", (origin, first_seq))
+    return len(moved)
+
+def _applied_seq(conn, peer: str) -> int:
+    row = conn.execute("SELECT applied_seq FROM sync_watermarks WHERE peer = ?", (peer,)).fetchone()
+    return row[0] if row else 0
+
+def _save_watermark(conn, peer: str, applied_seq: int = None, sent_seq: int = None):
+    conn.execute("""
+        INSERT INTO sync_watermarks (peer, applied_seq, sent_seq, synced_ts) VALUES (?, COALESCE(?, 0), COALESCE(?, 0), ?)
+        ON CONFLICT (peer) DO UPDATE SET
+            applied_seq = COALESCE(?, sync_watermarks.applied_seq),
+            sent_seq = COALESCE(?, sync_watermarks.sent_seq),
+            synced_ts = excluded.synced_ts
+    """, (peer, applied_seq, sent_seq, now_ts(), applied_seq, sent_seq))
+
+def push_changes(local, hub, terminal_id: str, batch_size: int = SYNC_BATCH_SIZE, renumbered: list = None) -> int:
+    """Send the terminal's own changes the hub has not applied yet; returns the number sent"""
+    sent = 0
+    while True:
+        hub.execute("BEGIN IMMEDIATE")
+        try:
+            after_seq = _applied_seq(hub, terminal_id)
+            changes, last_seq = read_changes(local, after_seq, batch_size, local_only=True)
+            if last_seq == after_seq:
+                hub.rollback()
+                break
+            apply_changes(hub, changes, terminal_id, renumbered)
+            _save_watermark(hub, terminal_id, applied_seq=last_seq)
+            hub.commit()
+        except Exception:
+            hub.rollback()
+            raise
+        # Informational only: the hub's watermark decides what is sent next time
+        _save_watermark(local, HUB_PEER, sent_seq=last_seq)
+        local.commit()
+        sent += len(changes)
+    return sent
+
+def pull_changes(local, hub, terminal_id: str, batch_size: int = SYNC_BATCH_SIZE, renumbered: list = None) -> int:
+    """Apply the hub's changes that came from other terminals; returns the number applied"""
+    applied = 0
+    while True:
+        local.execute("BEGIN IMMEDIATE")
+        try:
+            after_seq = _applied_seq(local, HUB_PEER)
+            changes, last_seq = read_changes(hub, after_seq, batch_size, exclude_origin=terminal_id)
+            if last_seq == after_seq:
+                local.rollback()
+                break
+            apply_changes(local, changes, HUB_PEER, renumbered)
+            _save_watermark(local, HUB_PEER, applied_seq=last_seq)
+            local.commit()
+        except Exception:
+            local.rollback()
+            raise
+        applied += len(changes)
+    return applied
+
+def open_database(path: str):
+    """Open (and migrate) a till or hub database for syncing"""
+    from utils.migrations import apply_migrations
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    apply_migrations(conn)
+    return conn
+
+def sync_databases(local, hub, terminal_id: str, batch_size: int = SYNC_BATCH_SIZE):
+    """Push this terminal's changes, then pull everyone else's
+
+    Returns (sent, received, renumbered), where renumbered lists the
+    (old, new) numbers of invoices that clashed with another till's.
+    """
+    if not terminal_id:
+        raise ValueError("Set TERMINAL_ID to a name unique to this till before syncing")
+    renumbered = []
+    sent = push_changes(local, hub, terminal_id, batch_size, renumbered)
+    received = pull_changes(local, hub, terminal_id, batch_size, renumbered)
+    return sent, received, renumbered
+
+def has_synced(conn) -> bool:
+    """True once this database has exchanged changes with a hub"""
+    return conn.execute("SELECT 1 FROM sync_watermarks WHERE peer = ?", (HUB_PEER,)).fetchone() is not None
+
+def get_sync_status(conn):
+    """Pending local changes and the last sync time, from the local database alone"""
+    row = conn.execute("SELECT sent_seq, synced_ts FROM sync_watermarks WHERE peer = ?", (HUB_PEER,)).fetchone()
+    sent_seq, synced_ts = (row['sent_seq'], row['synced_ts']) if row else (0, None)
+    pending = conn.execute(
+        "SELECT COUNT(*) FROM sync_journal WHERE seq > ? AND origin IS NULL", (sent_seq,)
+    ).fetchone()[0]
+    return {"pending": pending, "synced_ts": synced_ts}
+
+if __name__ == "__main__":
+    # Usage: TERMINAL_ID=T1 python -m utils.sync [db_path] [hub_path]
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("LOCAL_DB_PATH", "meat_shop.db")
+    hub_path = sys.argv[2] if len(sys.argv) > 2 else SYNC_HUB_PATH
+    if not hub_path:
+        print("Usage: TERMINAL_ID=T1 python -m utils.sync [db_path] hub_path")
+        sys.exit(1)
+    local, hub = open_database(db_path), open_database(hub_path)
+    try:
+        sent, received, renumbered = sync_databases(local, hub, os.getenv("TERMINAL_ID", "").strip().upper())
+        print(f"Sent {sent} change(s), received {received} change(s)")
+        for old_number, new_number in renumbered:
+            print(f"Invoice {old_number} was already used by another till; stored as {new_number}")
+    finally:
+        local.close()
+        hub.close()
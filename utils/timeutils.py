@@ -0,0 +1,70 @@
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+def _system_zone_name():
+    """IANA name of the system timezone from TZ, the /etc/localtime link or /etc/timezone; None if unknown"""
+    name = os.getenv("TZ", "").lstrip(":")
+    if not name:
+        # Usually a link into the zoneinfo database, e.g. /usr/share/zoneinfo/Europe/Paris
+        name = os.path.realpath("/etc/localtime")
+    if "zoneinfo/" in name:
+        return name.split("zoneinfo/", 1)[1]
+    if name and not name.startswith("/"):
+        return name
+    try:
+        with open("/etc/timezone", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _load_shop_timezone():
+    """Shop timezone from SHOP_TIMEZONE (IANA name), falling back to the named system zone
+
+    A fixed UTC offset is never used: it would put every sale on the other
+    side of a DST change in the wrong hour, or the wrong business day.
+    """
+    name = os.getenv("SHOP_TIMEZONE") or _system_zone_name()
+    if not name:
+        raise RuntimeError("Cannot determine the shop timezone; set SHOP_TIMEZONE to an IANA name (e.g. Europe/Paris)")
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise RuntimeError(f"Unknown timezone '{name}'; set SHOP_TIMEZONE to an IANA name (e.g. Europe/Paris)")
+
+SHOP_TZ = _load_shop_timezone()
+
+def now_ts() -> int:
+    """Current time as integer epoch seconds"""
+    return int(time.time())
+
+def business_time(ts: int):
+    """Return (business_day 'YYYY-MM-DD', hour 0-23) of an epoch timestamp in shop time"""
+    local = datetime.fromtimestamp(ts, SHOP_TZ)
+    return local.strftime("%Y-%m-%d"), local.hour
+
+def business_today() -> date:
+    """Today's date in shop time"""
+    return datetime.now(SHOP_TZ).date()
+
+def day_start_ts(day: date) -> int:
+    """Epoch seconds of local midnight at the start of a business day"""
+    return int(datetime(day.year, day.month, day.day, tzinfo=SHOP_TZ).timestamp())
+
+def day_range(start_date: date, end_date: date):
+    """Half-open business-day range [start, end + 1 day) as 'YYYY-MM-DD' strings"""
+    return start_date.strftime("%Y-%m-%d"), (end_date + timedelta(days=1)).strftime("%Y-%m-%d")
+
+def ts_range(start_date: date, end_date: date):
+    """Half-open epoch range covering whole business days start_date..end_date"""
+    return day_start_ts(start_date), day_start_ts(end_date + timedelta(days=1))
+
+def utc_text_to_ts(value: str) -> int:
+    """Convert a SQLite CURRENT_TIMESTAMP string (UTC) to epoch seconds"""
+    parsed = datetime.strptime(value[:19], "%Y-%m-%d %H:%M:%S")
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp())
+
+def format_ts(ts: int, fmt: str = "%Y-%m-%d %H:%M:%S") -> str:
+    """Format an epoch timestamp in shop time"""
+    return datetime.fromtimestamp(ts, SHOP_TZ).strftime(fmt)